@@ -1,65 +1,520 @@
 
 #this code will usw AI to decide the output
-import json
-from .tools import TicketAnalyzer, ActionExecutor
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .approvals import ApprovalQueue
+from .retry import retry
+from .tools import TicketAnalyzer, ActionExecutor, ROOT_CAUSES
+from .classifier import TicketClassifier
+from .executor import BatchExecutor
+from .incidents import cluster_tickets
+from .ingest import TicketStream
 from .memory import Memory
+from .metrics import metrics
 from .policies import PolicyEngine
+from .resilience import CircuitBreaker, CircuitOpenError, MalformedResponse, ResilientCaller
+from .scheduler import RateLimiter, TicketScheduler
+
+# ceiling for analyses made without Gemini; below the policies' min_confidence
+# (0.7 by default), so they always wait for a human
+DEGRADED_CONFIDENCE = 0.5
 
 class SupportAgent:
-    def __init__(self):
-        self.analyzer = TicketAnalyzer()
+    def __init__(self, dedup_threshold=0.9, local_threshold=0.9, concurrency=4, timeout=60, retries=2,
+                 batch_size=8, aging_seconds=600, requests_per_minute=None, tokens_per_minute=None,
+                 cluster_threshold=0.8, cluster_window=3600, llm_timeout=30.0, latency_slo=10.0,
+                 hedge_percentile=0.95, breaker_failure_rate=0.5, breaker_cooldown=30.0):
+        # per-call deadline, hedging after the hedge_percentile latency (None
+        # disables) and a circuit breaker that counts errors and calls slower
+        # than latency_slo (keep it below llm_timeout); while it is open
+        # tickets degrade()
+        resilience = ResilientCaller(
+            timeout=llm_timeout,
+            hedge_percentile=hedge_percentile,
+            breaker=CircuitBreaker(failure_rate=breaker_failure_rate, slow_call_seconds=latency_slo,
+                                   cooldown=breaker_cooldown)
+        )
+        self.analyzer = TicketAnalyzer(rate_limiter=RateLimiter(requests_per_minute, tokens_per_minute),
+                                       resilience=resilience)
         self.executor = ActionExecutor()
+        # coalesces executions by action and skips ones already done (idempotency ledger)
+        self.batcher = BatchExecutor(self.executor)
         self.memory = Memory()
         self.policies = PolicyEngine()
+        self.inbox = TicketStream()
+        # high-risk decisions wait here for a human instead of blocking the batch
+        self.approvals = ApprovalQueue()
+        # tickets waiting for analysis, most severe (then oldest) first
+        self.scheduler = TicketScheduler(aging_seconds)
+        # near-duplicates of an already-solved ticket skip Gemini (None disables)
+        self.dedup_threshold = dedup_threshold
+        # local first-stage classifier; only confident answers skip Gemini (None disables)
+        self.classifier = None
+        if local_threshold is not None:
+            self.classifier = TicketClassifier.from_memory(self.memory, ROOT_CAUSES, threshold=local_threshold)
+        # batch mode: parallel Gemini calls and retries; timeout is the time
+        # budget of a ticket or batch across its retries (each Gemini call
+        # is bounded by llm_timeout)
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retries = retries
+        # tickets packed into one Gemini request by reason_many (1 disables)
+        self.batch_size = batch_size
+        # near-identical tickets of a batch filed within cluster_window seconds
+        # share one analysis (None disables)
+        self.cluster_threshold = cluster_threshold
+        self.cluster_window = cluster_window
+        # incidents found by the last run() and inbox batches not yet
+        # acknowledged, per thread: one agent is shared by every Streamlit
+        # session, so these must not leak between them
+        self._run_state = threading.local()
         
+    @property
+    def last_incidents(self):
+        """Incidents found by this thread's last run()"""
+        return getattr(self._run_state, 'incidents', [])
+
     def observe(self):
-        with open('data/tickets.json', 'r') as f:
-            return json.load(f)['tickets']
+        """New tickets from the inbox since the last call.
+
+        The tickets stay this thread's until acknowledge() (handled) or
+        release() (failed, returned by the next observe()). A batch the thread
+        neither acknowledged nor released is released here. The inbox
+        checkpoint never passes an unacknowledged ticket; after a crash it is
+        read again and lookup() replays it if it was already processed
+        (at-least-once).
+        """
+        self.release()
+        with metrics.span('agent_observe'):
+            cursor, tickets = self.inbox.read()
+        self._run_state.cursors = [cursor] if cursor else []
+        metrics.inc('agent_tickets_observed_total', len(tickets))
+        return tickets
+
+    def acknowledge(self):
+        """Checkpoint the inbox past the tickets this thread's observe() returned"""
+        self.inbox.commit(*getattr(self._run_state, 'cursors', []))
+        self._run_state.cursors = []
+
+    def release(self):
+        """Hand this thread's unacknowledged tickets to the next observe() (their batch failed)"""
+        cursors = getattr(self._run_state, 'cursors', [])
+        if cursors:
+            self.inbox.release(*cursors)
+            self._run_state.cursors = []
     
+    def lookup(self, ticket):
+        """Earlier outcome for a resubmitted or replayed ticket, or None.
+
+        Returns {'analysis', 'decision', 'result'} rebuilt from memory so the
+        caller can attach the existing result instead of processing it again.
+        A ticket still waiting for approval comes back with a
+        'pending_approval' result.
+        """
+        record = self.memory.lookup(ticket['id'])
+        if record is None:
+            pending = self.approvals.get(ticket['id'])
+            if pending is None:
+                return None
+            decision = pending['decision']
+            analysis = pending['analysis'] or {
+                'root_cause': decision['root_cause'],
+                'confidence': decision['confidence'],
+                'reasoning': "Awaiting human approval",
+                'source': 'replay'
+            }
+            return {'analysis': analysis, 'decision': decision,
+                    'result': {"status": "pending_approval", "action": decision}}
+        analysis = {
+            'root_cause': record['root_cause'],
+            'confidence': record.get('confidence') or 0.0,
+            'reasoning': f"Already processed as ticket {record['ticket_id']}",
+            'source': 'replay'
+        }
+        decision = self.decide(ticket, analysis)
+        # already resolved, so there is nothing left to approve
+        decision.update(action=record['action'], needs_human_approval=False)
+        return {'analysis': analysis, 'decision': decision, 'result': record['result']}
+
     def reason(self, ticket):
-        # Get similar past issues
-        context = self.memory.get_similar_issues(ticket['description'])
-        
-        # Analyze with Gemini
-        analysis = self.analyzer.analyze(ticket, context)
+        with metrics.span('agent_reason'):
+            # Reuse a solved near-duplicate, or let the local classifier answer
+            analysis = self.reason_locally(ticket)
+            if not analysis:
+                # Get similar past issues
+                context = self.memory.get_similar_issues(ticket['description'])
+
+                # Analyze with Gemini
+                try:
+                    analysis = self.analyzer.analyze(ticket, context)
+                    analysis.setdefault('source', 'llm')
+                except (CircuitOpenError, MalformedResponse) as e:
+                    analysis = self.degrade(ticket, e)
+        metrics.inc('agent_analyses_total', source=analysis['source'])
         return analysis
+
+    def reason_stream(self, ticket):
+        """reason() + decide() that yields (analysis, decision) while Gemini is still answering.
+
+        decision is None until root_cause and confidence have arrived, then
+        stays fixed; the last item holds the complete analysis. If Gemini is
+        unavailable or fails mid-answer, the last item is a degrade()d
+        analysis with its own decision instead.
+        """
+        analysis = self.reason_locally(ticket)
+        if analysis:
+            metrics.inc('agent_analyses_total', source=analysis['source'])
+            yield analysis, self.decide(ticket, analysis)
+            return
+
+        context = self.memory.get_similar_issues(ticket['description'])
+        decision = None
+        try:
+            for analysis in self.analyzer.analyze_stream(ticket, context):
+                analysis.setdefault('source', 'llm')
+                if decision is None and analysis.get('root_cause') in ROOT_CAUSES and 'confidence' in analysis:
+                    try:
+                        analysis['confidence'] = float(analysis['confidence'])
+                    except (TypeError, ValueError):
+                        pass
+                    else:
+                        decision = self.decide(ticket, analysis)
+                yield analysis, decision
+        except Exception as e:
+            analysis = self.degrade(ticket, e)
+            decision = self.decide(ticket, analysis)
+            yield analysis, decision
+        if decision is None:
+            # reply never had a usable root cause / confidence pair
+            decision = self.decide(ticket, analysis)
+            yield analysis, decision
+        metrics.inc('agent_analyses_total', source=analysis['source'])
+
+    def reason_locally(self, ticket):
+        """Analysis that needs no LLM call (memory recall, then local classifier), or None"""
+        analysis = self.recall(ticket)
+        if analysis or self.classifier is None:
+            return analysis
+        prediction = self.classifier.classify(ticket['description'])
+        if not prediction:
+            return None
+        root_cause, confidence = prediction
+        return {
+            'root_cause': root_cause,
+            'confidence': confidence,
+            'reasoning': f"Local classifier ({confidence:.0%} confident)",
+            'source': 'local_model'
+        }
+
+    def degrade(self, ticket, error):
+        """Best-effort analysis without Gemini, for when it is down or answered garbage.
+
+        Uses the local classifier's best guess (whatever its confidence), else
+        the root cause of the most similar past issue, with confidence capped at
+        DEGRADED_CONFIDENCE. decide() sends it to human approval whatever the
+        policies say.
+        """
+        root_cause, confidence, basis = None, 0.0, "no local evidence"
+        if self.classifier is not None:
+            root_cause, confidence = self.classifier.predict(ticket['description'])
+            basis = "local classifier"
+        if root_cause is None:
+            similar = self.memory.get_similar_issues(ticket['description'], k=1)
+            if similar and similar[0].get('root_cause') in ROOT_CAUSES:
+                root_cause, confidence = similar[0]['root_cause'], similar[0].get('confidence') or 0.0
+                basis = "most similar past issue"
+        metrics.inc('agent_degraded_total', reason=type(error).__name__)
+        return {
+            'root_cause': root_cause,
+            'confidence': min(confidence, DEGRADED_CONFIDENCE),
+            'reasoning': f"Gemini unavailable ({error}); best guess from {basis}",
+            'source': 'degraded',
+            'degraded': True,
+            'error': str(error)
+        }
+
+    def recall(self, ticket):
+        """Analysis copied from a near-duplicate solved ticket, or None"""
+        if self.dedup_threshold is None:
+            return None
+        match = self.memory.find_duplicate(ticket['description'], self.dedup_threshold)
+        if not match:
+            return None
+        issue, similarity = match
+        confidence = issue.get('confidence')
+        return {
+            'root_cause': issue['root_cause'],
+            # older records predate stored confidence; fall back to the match score
+            'confidence': confidence if confidence is not None else similarity,
+            'reasoning': f"Same issue as resolved ticket {issue['ticket_id']} ({similarity:.0%} similar)",
+            'source': 'memory',
+            'matched_ticket_id': issue['ticket_id']
+        }
     
     def decide(self, ticket, analysis):
-        decision = self.policies.get_action(
-            root_cause=analysis['root_cause'],
-            severity=ticket['severity'],
-            confidence=analysis['confidence']
-        )
-        return decision
+        with metrics.span('agent_decide'):
+            decision = self.policies.get_action(
+                root_cause=analysis['root_cause'],
+                severity=ticket['severity'],
+                confidence=analysis['confidence']
+            )
+        return self._guard_degraded(decision, analysis)
     
-    def act(self, ticket, decision):
-        if decision['needs_human_approval']:
+    def decide_many(self, tickets, analyses):
+        """decide() for a whole batch in one policy pass"""
+        with metrics.span('agent_decide_batch'):
+            decisions = self.policies.get_actions_batch(
+                [a['root_cause'] for a in analyses],
+                [t['severity'] for t in tickets],
+                [a['confidence'] for a in analyses]
+            )
+        return [self._guard_degraded(d, a) for d, a in zip(decisions, analyses)]
+
+    @staticmethod
+    def _guard_degraded(decision, analysis):
+        # a guess made without Gemini is never executed unreviewed, even if the
+        # policies (e.g. a lowered min_confidence) would let it through
+        if analysis.get('degraded'):
+            decision['needs_human_approval'] = True
+            decision['degraded'] = True
+        return decision
+
+    def act(self, ticket, decision, approved=False, analysis=None):
+        """Execute the decision; high-risk ones are queued until a human approves them"""
+        if decision['needs_human_approval'] and not approved:
+            self.approvals.add(ticket, decision, analysis)
+            metrics.inc('agent_actions_total', status='pending_approval')
             print(f"⏸️  Ticket #{ticket['id']}: AWAITING HUMAN APPROVAL")
             return {"status": "pending_approval", "action": decision}
         
-        result = self.executor.execute(decision)
-        self.memory.store(ticket, decision, result)
+        with metrics.span('agent_act'):
+            result = self.batcher.execute(ticket, decision)
+            self._record(ticket, decision, result, analysis)
         return result
+
+    def act_many(self, items):
+        """act() for a list of (ticket, decision, analysis); results come back in order.
+
+        Decisions needing approval are queued as usual. The rest are executed
+        together, one run per distinct action covering all its merchants.
+        """
+        results = [None] * len(items)
+        futures = {}
+        for i, (ticket, decision, analysis) in enumerate(items):
+            if decision['needs_human_approval']:
+                results[i] = self.act(ticket, decision, analysis=analysis)
+            else:
+                futures[i] = self.batcher.submit(ticket, decision)
+        with metrics.span('agent_act_batch'):
+            self.batcher.flush()
+            for i, future in futures.items():
+                ticket, decision, analysis = items[i]
+                results[i] = future.result()
+                self._record(ticket, decision, results[i], analysis)
+        return results
+
+    def _record(self, ticket, decision, result, analysis=None):
+        stored = self.memory.lookup(ticket['id'])
+        if stored and stored['action'] == decision['action'] and stored['result'] == result:
+            # execution replayed from the ledger and already remembered
+            return
+        source = (analysis or {}).get('source')
+        self.memory.store(ticket, decision, result, source)
+        # only Gemini's answers are training data; learning from the classifier's
+        # own guesses or from copies of earlier answers would inflate its confidence
+        if self.classifier and source == 'llm' and decision.get('root_cause') in ROOT_CAUSES:
+            self.classifier.learn(ticket['description'], decision['root_cause'])
+        metrics.inc('agent_actions_total', status=result['status'])
     
-    def run(self):
+    def approve(self, ticket_id):
+        """Execute a queued decision as approved; None if it is no longer pending"""
+        # popped first, so two approvers can't both execute it
+        entry = self.approvals.pop(ticket_id)
+        if entry is None:
+            return None
+        try:
+            return self.act(entry['ticket'], entry['decision'], approved=True, analysis=entry['analysis'])
+        except Exception:
+            # not executed; back in the queue for another try (executions are idempotent)
+            self.approvals.restore(entry)
+            raise
+
+    def reject(self, ticket_id):
+        """Drop a queued decision and remember the rejection; None if it is no longer pending"""
+        entry = self.approvals.pop(ticket_id)
+        if entry is None:
+            return None
+        result = {"status": "rejected_by_human"}
+        self.memory.store(entry['ticket'], entry['decision'], result, (entry['analysis'] or {}).get('source'))
+        metrics.inc('agent_actions_total', status='rejected_by_human')
+        return result
+
+    def reason_batch(self, tickets):
+        """reason() for several tickets with a single Gemini request"""
+        with metrics.span('agent_reason_batch'):
+            analyses = [self.reason_locally(t) for t in tickets]
+            pending = [i for i, a in enumerate(analyses) if a is None]
+            if pending:
+                batch = [tickets[i] for i in pending]
+                contexts = [self.memory.get_similar_issues(t['description']) for t in batch]
+                try:
+                    replies = self.analyzer.analyze_batch(batch, contexts)
+                except CircuitOpenError as e:
+                    replies = [self.degrade(t, e) for t in batch]
+                for i, analysis in zip(pending, replies):
+                    analysis.setdefault('source', 'llm')
+                    analyses[i] = analysis
+        for analysis in analyses:
+            metrics.inc('agent_analyses_total', source=analysis['source'])
+        return analyses
+
+    def reason_many(self, tickets):
+        """Reason over many tickets in parallel; analyses come back in input order.
+
+        Tickets go through the scheduler, so workers pick up the most severe
+        (and oldest) first, and are packed batch_size at a time into one
+        Gemini request. If a
+        batch still fails after retries its tickets are retried one by one, and
+        a ticket that fails on its own gets a degrade()d analysis, so it
+        routes to human approval.
+        """
+        def reason_one(ticket):
+            try:
+                return retry(self.reason, ticket, retries=self.retries, timeout=self.timeout)
+            except Exception as e:
+                analysis = self.degrade(ticket, e)
+                metrics.inc('agent_analyses_total', source=analysis['source'])
+                return analysis
+
+        def reason_chunk(chunk):
+            if len(chunk) == 1:
+                return [reason_one(chunk[0])]
+            try:
+                return retry(self.reason_batch, chunk, retries=self.retries, timeout=self.timeout)
+            except Exception:
+                return [reason_one(t) for t in chunk]
+
+        size = max(1, self.batch_size)
+
+        def work():
+            # the queue is shared, so a worker may also serve tickets queued by
+            # a concurrent call; every future gets resolved either way
+            while True:
+                items = self.scheduler.pop_many(size)
+                if not items:
+                    return
+                try:
+                    analyses = reason_chunk([ticket for ticket, _ in items])
+                except Exception as e:
+                    for _, future in items:
+                        future.set_exception(e)
+                    continue
+                for (_, future), analysis in zip(items, analyses):
+                    future.set_result(analysis)
+
+        futures = [self.scheduler.submit(t) for t in tickets]
+        workers = min(self.concurrency, -(-len(tickets) // size))
+        if workers <= 1:
+            work()
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                for _ in range(workers):
+                    pool.submit(work)
+        return [future.result() for future in futures]
+
+    def reason_incidents(self, tickets):
+        """reason_many() with one analysis per incident instead of per ticket.
+
+        Near-identical tickets are grouped first (incidents.cluster_tickets);
+        only each group's representative is analyzed and the result is copied
+        to the other members, so LLM calls scale with distinct incidents.
+        Returns (analyses in input order, summaries of incidents with 2+ tickets).
+        """
+        if self.cluster_threshold is None or len(tickets) < 2:
+            return self.reason_many(tickets), []
+        with metrics.span('agent_cluster'):
+            incidents = cluster_tickets(tickets, self.cluster_threshold, self.cluster_window)
+        representatives = [incident.representative for incident in incidents]
+        analyses = {}
+        summaries = []
+        for incident, representative, analysis in zip(incidents, representatives,
+                                                       self.reason_many(representatives)):
+            if len(incident.tickets) == 1:
+                analyses[id(representative)] = analysis
+                continue
+            summary = incident.summary(analysis)
+            summaries.append(summary)
+            for ticket in incident.tickets:
+                if ticket is representative:
+                    analyses[id(ticket)] = dict(analysis, incident_id=summary['incident_id'])
+                else:
+                    analyses[id(ticket)] = dict(
+                        analysis,
+                        reasoning=f"Same incident as ticket {representative['id']}: {analysis['reasoning']}",
+                        source='incident',
+                        incident_id=summary['incident_id'],
+                        representative_ticket_id=representative['id']
+                    )
+            metrics.inc('agent_analyses_total', len(incident.tickets) - 1, source='incident')
+        return [analyses[id(t)] for t in tickets], summaries
+
+    def run(self, tickets=None):
+        """Process a batch (by default the new inbox tickets); results come back in input order"""
+        if tickets is not None:
+            return self._run(tickets)
         tickets = self.observe()
-        results = []
-        
-        for ticket in tickets:
-            print(f"\n🔍 Processing Ticket #{ticket['id']}...")
-            
-            # observer, reason, decide and then act
-            analysis = self.reason(ticket)
-            decision = self.decide(ticket, analysis)
-            result = self.act(ticket, decision)
+        try:
+            results = self._run(tickets)
+        except BaseException:
+            # the next observe() hands the batch out again instead of losing it
+            self.release()
+            raise
+        self.acknowledge()
+        return results
+
+    def _run(self, tickets):
+        # tickets seen before are attached to their stored result, not reprocessed
+        previous = {t['id']: self.lookup(t) for t in tickets}
+        fresh = [t for t in tickets if previous[t['id']] is None]
+
+        # reasoning is network-bound so it runs in parallel; decide/act then go
+        # in priority order so critical tickets are acted on first
+        analyses, incidents = self.reason_incidents(fresh)
+        self._run_state.incidents = incidents
+        for incident in incidents:
+            print(f"\n🚨 Incident {incident['incident_id']}: {incident['tickets']} tickets from "
+                  f"{len(incident['merchants'])} merchant(s) → {incident['root_cause']}")
+        decisions = dict(zip((t['id'] for t in fresh), zip(analyses, self.decide_many(fresh, analyses))))
+
+        # executions are coalesced by action after the loop
+        to_act = []
+        # ticket -> result row, acted on in priority order but returned in input order
+        rows = {}
+        for ticket in self.scheduler.order(tickets):
+            replay = previous[ticket['id']]
+            if replay:
+                print(f"\n♻️  Ticket #{ticket['id']} already processed ({replay['result']['status']})")
+                analysis, decision = replay['analysis'], replay['decision']
+            else:
+                print(f"\n🔍 Processing Ticket #{ticket['id']}...")
+
+                # observer, reason, decide and then act
+                analysis, decision = decisions[ticket['id']]
+                to_act.append((ticket, decision, analysis))
             
-            results.append({
+            rows[id(ticket)] = {
                 'ticket_id': ticket['id'],
                 'issue': ticket['description'][:50] + "...",
                 'root_cause': analysis['root_cause'],
                 'action': decision['action'],
                 'risk_level': decision['risk_level'],
-                'needs_human_approval': decision['needs_human_approval']
-            })
+                'needs_human_approval': decision['needs_human_approval'],
+                'replayed': replay is not None,
+                'status': replay['result']['status'] if replay else None,
+                'batch_id': None,
+                'incident_id': analysis.get('incident_id')
+            }
         
-        return results
+        for (ticket, _, _), result in zip(to_act, self.act_many(to_act)):
+            rows[id(ticket)].update(status=result['status'], batch_id=result.get('batch_id'))
+        return [rows[id(ticket)] for ticket in tickets]
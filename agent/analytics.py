@@ -0,0 +1,79 @@
+"""Running aggregates over the resolution history"""
+import heapq
+
+DIMENSIONS = ('root_cause', 'action', 'outcome', 'merchant')
+
+
+def _tally(counts, key, n):
+    counts[key] = counts.get(key, 0) + n
+
+
+class Analytics:
+    """Counts by root cause, action, outcome, merchant and day, updated one record at a time.
+
+    Aggregated records (see memory.aggregate) count once per occurrence, using
+    their outcome, merchant and day tallies and their confidence sum, so the
+    numbers are the same before and after compaction. Approval/rejection rates
+    are over decisions that were either executed ('completed') or rejected by
+    a human.
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.counts = {dimension: {} for dimension in DIMENSIONS}
+        self.daily = {}
+        self.confidence_sum = 0.0
+        self.confidence_count = 0
+        # bumped on every add so readers can cache derived views
+        self.version = 0
+
+    def add(self, record):
+        n = record.get('count', 1)
+        self.total += n
+        self.version += 1
+        _tally(self.counts['root_cause'], record.get('root_cause'), n)
+        _tally(self.counts['action'], record.get('action'), n)
+        outcomes = record.get('outcomes') or {record.get('result', {}).get('status', 'unknown'): n}
+        for outcome, m in outcomes.items():
+            _tally(self.counts['outcome'], outcome, m)
+        merchants = record.get('merchants') or {record.get('merchant_id'): n}
+        for merchant, m in merchants.items():
+            if merchant is not None:
+                _tally(self.counts['merchant'], merchant, m)
+        days = record.get('days')
+        if days is None:
+            stamp = record.get('stored_at') or record.get('last_seen')
+            # records from before timestamps were stored have no day
+            days = {stamp[:10]: n} if stamp else {}
+        for day, m in days.items():
+            _tally(self.daily, day, m)
+        if 'confidence_n' in record:
+            self.confidence_sum += record['confidence_sum']
+            self.confidence_count += record['confidence_n']
+        elif record.get('confidence') is not None:
+            self.confidence_sum += record['confidence'] * n
+            self.confidence_count += n
+
+    def summary(self):
+        outcomes = self.counts['outcome']
+        completed = outcomes.get('completed', 0)
+        rejected = outcomes.get('rejected_by_human', 0)
+        decided = completed + rejected
+        return {
+            'total': self.total,
+            'completed': completed,
+            'rejected': rejected,
+            'approval_rate': completed / decided if decided else 0.0,
+            'rejection_rate': rejected / decided if decided else 0.0,
+            'avg_confidence': self.confidence_sum / self.confidence_count if self.confidence_count else 0.0,
+            'merchants': len(self.counts['merchant'])
+        }
+
+    def top(self, dimension, n=10):
+        """[(value, count)] for the n most frequent values of a dimension"""
+        return heapq.nlargest(n, self.counts[dimension].items(), key=lambda item: item[1])
+
+    def series(self, days=None):
+        """[(YYYY-MM-DD, count)] oldest first, limited to the last `days` days with activity"""
+        ordered = sorted(self.daily.items())
+        return ordered[-days:] if days else ordered
@@ -0,0 +1,118 @@
+"""Decisions waiting for a human, persisted so approvers can work through them separately"""
+import json
+import os
+from datetime import datetime, timezone
+
+from .filelock import FileLock
+from .jsonl import append, read_from
+from .scheduler import SEVERITY_RANK
+
+
+class ApprovalQueue:
+    """Pending approvals in an append-only JSONL log shared by every process (CLI, Streamlit).
+
+    Each entry keeps the ticket, its analysis and the proposed decision, so an
+    approved ticket goes straight to act() without being analyzed again.
+    add() and pop() append one line ({'add': entry} or {'remove': ticket_id}),
+    so they cost the same however long the queue is. Every operation first
+    reads the lines other processes appended since the last one, under an
+    inter-process lock; once stale lines outnumber pending entries
+    compact_ratio to one, the log is rewritten with just the pending entries.
+    """
+
+    def __init__(self, path='data/approvals.jsonl', compact_ratio=4):
+        self.path = path
+        self.compact_ratio = compact_ratio
+        self._file_lock = FileLock(path + '.lock')
+        self._entries = {}
+        self._offset = 0
+        self._lines = 0
+        # stat of the log we have read, to notice it being compacted by another process
+        self._stat = None
+
+    def add(self, ticket, decision, analysis=None):
+        entry = {
+            'ticket': ticket,
+            'analysis': analysis,
+            'decision': decision,
+            'queued_at': datetime.now(timezone.utc).isoformat(timespec='seconds')
+        }
+        self.restore(entry)
+        return entry
+
+    def restore(self, entry):
+        """Queue an entry as is (e.g. one whose approval failed to execute)"""
+        with self._file_lock:
+            self._refresh()
+            self._append({'add': entry})
+
+    def get(self, ticket_id):
+        with self._file_lock:
+            self._refresh()
+            return self._entries.get(ticket_id)
+
+    def pop(self, ticket_id):
+        """Remove and return an entry, or None if it is gone (e.g. handled by another approver)"""
+        with self._file_lock:
+            self._refresh()
+            entry = self._entries.get(ticket_id)
+            if entry is not None:
+                self._append({'remove': ticket_id})
+        return entry
+
+    def pending(self):
+        """Entries most severe first, then oldest first"""
+        with self._file_lock:
+            self._refresh()
+            entries = list(self._entries.values())
+        return sorted(entries, key=lambda e: (
+            SEVERITY_RANK.get(e['ticket'].get('severity'), SEVERITY_RANK['medium']), e['queued_at']))
+
+    def __len__(self):
+        with self._file_lock:
+            self._refresh()
+            return len(self._entries)
+
+    def __contains__(self, ticket_id):
+        return self.get(ticket_id) is not None
+
+    def _refresh(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._entries, self._offset, self._lines, self._stat = {}, 0, 0, None
+            return
+        if self._stat is None or not os.path.samestat(stat, self._stat) or stat.st_size < self._offset:
+            # new or compacted log: read it from the start
+            self._entries, self._offset, self._lines = {}, 0, 0
+        self._stat = stat
+        if stat.st_size == self._offset:
+            return
+        ops, self._offset = read_from(self.path, self._offset)
+        for op in ops:
+            self._lines += 1
+            if 'add' in op:
+                self._entries[op['add']['ticket']['id']] = op['add']
+            else:
+                self._entries.pop(op['remove'], None)
+
+    def _append(self, op):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'ab') as f:
+            append(f, (json.dumps(op) + "\n").encode('utf-8'), self._offset)
+            os.fsync(f.fileno())
+        self._refresh()
+        if self._lines > self.compact_ratio * max(len(self._entries), 16):
+            self._compact()
+
+    def _compact(self):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'wb') as f:
+            for entry in self._entries.values():
+                f.write((json.dumps({'add': entry}) + "\n").encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._refresh()
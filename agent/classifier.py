@@ -0,0 +1,116 @@
+"""Local naive Bayes root-cause classifier over hashed word n-grams"""
+import math
+import threading
+import zlib
+from collections import defaultdict
+
+from .search import TOKEN_RE
+
+
+def features(text, n_features):
+    """Hashed unigram + bigram features (stopwords kept, "not" matters here)"""
+    tokens = TOKEN_RE.findall(text.lower())
+    grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    return [zlib.crc32(g.encode('utf-8')) % n_features for g in grams]
+
+
+class TicketClassifier:
+    """Multinomial naive Bayes trained on past resolutions.
+
+    classify() only answers when the top class posterior reaches threshold and
+    there is enough history behind it; everything else is escalated to the LLM.
+    """
+
+    def __init__(self, threshold=0.9, n_features=2 ** 18, alpha=0.1, min_samples=20, min_class_samples=3,
+                 min_coverage=0.5):
+        self.threshold = threshold
+        self.n_features = n_features
+        self.alpha = alpha
+        self.min_samples = min_samples
+        self.min_class_samples = min_class_samples
+        # share of a ticket's n-grams that must have been seen in training;
+        # NB posteriors are overconfident on text unlike anything it knows
+        self.min_coverage = min_coverage
+        self.class_counts = defaultdict(int)
+        self.feature_counts = defaultdict(lambda: defaultdict(int))
+        self.feature_totals = defaultdict(int)
+        self.vocabulary = set()
+        self.answered = 0
+        self.escalated = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_memory(cls, memory, labels, **kwargs):
+        """Train on completed (not rejected) resolutions whose root cause came from Gemini.
+
+        Records stored before the source was kept are all used.
+        """
+        model = cls(**kwargs)
+        for issue in memory.data['resolved_issues']:
+            if issue.get('result', {}).get('status') != 'completed' or issue.get('root_cause') not in labels:
+                continue
+            weight = issue.get('outcomes', {}).get('completed', 1)
+            sources = issue.get('sources') or ({issue['source']: 1} if issue.get('source') else None)
+            if sources is not None:
+                weight = min(weight, sources.get('llm', 0))
+            if weight:
+                model.learn(issue['description'], issue['root_cause'], weight)
+        return model
+
+    def learn(self, text, label, weight=1):
+        feats = features(text, self.n_features)
+        with self._lock:
+            self.class_counts[label] += weight
+            counts = self.feature_counts[label]
+            for f in feats:
+                counts[f] += weight
+                self.vocabulary.add(f)
+            self.feature_totals[label] += len(feats) * weight
+
+    def coverage(self, text):
+        feats = features(text, self.n_features)
+        if not feats:
+            return 0.0
+        with self._lock:
+            return sum(1 for f in feats if f in self.vocabulary) / len(feats)
+
+    def predict(self, text):
+        """Return (label, posterior) for the most likely class, or (None, 0.0)"""
+        feats = features(text, self.n_features)
+        with self._lock:
+            total = sum(self.class_counts.values())
+            if not total or not feats:
+                return None, 0.0
+            vocab = len(self.vocabulary) or 1
+            log_probs = {}
+            for label, count in self.class_counts.items():
+                counts = self.feature_counts[label]
+                denom = self.feature_totals[label] + self.alpha * vocab
+                score = math.log(count / total)
+                for f in feats:
+                    score += math.log((counts.get(f, 0) + self.alpha) / denom)
+                log_probs[label] = score
+        best = max(log_probs, key=log_probs.get)
+        top = log_probs[best]
+        norm = sum(math.exp(s - top) for s in log_probs.values())
+        return best, 1.0 / norm
+
+    def classify(self, text):
+        """(label, confidence) if confident enough to skip the LLM, else None"""
+        label, confidence = None, 0.0
+        if sum(self.class_counts.values()) >= self.min_samples and self.coverage(text) >= self.min_coverage:
+            label, confidence = self.predict(text)
+        if label is None or confidence < self.threshold or self.class_counts[label] < self.min_class_samples:
+            self.escalated += 1
+            return None
+        self.answered += 1
+        return label, confidence
+
+    def stats(self):
+        seen = self.answered + self.escalated
+        return {
+            'answered_locally': self.answered,
+            'escalated': self.escalated,
+            'local_share': self.answered / seen if seen else 0.0,
+            'training_samples': sum(self.class_counts.values())
+        }
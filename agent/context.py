@@ -0,0 +1,38 @@
+"""Compact, size-bounded rendering of past issues for prompts"""
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token for English text)"""
+    return (len(text) + 3) // 4
+
+
+def outcome(issue):
+    """'completed', or a tally like 'completed x12, rejected_by_human x1' for aggregated records"""
+    tally = issue.get('outcomes')
+    if tally and sum(tally.values()) > 1:
+        return ", ".join(f"{status} x{n}" for status, n in sorted(tally.items(), key=lambda t: -t[1]))
+    return issue.get('result', {}).get('status', 'unknown')
+
+
+def build_context(issues, max_chars=600, max_description=160):
+    """One line per past issue (description | root cause | outcome), most relevant first.
+
+    issues should already be ranked (Memory.get_similar_issues does this);
+    lines are added until max_chars is reached and the last one is truncated
+    to fit.
+    """
+    lines = []
+    used = 0
+    for issue in issues:
+        description = " ".join(issue['description'].split())
+        if len(description) > max_description:
+            description = description[:max_description - 3] + "..."
+        line = f"- {description} | {issue.get('root_cause')} | {outcome(issue)}"
+        room = max_chars - used
+        if len(line) > room:
+            if room > 40:
+                lines.append(line[:room - 3] + "...")
+            break
+        lines.append(line)
+        used += len(line) + 1
+    return "\n".join(lines) if lines else "(no similar past issues)"
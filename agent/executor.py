@@ -0,0 +1,152 @@
+"""Coalesced, idempotent execution of approved decisions"""
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+from .filelock import FileLock
+from .jsonl import append, read_from
+from .metrics import metrics
+
+
+def execution_key(ticket, decision):
+    """Idempotency key: one execution of an action per ticket"""
+    return f"{ticket['id']}|{decision['action']}"
+
+
+class ExecutionLedger:
+    """Idempotency keys of executed tickets and their results, in an append-only JSONL file.
+
+    Entries are written (and fsynced) right after their group runs, so retries
+    and replays find them; a crash between running a group and recording it
+    can still repeat that group once. Lines appended by other processes are
+    picked up before every check.
+    """
+
+    def __init__(self, path='data/executions.jsonl'):
+        self.path = path
+        self._file_lock = FileLock(path + '.lock')
+        self._lock = threading.Lock()
+        self._results = {}
+        self._offset = 0
+        self._catch_up()
+
+    def get(self, key):
+        with self._lock:
+            self._catch_up()
+            return self._results.get(key)
+
+    def record(self, entries):
+        """Persist {key: result} for one executed group"""
+        data = "".join(json.dumps({'key': key, 'result': result}) + "\n" for key, result in entries.items())
+        with self._lock, self._file_lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # read other processes' lines first, so only a torn tail is left past our offset
+            self._catch_up()
+            with open(self.path, 'ab') as f:
+                append(f, data.encode('utf-8'), self._offset)
+                os.fsync(f.fileno())
+            self._catch_up()
+
+    def _catch_up(self):
+        entries, self._offset = read_from(self.path, self._offset)
+        for entry in entries:
+            self._results[entry['key']] = entry['result']
+
+
+class BatchExecutor:
+    """Groups pending decisions by action and runs each group once for all its merchants.
+
+    submit() returns a Future for the ticket's result. Pending decisions run on
+    flush(), or as soon as the oldest has waited `window` seconds or max_batch
+    are waiting. Tickets whose idempotency key is already in the ledger get
+    their earlier result back and are not executed again. Timings of recent
+    groups are kept in `batches`.
+    """
+
+    def __init__(self, executor, ledger=None, window=2.0, max_batch=200, history=100):
+        self.executor = executor
+        self.ledger = ledger if ledger is not None else ExecutionLedger()
+        self.window = window
+        self.max_batch = max_batch
+        self.history = history
+        self.batches = []
+        self._pending = []
+        self._oldest = None
+        self._lock = threading.Lock()
+        # one flush at a time, so a ticket is never executed by two flushes
+        self._flush_lock = threading.Lock()
+
+    def submit(self, ticket, decision):
+        future = Future()
+        with self._lock:
+            if not self._pending:
+                self._oldest = time.monotonic()
+            self._pending.append((ticket, decision, future))
+            due = len(self._pending) >= self.max_batch or time.monotonic() - self._oldest >= self.window
+        if due:
+            self.flush()
+        return future
+
+    def execute(self, ticket, decision):
+        """Submit one decision and run everything pending now; returns its result"""
+        future = self.submit(ticket, decision)
+        self.flush()
+        return future.result()
+
+    def flush(self):
+        """Run every pending group; returns the per-batch reports of this flush"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            groups = {}
+            for ticket, decision, future in pending:
+                groups.setdefault(decision['action'], []).append((ticket, decision, future))
+            reports = []
+            for action, items in groups.items():
+                try:
+                    reports.append(self._run_group(action, items))
+                except Exception as e:
+                    for _, _, future in items:
+                        if not future.done():
+                            future.set_exception(e)
+            return reports
+
+    def _run_group(self, action, items):
+        start = time.perf_counter()
+        fresh = {}
+        replayed = 0
+        for ticket, decision, future in items:
+            key = execution_key(ticket, decision)
+            previous = self.ledger.get(key)
+            if previous is not None:
+                replayed += 1
+                future.set_result(previous)
+            else:
+                # a retried ticket can appear twice in one flush; it runs once
+                fresh.setdefault(key, []).append((ticket, future))
+
+        report = {'action': action, 'tickets': len(items), 'replayed': replayed, 'merchants': 0}
+        if fresh:
+            merchants = sorted({waiting[0][0].get('merchant_id') for waiting in fresh.values()} - {None})
+            batch_id = "B-" + hashlib.sha256("\n".join(sorted(fresh)).encode('utf-8')).hexdigest()[:12]
+            with metrics.span('executor_batch', action=action):
+                outcome = self.executor.execute_group(action, merchants)
+            result = dict(outcome, batch_id=batch_id, batch_size=len(fresh))
+            self.ledger.record({key: result for key in fresh})
+            for waiting in fresh.values():
+                for _, future in waiting:
+                    future.set_result(result)
+            report.update(batch_id=batch_id, merchants=len(merchants))
+            metrics.inc('executor_actions_total', len(fresh), status=result['status'])
+        if replayed:
+            metrics.inc('executor_actions_total', replayed, status='replayed')
+        report['seconds'] = time.perf_counter() - start
+        with self._lock:
+            self.batches.append(report)
+            del self.batches[:-self.history]
+        return report
@@ -0,0 +1,67 @@
+"""Chunked NDJSON / CSV rendering of stored records, for exports generated on demand"""
+import csv
+import io
+import json
+
+CSV_FIELDS = ('ticket_id', 'merchant_id', 'description', 'root_cause', 'action', 'confidence', 'status',
+              'count', 'first_seen', 'last_seen')
+
+
+def iter_ndjson(records, chunk_size=500):
+    """Yield the records as NDJSON text, chunk_size lines at a time"""
+    lines = []
+    for record in records:
+        lines.append(json.dumps(record, default=str))
+        if len(lines) >= chunk_size:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+def csv_row(record):
+    return {
+        'ticket_id': record.get('ticket_id'),
+        'merchant_id': record.get('merchant_id'),
+        'description': record.get('description'),
+        'root_cause': record.get('root_cause'),
+        'action': record.get('action'),
+        'confidence': record.get('confidence'),
+        'status': record.get('result', {}).get('status'),
+        'count': record.get('count', 1),
+        'first_seen': record.get('first_seen', record.get('stored_at')),
+        'last_seen': record.get('last_seen', record.get('stored_at'))
+    }
+
+
+def iter_csv(records, chunk_size=500):
+    """Yield the records as CSV text (header first), chunk_size rows at a time"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_FIELDS)
+    writer.writeheader()
+    rows = 0
+    for record in records:
+        writer.writerow(csv_row(record))
+        rows += 1
+        if rows >= chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            rows = 0
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+# format -> (chunk generator, mime type, file extension)
+FORMATS = {
+    'ndjson': (iter_ndjson, 'application/x-ndjson', 'ndjson'),
+    'csv': (iter_csv, 'text/csv', 'csv'),
+}
+
+
+def write_export(records, path, fmt='ndjson', chunk_size=500):
+    """Stream records into a file without building the whole export in memory"""
+    render = FORMATS[fmt][0]
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        for chunk in render(records, chunk_size):
+            f.write(chunk)
@@ -0,0 +1,32 @@
+"""Stable, content-addressed ticket ids"""
+import hashlib
+import re
+
+
+def ticket_id(merchant_id, description, timestamp=''):
+    """T-<12 hex digits> from a SHA-256 over merchant, description and timestamp.
+
+    Unlike hash(), this is the same in every process, and 48 bits keeps
+    collisions negligible at millions of tickets.
+    """
+    normalized = re.sub(r"\s+", " ", description).strip().lower()
+    payload = "\x1f".join([str(merchant_id).strip(), normalized, str(timestamp or '')])
+    return "T-" + hashlib.sha256(payload.encode('utf-8')).hexdigest()[:12]
+
+
+def submission_id(merchant_id, description, submitted_at):
+    """Id for a ticket typed in by hand (CLI / UI).
+
+    Only the day of submitted_at goes into the digest, so the same merchant
+    resubmitting the same issue that day gets the same id and is recognized
+    (and not executed again); a report on a later day is a new ticket.
+    """
+    return ticket_id(merchant_id, description, str(submitted_at)[:10])
+
+
+def ensure_id(ticket):
+    """Give a ticket a content-addressed id if it arrived without one"""
+    if not ticket.get('id'):
+        ticket['id'] = ticket_id(ticket.get('merchant_id', ''), ticket.get('description', ''),
+                                 ticket.get('timestamp', ''))
+    return ticket
@@ -0,0 +1,70 @@
+"""Grouping near-identical tickets of one batch into incidents"""
+import hashlib
+
+from .lsh import MinHashLSH
+from .scheduler import SEVERITY_RANK, submitted_at
+
+
+class Incident:
+    """Near-identical tickets filed close together; one analysis covers them all"""
+
+    def __init__(self, first):
+        self.tickets = [first]
+        self.last_seen = None
+
+    @property
+    def representative(self):
+        """Most severe member (earliest among equals); it is the one sent for analysis"""
+        return min(self.tickets, key=lambda t: SEVERITY_RANK.get(t.get('severity'), SEVERITY_RANK['medium']))
+
+    @property
+    def incident_id(self):
+        ids = "\n".join(sorted(str(t['id']) for t in self.tickets))
+        return "INC-" + hashlib.sha256(ids.encode('utf-8')).hexdigest()[:10]
+
+    @property
+    def merchants(self):
+        return sorted({t.get('merchant_id') for t in self.tickets} - {None})
+
+    def summary(self, analysis=None):
+        return {
+            'incident_id': self.incident_id,
+            'representative_ticket_id': self.representative['id'],
+            'ticket_ids': [t['id'] for t in self.tickets],
+            'tickets': len(self.tickets),
+            'merchants': self.merchants,
+            'description': self.representative['description'],
+            'root_cause': analysis.get('root_cause') if analysis else None
+        }
+
+
+def cluster_tickets(tickets, threshold=0.8, window_seconds=3600):
+    """Group tickets whose descriptions are near-duplicates (MinHash estimate >= threshold).
+
+    A ticket joins the most similar incident whose latest ticket was filed at
+    most window_seconds earlier, otherwise it starts a new one. Returns
+    incidents in order of their first ticket; unclustered tickets are
+    single-member incidents.
+    """
+    order = sorted(range(len(tickets)), key=lambda i: submitted_at(tickets[i], 0))
+    lsh = MinHashLSH()
+    owner = {}
+    incidents = []
+    for i in order:
+        ticket = tickets[i]
+        seen = submitted_at(ticket, 0)
+        incident = None
+        for _, j in lsh.query(ticket['description'], threshold):
+            candidate = owner[j]
+            if seen - candidate.last_seen <= window_seconds:
+                incident = candidate
+                break
+        if incident is None:
+            incident = Incident(ticket)
+            incidents.append(incident)
+        else:
+            incident.tickets.append(ticket)
+        incident.last_seen = seen
+        owner[i] = incident
+        lsh.add(i, ticket['description'])
+    return incidents
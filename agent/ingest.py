@@ -0,0 +1,128 @@
+"""Streaming ticket inbox: tails an NDJSON file from a checkpointed byte offset"""
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from .ids import ensure_id
+
+
+class TicketStream:
+    """Reads one ticket per line, resuming where the last commit() left off.
+
+    read() hands out a batch under a cursor. commit(cursor) marks the batch
+    handled and release(cursor) hands its tickets out again with the next
+    read(). The checkpoint never moves past the start of a batch that is
+    still out, so after a crash every unhandled ticket is read again.
+    Ticket ids already handled are remembered in a bounded set, so a ticket
+    appended twice (or replayed after the file is rewritten) is skipped.
+    Safe to share between threads (e.g. Streamlit sessions): every method
+    holds one lock, so each ticket is handed to one caller at a time.
+    """
+
+    def __init__(self, path='data/tickets.ndjson', checkpoint_path=None, max_seen=10000):
+        self.path = path
+        self.checkpoint_path = checkpoint_path or os.path.splitext(path)[0] + '.checkpoint.json'
+        self.max_seen = max_seen
+        self.offset = 0
+        self.seen = OrderedDict()
+        self._lock = threading.RLock()
+        # cursor -> (offset the batch was read from, its tickets), until committed
+        self._outstanding = {}
+        # released batches, handed out again first by the next read()
+        self._released = []
+        self._cursors = 0
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, 'r') as f:
+                checkpoint = json.load(f)
+            self.offset = checkpoint.get('offset', 0)
+            for ticket_id in checkpoint.get('seen', []):
+                self.seen[ticket_id] = True
+
+    def read(self):
+        """(cursor, tickets): released tickets, then those appended since the last read"""
+        with self._lock:
+            start = self.offset
+            tickets = []
+            for released_start, released in self._released:
+                start = min(start, released_start)
+                tickets.extend(released)
+            self._released = []
+            tickets.extend(self._read())
+            if not tickets:
+                # nothing to hand out; an empty batch must not hold the checkpoint back
+                return None, tickets
+            self._cursors += 1
+            self._outstanding[self._cursors] = (start, tickets)
+            return self._cursors, tickets
+
+    def release(self, *cursors):
+        """Hand the tickets of these batches out again (their processing failed)"""
+        with self._lock:
+            for cursor in cursors:
+                batch = self._outstanding.pop(cursor, None)
+                if batch and batch[1]:
+                    self._released.append(batch)
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return
+        if os.path.getsize(self.path) < self.offset:
+            # file was truncated or replaced; start over (seen ids still apply)
+            self.offset = 0
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # partially written line; pick it up next time
+                    break
+                self.offset += len(line)
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    ticket = json.loads(line)
+                except ValueError:
+                    continue
+                if not isinstance(ticket, dict):
+                    # valid JSON but not a ticket
+                    continue
+                ensure_id(ticket)
+                if ticket.get('id') in self.seen:
+                    continue
+                self.mark_seen(ticket.get('id'))
+                yield ticket
+
+    def mark_seen(self, ticket_id):
+        if ticket_id is None:
+            return
+        with self._lock:
+            self.seen[ticket_id] = True
+            self.seen.move_to_end(ticket_id)
+            while len(self.seen) > self.max_seen:
+                self.seen.popitem(last=False)
+
+    def commit(self, *cursors):
+        """Mark these batches handled and persist the checkpoint (atomic replace)"""
+        with self._lock:
+            for cursor in cursors:
+                self._outstanding.pop(cursor, None)
+            pending = list(self._outstanding.values()) + self._released
+            # resume at the oldest batch still out; its handled neighbours are
+            # skipped through the seen ids, its unhandled tickets are not in them
+            unhandled = {t['id'] for _, tickets in pending for t in tickets}
+            checkpoint = {
+                'offset': min([start for start, _ in pending], default=self.offset),
+                'seen': [ticket_id for ticket_id in self.seen if ticket_id not in unhandled]
+            }
+            # unique temp name, so a commit from another process never shares it
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.checkpoint_path) or '.',
+                                       prefix=os.path.basename(self.checkpoint_path), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(checkpoint, f)
+                os.replace(tmp, self.checkpoint_path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
@@ -0,0 +1,48 @@
+"""Append-only JSONL files shared between processes (memory journal, approval queue, execution ledger)"""
+import json
+import os
+
+
+def parse_line(line):
+    """The JSON value on one line, or None for a blank or unreadable line"""
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        return json.loads(line)
+    except ValueError:
+        # torn line from a crash mid-append
+        return None
+
+
+def read_from(path, offset):
+    """Entries on the complete lines after byte offset, and the offset past the last of them.
+
+    A last line without its newline is still being written (or was torn by a
+    crash) and is left for the next call.
+    """
+    try:
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            chunk = f.read()
+    except FileNotFoundError:
+        return [], offset
+    end = chunk.rfind(b'\n') + 1
+    entries = [entry for entry in map(parse_line, chunk[:end].splitlines()) if entry is not None]
+    return entries, offset + end
+
+
+def append(f, data, offset):
+    """Write complete lines to f (opened 'ab'); returns the offset of the new end of file.
+
+    offset is where the caller's last read stopped, so the caller must have
+    caught up under the file's lock first. Any bytes past it are an
+    unterminated line left by a crash: it is ended first, so data starts on
+    a line of its own instead of being glued onto the torn one.
+    """
+    size = os.fstat(f.fileno()).st_size
+    if size > offset:
+        data = b'\n' + data
+    f.write(data)
+    f.flush()
+    return size + len(data)
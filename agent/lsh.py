@@ -0,0 +1,116 @@
+"""MinHash signatures + LSH banding for near-duplicate descriptions"""
+import random
+import re
+import zlib
+from collections import defaultdict
+
+_MASK64 = (1 << 64) - 1
+# odd 64-bit constants for multiplicative hashing / densification offsets
+_MIX = 0x9E3779B97F4A7C15
+_OFFSET = 0xC2B2AE3D27D4EB4F
+
+
+def shingles(text, size=5):
+    """Character n-grams of the normalized text"""
+    text = re.sub(r"\s+", " ", text.lower()).strip()
+    if len(text) <= size:
+        return {text}
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+class MinHasher:
+    """One-permutation MinHash: each shingle is hashed once and lands in one of num_perm bins.
+
+    A bin keeps the smallest hash it sees; empty bins borrow the value of the
+    next non-empty bin to their right (plus a per-distance offset), which keeps
+    the Jaccard estimate consistent. That is one hash per shingle instead of
+    num_perm, so signatures cost O(len(text)).
+    """
+
+    def __init__(self, num_perm=64, seed=1):
+        self.num_perm = num_perm
+        self.seed = random.Random(seed).getrandbits(64) | 1
+
+    def signature(self, text):
+        bins = [None] * self.num_perm
+        num_perm = self.num_perm
+        for s in shingles(text):
+            h = ((zlib.crc32(s.encode('utf-8')) ^ self.seed) * _MIX) & _MASK64
+            h ^= h >> 29
+            i = h % num_perm
+            value = h // num_perm
+            if bins[i] is None or value < bins[i]:
+                bins[i] = value
+        if None in bins:
+            bins = self._densify(bins)
+        return tuple(bins)
+
+    def _densify(self, bins):
+        n = len(bins)
+        filled = [i for i, value in enumerate(bins) if value is not None]
+        if not filled:
+            return [0] * n
+        out = list(bins)
+        for i in range(n):
+            if out[i] is None:
+                distance = 1
+                while bins[(i + distance) % n] is None:
+                    distance += 1
+                out[i] = (bins[(i + distance) % n] + distance * _OFFSET) & _MASK64
+        return out
+
+    @staticmethod
+    def similarity(sig_a, sig_b):
+        """Estimated Jaccard similarity of two signatures"""
+        return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+
+class MinHashLSH:
+    """Banded LSH over MinHash signatures, keyed by arbitrary hashable ids"""
+
+    def __init__(self, num_perm=64, bands=16, seed=1):
+        self.hasher = MinHasher(num_perm, seed)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.buckets = [defaultdict(set) for _ in range(bands)]
+        self.signatures = {}
+
+    def __contains__(self, key):
+        return key in self.signatures
+
+    def _band_keys(self, sig):
+        for band in range(self.bands):
+            yield band, sig[band * self.rows:(band + 1) * self.rows]
+
+    def add(self, key, text):
+        if key in self.signatures:
+            return
+        sig = self.hasher.signature(text)
+        self.signatures[key] = sig
+        for band, band_key in self._band_keys(sig):
+            self.buckets[band][band_key].add(key)
+
+    def remove(self, key):
+        sig = self.signatures.pop(key, None)
+        if sig is None:
+            return
+        for band, band_key in self._band_keys(sig):
+            bucket = self.buckets[band].get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self.buckets[band][band_key]
+
+    def query(self, text, threshold=0.0):
+        """Return [(similarity, key)] for candidates at or above threshold, best first"""
+        sig = self.hasher.signature(text)
+        candidates = set()
+        for band, band_key in self._band_keys(sig):
+            candidates.update(self.buckets[band].get(band_key, ()))
+        matches = []
+        for key in candidates:
+            score = MinHasher.similarity(sig, self.signatures[key])
+            if score >= threshold:
+                matches.append((score, key))
+        matches.sort(key=lambda m: m[0], reverse=True)
+        return matches
@@ -2,39 +2,496 @@
 #similar to dp
 import json
 import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+from .analytics import Analytics
+from .filelock import FileLock
+from .jsonl import append, parse_line, read_from
+from .lsh import MinHashLSH
+from .metrics import metrics
+from .search import InvertedIndex
+
+# fields of an aggregated record that are bookkeeping, not context for the model
+BOOKKEEPING = ('ticket_ids', 'sources', 'merchants', 'days', 'confidence_sum', 'confidence_n')
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+def aggregate(records, max_ticket_ids=1000):
+    """Merge records with the same (description, root_cause, action) into one.
+
+    The merged record keeps the latest ticket id, result and confidence, the
+    newest max_ticket_ids ticket ids seen (None keeps all), an occurrence
+    count, first/last seen timestamps, a confidence sum and tallies of
+    outcomes, sources, merchants and days (for analytics). Records come back ordered by
+    their latest occurrence.
+    """
+    merged = {}
+    # key -> ticket ids as an ordered set, turned into lists once at the end
+    ticket_ids = {}
+    for record in records:
+        key = (record['description'], record.get('root_cause'), record.get('action'))
+        count = record.get('count', 1)
+        status = record.get('result', {}).get('status', 'unknown')
+        outcomes = record.get('outcomes') or {status: count}
+        sources = record.get('sources') or ({record['source']: count} if record.get('source') else {})
+        merchants = record.get('merchants') or ({record['merchant_id']: count} if record.get('merchant_id') else {})
+        stamp = record.get('stored_at')
+        days = record.get('days') or ({stamp[:10]: count} if stamp else {})
+        if 'confidence_n' in record:
+            confidence_sum, confidence_n = record['confidence_sum'], record['confidence_n']
+        elif record.get('confidence') is not None:
+            # plain record, or one aggregated before the sum was kept
+            confidence_sum, confidence_n = record['confidence'] * count, count
+        else:
+            confidence_sum, confidence_n = 0.0, 0
+        first_seen = record.get('first_seen', record.get('stored_at'))
+        last_seen = record.get('last_seen', record.get('stored_at'))
+
+        agg = merged.pop(key, None)
+        if agg is None:
+            agg = {'count': 0, 'outcomes': {}, 'sources': {}, 'merchants': {}, 'days': {}, 'confidence_sum': 0.0,
+                   'confidence_n': 0, 'first_seen': first_seen, 'last_seen': last_seen}
+        agg.update({k: v for k, v in record.items()
+                    if k not in ('count', 'outcomes', 'sources', 'merchants', 'days', 'ticket_ids', 'first_seen',
+                                 'last_seen', 'stored_at', 'confidence_sum', 'confidence_n')})
+        agg['count'] += count
+        agg['confidence_sum'] += confidence_sum
+        agg['confidence_n'] += confidence_n
+        for field, tally in (('outcomes', outcomes), ('sources', sources), ('merchants', merchants), ('days', days)):
+            for value, n in tally.items():
+                agg[field][value] = agg[field].get(value, 0) + n
+        ids = ticket_ids.setdefault(key, {})
+        for ticket_id in record.get('ticket_ids') or [record['ticket_id']]:
+            # re-inserted so a resubmitted id counts as recent
+            ids.pop(ticket_id, None)
+            ids[ticket_id] = None
+        if first_seen and (not agg['first_seen'] or first_seen < agg['first_seen']):
+            agg['first_seen'] = first_seen
+        if last_seen and (not agg['last_seen'] or last_seen > agg['last_seen']):
+            agg['last_seen'] = last_seen
+        merged[key] = agg
+    for key, agg in merged.items():
+        ids = list(ticket_ids[key])
+        agg['ticket_ids'] = ids[-max_ticket_ids:] if max_ticket_ids else ids
+    return list(merged.values())
+
+class _Indexes:
+    """Lookup structures over the record list (ids are list positions)"""
+
+    def __init__(self):
+        self.search = InvertedIndex()
+        # description -> latest completed resolution (a later rejection withdraws it)
+        self.solved = {}
+        self.by_ticket = {}
+        self.analytics = Analytics()
+        # field -> value -> positions, for filtering the history
+        self.fields = {'root_cause': {}, 'outcome': {}, 'merchant_id': {}}
+
+    def add(self, i, record):
+        self.search.add(i, record['description'])
+        self.analytics.add(record)
+        merchants = record.get('merchants') or [record.get('merchant_id')]
+        for field, values in (('root_cause', [record.get('root_cause')]),
+                              ('outcome', [record.get('result', {}).get('status')]),
+                              ('merchant_id', merchants)):
+            for value in values:
+                self.fields[field].setdefault(value, []).append(i)
+        for ticket_id in record.get('ticket_ids') or [record['ticket_id']]:
+            self.by_ticket[ticket_id] = i
+        if record.get('result', {}).get('status') == 'completed':
+            self.solved[record['description']] = i
+        else:
+            self.solved.pop(record['description'], None)
 
 class Memory:
-    def __init__(self, path='data/memory.json'):
+    """Past resolutions, kept as a JSON snapshot plus an append-only JSONL journal.
+
+    store() only appends one line to the journal, so writes cost the same no
+    matter how big the history is. compact() folds the journal back into the
+    snapshot (in a background thread once the journal gets long), merging
+    repeated resolutions and applying the retention limits; load() replays
+    snapshot + journal.
+
+    Several processes can share one history: appends and journal rotation
+    happen under an inter-process file lock, and refresh() (run before every
+    read and write) tails records other processes appended since our last
+    offset, reloading only if another process compacted the journal away.
+    """
+
+    def __init__(self, path='data/memory.json', journal_path=None,
+                 fsync_every=32, compact_threshold=10000, background_compaction=True,
+                 max_age_days=None, max_records=None, max_ticket_ids=1000):
         self.path = path
+        self.journal_path = journal_path or os.path.splitext(path)[0] + '.journal.jsonl'
+        self.fsync_every = fsync_every
+        self.compact_threshold = compact_threshold
+        self.background_compaction = background_compaction
+        # retention, applied at compaction time (None keeps everything)
+        self.max_age_days = max_age_days
+        self.max_records = max_records
+        # ticket ids kept per merged record; older ids are no longer recognized
+        # as resubmissions by lookup()
+        self.max_ticket_ids = max_ticket_ids
+        self._lock = threading.RLock()
+        self._file_lock = FileLock(path + '.lock')
+        self._compact_lock = FileLock(path + '.compact.lock')
+        self.lsh = None
+        self._journal = None
+        self._journal_offset = 0
+        self._unsynced = 0
+        self._journal_records = 0
+        self._compacting = None
+        self._analytics_view = None
         self.load()
-    
+
     def load(self):
-        if os.path.exists(self.path):
-            with open(self.path, 'r') as f:
-                self.data = json.load(f)
+        with metrics.span('memory_load'), self._lock, self._file_lock:
+            self._close_journal()
+            if os.path.exists(self.path):
+                with open(self.path, 'r') as f:
+                    self.data = json.load(f)
+            else:
+                self.data = {"resolved_issues": []}
+            # snapshot already contains every journal older than its generation
+            snapshot_generation = self.data.pop('generation', 0)
+            self.generation = snapshot_generation
+            self._journal_records = 0
+            # LSH is keyed by description, so a reload can keep the signatures
+            # it already computed
+            if self.lsh is None:
+                self.lsh = MinHashLSH()
+            self._indexes = self._build_indexes(self.data['resolved_issues'])
+            for journal in self._journal_files():
+                gen, records, _ = self._read_journal(journal)
+                if gen < snapshot_generation:
+                    continue
+                self.generation = max(self.generation, gen)
+                for record in records:
+                    self._apply(record)
+                if journal == self.journal_path:
+                    self._journal_records = len(records)
+            self._open_journal()
+
+    def refresh(self):
+        """Catch up with writes made by other processes.
+
+        Costs one stat() when nothing changed. New journal lines are applied
+        incrementally to the in-memory indexes; a full load() only happens when
+        the journal was rotated by another process's compaction.
+        """
+        with self._lock:
+            if self._journal is None:
+                return
+            try:
+                on_disk = os.stat(self.journal_path)
+            except FileNotFoundError:
+                on_disk = None
+            if on_disk is None or not os.path.samestat(on_disk, os.fstat(self._journal.fileno())):
+                self.load()
+            elif on_disk.st_size > self._journal_offset:
+                self._catch_up()
+
+    def get_similar_issues(self, description, k=3):
+        """Top-k past issues ranked by BM25 relevance"""
+        self.refresh()
+        with self._lock:
+            issues = self.data['resolved_issues']
+            # the index holds one (the latest) record per description
+            hits = self._indexes.search.search(description, k)
+        similar = [{k: v for k, v in issues[i].items() if k not in BOOKKEEPING} for _, i in hits]
+        metrics.inc('memory_similar_lookups_total', result='hit' if similar else 'miss')
+        return similar
+
+    def find_duplicate(self, description, threshold=0.9):
+        """Most similar past issue that was completed (not rejected), or None.
+
+        Returns (issue, similarity) where similarity is the MinHash estimate of
+        the Jaccard similarity between the two descriptions.
+        """
+        self.refresh()
+        with self._lock:
+            solved = self._indexes.solved
+            for similarity, key in self.lsh.query(description, threshold):
+                if key in solved:
+                    metrics.inc('memory_duplicate_lookups_total', result='hit')
+                    return self.data['resolved_issues'][solved[key]], similarity
+        metrics.inc('memory_duplicate_lookups_total', result='miss')
+        return None
+
+    def lookup(self, ticket_id):
+        """Latest stored record for a ticket id, or None (O(1))"""
+        self.refresh()
+        with self._lock:
+            i = self._indexes.by_ticket.get(ticket_id)
+            return None if i is None else self.data['resolved_issues'][i]
+
+    def analytics(self, top=10, days=30):
+        """Summary, top-N breakdowns and daily series over the whole history.
+
+        Maintained as records are applied, so this never rescans the history;
+        the view is rebuilt only after new records arrive.
+        """
+        self.refresh()
+        with self._lock:
+            analytics = self._indexes.analytics
+            key = (analytics.version, top, days)
+            cached = self._analytics_view
+            if cached is None or cached[0] is not analytics or cached[1] != key:
+                view = {'summary': analytics.summary(), 'daily': analytics.series(days)}
+                for dimension in ('root_cause', 'action', 'outcome', 'merchant'):
+                    view[f'by_{dimension}'] = analytics.top(dimension, top)
+                cached = self._analytics_view = (analytics, key, view)
+            return cached[2]
+
+    def history(self, offset=0, limit=20, text=None, **filters):
+        """One page of stored records, newest first: returns (records, number matching).
+
+        filters match root_cause, outcome (result status) or merchant_id
+        exactly, using per-field indexes; text is a case-insensitive substring
+        of the description. Without filters a page costs O(limit).
+        """
+        self.refresh()
+        with self._lock:
+            records = self.data['resolved_issues']
+            positions = self._matching(records, text, filters)
+            end = len(positions) - offset
+            page = [records[i] for i in reversed(positions[max(0, end - limit):max(0, end)])]
+            return page, len(positions)
+
+    def iter_history(self, text=None, chunk_size=500, **filters):
+        """Matching records oldest first, copied out chunk_size at a time.
+
+        The lock is only held per chunk, so exporting a large history does not
+        block store(); compaction swaps in a new list, so the one iterated here
+        stays intact.
+        """
+        self.refresh()
+        with self._lock:
+            records = self.data['resolved_issues']
+            positions = self._matching(records, text, filters)
+        for start in range(0, len(positions), chunk_size):
+            with self._lock:
+                chunk = [records[i] for i in positions[start:start + chunk_size]]
+            yield from chunk
+
+    def _matching(self, records, text, filters):
+        # positions (ascending) of records passing every filter
+        filters = {field: value for field, value in filters.items() if value is not None}
+        if not filters:
+            positions = range(len(records))
         else:
-            self.data = {"resolved_issues": []}
-    
-    def get_similar_issues(self, description):
-
-        similar = []
-        keywords = description.lower().split()[:3]
-        
-        for issue in self.data['resolved_issues']:
-            if any(kw in issue['description'].lower() for kw in keywords):
-                similar.append(issue)
-        
-        return similar[:3]  # Top 3
-    
-    def store(self, ticket, decision, result):
-        """Store resolved issue"""
-        self.data['resolved_issues'].append({
+            lists = sorted((self._indexes.fields[field].get(value, []) for field, value in filters.items()), key=len)
+            others = [set(l) for l in lists[1:]]
+            positions = [i for i in lists[0] if all(i in s for s in others)]
+        if text:
+            text = text.lower()
+            positions = [i for i in positions if text in records[i]['description'].lower()]
+        return positions
+
+    def store(self, ticket, decision, result, source=None):
+        """Store resolved issue; source says where the root cause came from (e.g. 'llm')"""
+        record = {
             'ticket_id': ticket['id'],
+            'merchant_id': ticket.get('merchant_id'),
             'description': ticket['description'],
             'root_cause': decision.get('root_cause'),
             'action': decision['action'],
-            'result': result
-        })
-        
-        with open(self.path, 'w') as f:
-            json.dump(self.data, f, indent=2)
+            'confidence': decision.get('confidence'),
+            'result': result,
+            'stored_at': _now()
+        }
+        if source:
+            record['source'] = source
+        line = (json.dumps(record) + '\n').encode('utf-8')
+        with metrics.span('memory_store'), self._lock, self._file_lock:
+            # apply other processes' records first so list positions stay in file order
+            self.refresh()
+            self._journal_offset = append(self._journal, line, self._journal_offset)
+            self._apply(record)
+            self._journal_records += 1
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_every:
+                self.flush()
+            if self.compact_threshold and self._journal_records >= self.compact_threshold:
+                if self.background_compaction:
+                    self.compact_async()
+                else:
+                    self.compact()
+
+    def flush(self):
+        """fsync pending journal writes (group commit)"""
+        with self._lock:
+            if self._journal and self._unsynced:
+                os.fsync(self._journal.fileno())
+                self._unsynced = 0
+
+    def compact(self):
+        """Fold the journal into a fresh, aggregated snapshot.
+
+        Only the journal rotation and the final swap take the lock; merging,
+        retention, re-indexing and the snapshot write run while store() keeps
+        appending to the new journal.
+        """
+        # one compaction at a time across all processes; others just skip
+        if not self._compact_lock.acquire(blocking=False):
+            return
+        try:
+            self._compact()
+        finally:
+            self._compact_lock.release()
+
+    def _compact(self):
+        with self._lock, self._file_lock:
+            self.refresh()
+            self.flush()
+            self._close_journal()
+            rotated = '%s.%d.compacting' % (self.journal_path, self.generation)
+            if os.path.exists(self.journal_path):
+                os.replace(self.journal_path, rotated)
+            self.generation += 1
+            records = list(self.data['resolved_issues'])
+            generation = self.generation
+            self._journal_records = 0
+            self._open_journal()
+
+        with metrics.span('memory_compact'):
+            compacted = self.retain(aggregate(records, self.max_ticket_ids))
+            indexes = self._build_indexes(compacted, index_lsh=False)
+            self._write_snapshot(compacted, generation)
+            live = {r['description'] for r in compacted}
+
+        with self._lock:
+            # records stored while we were compacting are in the new journal
+            tail = self.data['resolved_issues'][len(records):]
+            self.data['resolved_issues'] = compacted
+            self._indexes = indexes
+            for record in tail:
+                self._apply(record)
+                live.add(record['description'])
+            for key in list(self.lsh.signatures):
+                if key not in live:
+                    self.lsh.remove(key)
+
+    def retain(self, records, now=None):
+        """Drop records past max_age_days, then keep only the newest max_records"""
+        if self.max_age_days:
+            now = now or datetime.now(timezone.utc)
+            cutoff = (now - timedelta(days=self.max_age_days)).isoformat(timespec='seconds')
+            # records from before timestamps were stored have no age and are kept
+            records = [r for r in records if not r.get('last_seen') or r['last_seen'] >= cutoff]
+        if self.max_records and len(records) > self.max_records:
+            newest = sorted(range(len(records)), key=lambda i: records[i].get('last_seen') or '')
+            keep = set(newest[-self.max_records:])
+            records = [r for i, r in enumerate(records) if i in keep]
+        return records
+
+    def _write_snapshot(self, records, generation):
+        snapshot = {"resolved_issues": records, "generation": generation}
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(snapshot, f)
+            f.flush()
+            os.fsync(f.fileno())
+        with self._file_lock:
+            os.replace(tmp, self.path)
+            # the new snapshot covers every rotated journal, including crash leftovers
+            for journal in self._journal_files():
+                if journal != self.journal_path:
+                    os.remove(journal)
+
+    def compact_async(self):
+        """Run compact() in a background thread unless one is already running"""
+        with self._lock:
+            if self._compacting and self._compacting.is_alive():
+                return self._compacting
+            self._compacting = threading.Thread(target=self.compact, daemon=True)
+            self._compacting.start()
+            return self._compacting
+
+    def close(self):
+        if self._compacting:
+            self._compacting.join()
+        with self._lock:
+            self._close_journal()
+
+    def _apply(self, record):
+        # append to the in-memory history and keep the indexes in step
+        self._indexes.add(len(self.data['resolved_issues']), record)
+        self.lsh.add(record['description'], record['description'])
+        self.data['resolved_issues'].append(record)
+
+    def _build_indexes(self, records, index_lsh=True):
+        indexes = _Indexes()
+        for i, record in enumerate(records):
+            indexes.add(i, record)
+            # LSH holds each distinct description once and outlives compactions
+            if index_lsh:
+                self.lsh.add(record['description'], record['description'])
+        return indexes
+
+    def _catch_up(self):
+        # apply complete lines appended by other processes since our offset
+        entries, self._journal_offset = read_from(self.journal_path, self._journal_offset)
+        for entry in entries:
+            if 'description' in entry:
+                self._apply(entry)
+                self._journal_records += 1
+
+    def _open_journal(self):
+        # callers hold the file lock
+        new = not os.path.exists(self.journal_path) or os.path.getsize(self.journal_path) == 0
+        directory = os.path.dirname(self.journal_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        torn = not new and not self._ends_with_newline()
+        self._journal = open(self.journal_path, 'ab')
+        if torn:
+            self._journal.write(b'\n')
+        if new:
+            # header line tells load() which snapshot this journal belongs to
+            self._journal.write((json.dumps({'generation': self.generation}) + '\n').encode('utf-8'))
+        self._journal.flush()
+        self._journal_offset = os.fstat(self._journal.fileno()).st_size
+
+    def _ends_with_newline(self):
+        with open(self.journal_path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
+
+    def _close_journal(self):
+        if self._journal:
+            self.flush()
+            self._journal.close()
+            self._journal = None
+
+    def _journal_files(self):
+        # leftovers from an interrupted compaction first, then the live journal
+        directory = os.path.dirname(self.journal_path) or '.'
+        prefix = os.path.basename(self.journal_path) + '.'
+        rotated = []
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                if name.startswith(prefix) and name.endswith('.compacting'):
+                    rotated.append(os.path.join(directory, name))
+        rotated.sort(key=lambda p: int(p.rsplit('.', 2)[-2]))
+        if os.path.exists(self.journal_path):
+            rotated.append(self.journal_path)
+        return rotated
+
+    def _read_journal(self, journal):
+        """Return (generation, records, bytes consumed up to the last full line)"""
+        generation = 0
+        records = []
+        with open(journal, 'rb') as f:
+            data = f.read()
+        for i, line in enumerate(data.splitlines()):
+            entry = parse_line(line)
+            if entry is None:
+                continue
+            if i == 0 and 'generation' in entry and 'description' not in entry:
+                generation = entry['generation']
+                continue
+            records.append(entry)
+        return generation, records, data.rfind(b'\n') + 1
@@ -0,0 +1,169 @@
+"""Lightweight counters, histograms and spans with Prometheus / structured-log export.
+
+Disabled by default; set AGENT_METRICS=1 to turn it on. AGENT_METRICS_PORT
+serves /metrics over HTTP and AGENT_METRICS_FILE names a file that
+write_prometheus() (called by main.py) refreshes, and AGENT_METRICS_LOG=1
+prints one JSON line per span on stderr. When disabled every call returns
+straight away.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+log = logging.getLogger('agent.metrics')
+
+TIME_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (100, 500, 1000, 2000, 5000, 10000, 50000, 100000)
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        self.metrics.observe(f"{self.name}_seconds", elapsed, **self.labels)
+        if exc_type is not None:
+            self.metrics.inc(f"{self.name}_errors_total", **self.labels)
+        if self.metrics.log_events:
+            log.info(json.dumps({'span': self.name, 'seconds': round(elapsed, 6),
+                                 'error': exc_type.__name__ if exc_type else None, **self.labels}))
+        return False
+
+
+class Metrics:
+    def __init__(self, enabled=False, log_events=False):
+        self.enabled = enabled
+        self.log_events = log_events
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self._server = None
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=TIME_BUCKETS, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = {'buckets': buckets, 'counts': [0] * len(buckets),
+                                               'count': 0, 'sum': 0.0}
+            for i, bound in enumerate(hist['buckets']):
+                if value <= bound:
+                    hist['counts'][i] += 1
+                    break
+            hist['count'] += 1
+            hist['sum'] += value
+
+    def span(self, name, **labels):
+        """Context manager timing a block into <name>_seconds"""
+        if not self.enabled:
+            return _NOOP
+        return _Span(self, name, labels)
+
+    def counter(self, name, **labels):
+        return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def render_prometheus(self):
+        lines = []
+        typed = set()
+        with self._lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f"# TYPE {name} counter")
+                lines.append(f"{name}{_labels(labels)} {value}")
+            for (name, labels), hist in sorted(self.histograms.items()):
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f"# TYPE {name} histogram")
+                cumulative = 0
+                for bound, count in zip(hist['buckets'], hist['counts']):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', bound),))} {cumulative}")
+                lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {hist['count']}")
+                lines.append(f"{name}_count{_labels(labels)} {hist['count']}")
+                lines.append(f"{name}_sum{_labels(labels)} {hist['sum']}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path=None):
+        path = path or os.environ.get('AGENT_METRICS_FILE')
+        if not self.enabled or not path:
+            return
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp, path)
+
+    def serve(self, port):
+        """Expose /metrics on a background HTTP server (once per process)"""
+        if self._server:
+            return self._server
+        # imported here: http.server is slow to import and rarely needed
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('', port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self._server
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+metrics = Metrics(
+    enabled=os.environ.get('AGENT_METRICS') == '1',
+    log_events=os.environ.get('AGENT_METRICS_LOG') == '1'
+)
+if metrics.enabled and metrics.log_events:
+    # span lines are INFO, below Python's default threshold; print them on
+    # stderr without depending on the app configuring logging
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    log.addHandler(_handler)
+    log.setLevel(logging.INFO)
+    log.propagate = False
+if metrics.enabled and os.environ.get('AGENT_METRICS_PORT'):
+    metrics.serve(int(os.environ['AGENT_METRICS_PORT']))
@@ -1,37 +1,162 @@
 """Decision policies with risk assessment"""
+import json
+import logging
+import os
+import time
+
+log = logging.getLogger('agent.policies')
+
+# used when the policy file is missing
+DEFAULT_POLICIES = {
+    "root_causes": {
+        "merchant_config_error": {"action": "Send config fix guide to merchant", "risk_level": "low"},
+        "platform_bug": {"action": "Escalate to engineering + apply hotfix", "risk_level": "high",
+                         "needs_approval": True},
+        "migration_issue": {"action": "Rollback merchant to hosted mode", "risk_level": "medium"},
+        "documentation_gap": {"action": "Update docs + notify affected merchants", "risk_level": "low"},
+        "api_misconfiguration": {"action": "Auto-fix API keys + notify merchant", "risk_level": "medium"}
+    },
+    "default": {"action": "Escalate to human support", "risk_level": "unknown"},
+    "approval": {"severities": ["critical"], "min_confidence": 0.7}
+}
+
+# below this many rows a plain loop beats building NumPy arrays
+NUMPY_MIN_ROWS = 64
+
+
+class CompiledPolicies:
+    """Lookup tables and the approval predicate built once from a policy document"""
+
+    def __init__(self, config):
+        default = config.get('default', {})
+        rules = config['root_causes']
+        approval = config.get('approval', {})
+        self.root_causes = list(rules)
+        self.actions = {rc: rule['action'] for rc, rule in rules.items()}
+        self.risk_levels = {rc: rule['risk_level'] for rc, rule in rules.items()}
+        self.default_action = default.get('action', "Escalate to human support")
+        self.default_risk_level = default.get('risk_level', "unknown")
+        self.approval_root_causes = frozenset(rc for rc, rule in rules.items() if rule.get('needs_approval'))
+        self.approval_severities = frozenset(approval.get('severities', ()))
+        self.min_confidence = float(approval.get('min_confidence', 0.0))
+
+    def needs_approval(self, root_cause, severity, confidence):
+        # High-risk actions need approval
+        return (
+            severity in self.approval_severities or
+            confidence < self.min_confidence or
+            root_cause in self.approval_root_causes
+        )
+
+    def approval_reasons(self, root_cause, severity, confidence):
+        """Why needs_approval() holds, one human-readable line per rule that fired"""
+        reasons = []
+        if severity in self.approval_severities:
+            reasons.append(f"{severity.capitalize()} severity ticket")
+        if confidence < self.min_confidence:
+            reasons.append(f"Low confidence ({confidence:.0%}, below {self.min_confidence:.0%})")
+        if root_cause in self.approval_root_causes:
+            reasons.append(f"{root_cause} actions always need approval")
+        return reasons
+
 
 class PolicyEngine:
+    """Rules from a JSON policy file, compiled once and reloaded when the file changes.
+
+    The file is checked at most every reload_interval seconds; a file that
+    fails to load leaves the current rules in place.
+    """
+
+    def __init__(self, path='data/policies.json', reload_interval=1.0):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._stamp = None
+        self._checked = 0.0
+        self.compiled = CompiledPolicies(DEFAULT_POLICIES)
+        self.reload()
+
+    def reload(self):
+        """Recompile if the policy file changed; returns True when the rules were replaced"""
+        self._checked = time.monotonic()
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            stamp = None
+        else:
+            stamp = (st.st_mtime_ns, st.st_size)
+        if stamp == self._stamp:
+            return False
+        try:
+            if stamp is None:
+                compiled = CompiledPolicies(DEFAULT_POLICIES)
+            else:
+                with open(self.path) as f:
+                    compiled = CompiledPolicies(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log.warning("keeping current policies, %s could not be loaded: %s", self.path, e)
+            return False
+        self.compiled = compiled
+        self._stamp = stamp
+        return True
+
+    def _current(self):
+        if time.monotonic() - self._checked >= self.reload_interval:
+            self.reload()
+        return self.compiled
+
     def get_action(self, root_cause, severity, confidence):
         """Determine action based on rules"""
-        
-        # High-risk actions need approval
-        needs_approval = (
-            severity == "critical" or 
-            confidence < 0.7 or
-            root_cause == "platform_bug"
-        )
-        
-        # Action mapping
-        actions = {
-            "merchant_config_error": "Send config fix guide to merchant",
-            "platform_bug": "Escalate to engineering + apply hotfix",
-            "migration_issue": "Rollback merchant to hosted mode",
-            "documentation_gap": "Update docs + notify affected merchants",
-            "api_misconfiguration": "Auto-fix API keys + notify merchant"
-        }
-        
-        risk_levels = {
-            "merchant_config_error": "low",
-            "platform_bug": "high",
-            "migration_issue": "medium",
-            "documentation_gap": "low",
-            "api_misconfiguration": "medium"
-        }
-        
+        policies = self._current()
         return {
-            "action": actions.get(root_cause, "Escalate to human support"),
-            "risk_level": risk_levels.get(root_cause, "unknown"),
-            "needs_human_approval": needs_approval,
+            "action": policies.actions.get(root_cause, policies.default_action),
+            "risk_level": policies.risk_levels.get(root_cause, policies.default_risk_level),
+            "needs_human_approval": policies.needs_approval(root_cause, severity, confidence),
             "confidence": confidence,
             "root_cause": root_cause
         }
+
+    def approval_reasons(self, decision, severity):
+        """CompiledPolicies.approval_reasons() for a decision under the current rules"""
+        reasons = self._current().approval_reasons(decision['root_cause'], severity, decision['confidence'])
+        if decision.get('degraded'):
+            reasons.insert(0, "Best guess made while Gemini was unavailable")
+        return reasons
+
+    def get_actions_batch(self, root_causes, severities, confidences):
+        """get_action() for many rows at once; returns the decisions in row order.
+
+        Large batches are evaluated column-wise with NumPy when it is
+        installed, otherwise (or for small batches) row by row. Both give
+        exactly what get_action() gives, errors included.
+        """
+        policies = self._current()
+        if len(root_causes) < NUMPY_MIN_ROWS:
+            return [self.get_action(rc, sev, conf) for rc, sev, conf in zip(root_causes, severities, confidences)]
+        try:
+            import numpy as np
+        except ImportError:
+            return [self.get_action(rc, sev, conf) for rc, sev, conf in zip(root_causes, severities, confidences)]
+        if not all(isinstance(conf, (int, float)) for conf in confidences):
+            # NumPy would turn None into NaN (silently skipping the confidence
+            # check) and parse numeric strings; row by row they raise like get_action()
+            return [self.get_action(rc, sev, conf) for rc, sev, conf in zip(root_causes, severities, confidences)]
+
+        # code each root cause as its index in the rule table; unknown ones get the last slot
+        known = {rc: i for i, rc in enumerate(policies.root_causes)}
+        codes = np.fromiter((known.get(rc, len(known)) for rc in root_causes), dtype=np.intp, count=len(root_causes))
+        actions = np.array([policies.actions[rc] for rc in policies.root_causes] + [policies.default_action], dtype=object)
+        risks = np.array([policies.risk_levels[rc] for rc in policies.root_causes] + [policies.default_risk_level],
+                         dtype=object)
+        approval_codes = np.array([rc in policies.approval_root_causes for rc in policies.root_causes] +
+                                  [False])
+        severity_flags = np.fromiter((sev in policies.approval_severities for sev in severities), dtype=bool,
+                                     count=len(severities))
+        confidence_values = np.asarray(confidences, dtype=float)
+
+        needs = severity_flags | (confidence_values < policies.min_confidence) | approval_codes[codes]
+        return [
+            {"action": action, "risk_level": risk, "needs_human_approval": bool(need),
+             "confidence": conf, "root_cause": rc}
+            for action, risk, need, conf, rc in zip(actions[codes].tolist(), risks[codes].tolist(),
+                                                    needs.tolist(), confidences, root_causes)
+        ]
@@ -0,0 +1,191 @@
+"""Deadlines, hedged requests and a circuit breaker for Gemini calls"""
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from .metrics import metrics
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling the API while the circuit breaker is open"""
+
+
+class MalformedResponse(ValueError):
+    """The model answered, but not with a usable analysis"""
+
+
+class CircuitBreaker:
+    """Trips when too many recent calls failed or ran slow.
+
+    Over the last `window` calls (once there are at least min_calls), a share
+    of bad calls (errors, or slower than slow_call_seconds) at or above
+    failure_rate opens the breaker. After `cooldown` seconds a single probe
+    call is let through: success closes the breaker, failure re-opens it.
+    """
+
+    def __init__(self, window=20, min_calls=5, failure_rate=0.5, slow_call_seconds=20.0, cooldown=30.0):
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.cooldown = cooldown
+        self.state = 'closed'
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may go ahead now: 'call', 'probe' (the half-open trial call) or None"""
+        with self._lock:
+            if self.state == 'closed':
+                return 'call'
+            if self.state == 'open' and time.monotonic() - self._opened_at >= self.cooldown:
+                self._transition('half_open')
+            if self.state == 'half_open' and not self._probing:
+                self._probing = True
+                return 'probe'
+            return None
+
+    def record(self, ok, seconds, probe=False):
+        bad = not ok or seconds >= self.slow_call_seconds
+        with self._lock:
+            if probe:
+                self._probing = False
+                if self.state != 'half_open':
+                    return
+                if bad:
+                    self._open()
+                else:
+                    self._outcomes.clear()
+                    self._transition('closed')
+                return
+            # calls started before the breaker opened say nothing new
+            if self.state != 'closed':
+                return
+            self._outcomes.append(bad)
+            bad_share = sum(self._outcomes) / len(self._outcomes)
+            if len(self._outcomes) >= self.min_calls and bad_share >= self.failure_rate:
+                self._open()
+
+    def release_probe(self):
+        """Give up the probe slot without a verdict (the probe was abandoned)"""
+        with self._lock:
+            self._probing = False
+
+    def _open(self):
+        self._opened_at = time.monotonic()
+        self._transition('open')
+
+    def _transition(self, state):
+        self.state = state
+        metrics.inc('llm_circuit_transitions_total', state=state)
+
+
+class ResilientCaller:
+    """Runs model calls behind a circuit breaker, with a deadline and hedging.
+
+    A call still running after the hedge_percentile latency of recent
+    successful calls (never less than min_hedge_delay) gets a duplicate
+    request, and whichever answers first wins. A call that has no answer after
+    `timeout` seconds raises TimeoutError; the abandoned request keeps running
+    on a daemon thread.
+    """
+
+    def __init__(self, timeout=30.0, hedge_percentile=0.95, min_hedge_delay=1.0, min_samples=20,
+                 breaker=None):
+        self.timeout = timeout
+        # None disables hedging
+        self.hedge_percentile = hedge_percentile
+        self.min_hedge_delay = min_hedge_delay
+        self.min_samples = min_samples
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self._latencies = deque(maxlen=200)
+
+    def hedge_delay(self):
+        """Seconds before a duplicate request is sent, or None (hedging off / too few samples)"""
+        if self.hedge_percentile is None or len(self._latencies) < self.min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(self.hedge_percentile * len(ordered)))
+        return max(self.min_hedge_delay, ordered[index])
+
+    def call(self, fn, may_hedge=None):
+        """fn() with deadline, hedging and breaker accounting.
+
+        may_hedge() is asked right before a duplicate request would be sent
+        (e.g. to take a rate-limit slot); returning False skips the hedge.
+        """
+        with self.guarded():
+            return self._hedged(fn, may_hedge)
+
+    @contextmanager
+    def guarded(self):
+        """Breaker accounting around a block (used directly for streamed calls)"""
+        permit = self.breaker.allow()
+        if permit is None:
+            metrics.inc('llm_circuit_rejections_total')
+            raise CircuitOpenError("Gemini circuit breaker is open")
+        probe = permit == 'probe'
+        start = time.perf_counter()
+        try:
+            yield
+        except GeneratorExit:
+            # an abandoned stream says nothing about the API, but must not
+            # keep the probe slot or the breaker never closes again
+            if probe:
+                self.breaker.release_probe()
+            raise
+        except BaseException:
+            self.breaker.record(False, time.perf_counter() - start, probe)
+            raise
+        elapsed = time.perf_counter() - start
+        self._latencies.append(elapsed)
+        self.breaker.record(True, elapsed, probe)
+
+    def _hedged(self, fn, may_hedge=None):
+        results = queue.Queue()
+
+        def attempt():
+            try:
+                results.put((True, fn()))
+            except Exception as e:
+                results.put((False, e))
+
+        start = time.monotonic()
+        deadline = start + self.timeout if self.timeout else None
+        delay = self.hedge_delay()
+        threading.Thread(target=attempt, daemon=True).start()
+        launched = 1
+        failures = 0
+        while True:
+            now = time.monotonic()
+            waits = []
+            if deadline is not None:
+                waits.append(deadline - now)
+            if launched == 1 and delay is not None:
+                waits.append(start + delay - now)
+            wait = max(0.0, min(waits)) if waits else None
+            try:
+                ok, value = results.get(timeout=wait)
+            except queue.Empty:
+                if deadline is not None and time.monotonic() >= deadline:
+                    metrics.inc('llm_deadline_exceeded_total')
+                    raise TimeoutError(f"Gemini call exceeded its {self.timeout}s deadline")
+                if launched == 1 and delay is not None:
+                    if may_hedge is not None and not may_hedge():
+                        metrics.inc('llm_hedges_skipped_total')
+                        # keep waiting on the first request only
+                        delay = None
+                        continue
+                    launched += 1
+                    metrics.inc('llm_hedged_requests_total')
+                    threading.Thread(target=attempt, daemon=True).start()
+                continue
+            if ok:
+                return value
+            failures += 1
+            if failures >= launched:
+                raise value
@@ -0,0 +1,29 @@
+"""Jittered retries for slow network calls"""
+import random
+import time
+
+
+def backoff_delay(attempt, base_delay=0.5, max_delay=8.0):
+    """Full-jitter exponential backoff"""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+def retry(fn, *args, retries=2, timeout=None, base_delay=0.5, max_delay=8.0, **kwargs):
+    """Call fn, retrying failures with jittered backoff within a total budget of timeout seconds.
+
+    Attempts run one after another in the calling thread, so a slow attempt
+    is never left running while its retry starts; bound each attempt at its
+    source (the model call's own deadline). No retry starts once the next
+    one could not begin before the budget runs out.
+    """
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    for attempt in range(retries + 1):
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            if attempt == retries:
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                raise
+            time.sleep(delay)
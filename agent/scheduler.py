@@ -0,0 +1,157 @@
+"""Severity-priority ticket queue with aging, and token-bucket rate limiting for Gemini"""
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+
+from .metrics import metrics
+
+SEVERITY_RANK = {'critical': 0, 'high': 1, 'medium': 2, 'low': 3}
+
+
+def submitted_at(ticket, default=None):
+    """Ticket timestamp as epoch seconds (default when missing or unparseable)"""
+    value = ticket.get('timestamp')
+    if value:
+        try:
+            return datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp()
+        except ValueError:
+            pass
+    return time.time() if default is None else default
+
+
+class TicketScheduler:
+    """Thread-safe priority queue of tickets: most severe first, oldest first within a severity.
+
+    Each severity step is worth aging_seconds of waiting, so a low ticket
+    filed 3 * aging_seconds before a critical one is served ahead of it and
+    nothing starves. Age comes from the ticket timestamp, or the time it was
+    queued when it has none.
+    """
+
+    def __init__(self, aging_seconds=600):
+        self.aging_seconds = aging_seconds
+        self._heap = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._depth = {}
+        self._waits = {}
+
+    def priority(self, ticket, now=None):
+        rank = SEVERITY_RANK.get(ticket.get('severity'), SEVERITY_RANK['medium'])
+        return rank * self.aging_seconds + submitted_at(ticket, now)
+
+    def order(self, tickets):
+        """tickets sorted the way the queue would serve them"""
+        now = time.time()
+        return sorted(tickets, key=lambda t: self.priority(t, now))
+
+    def submit(self, ticket):
+        """Queue a ticket; returns a Future the worker that pops it resolves"""
+        future = Future()
+        severity = ticket.get('severity', 'medium')
+        with self._lock:
+            heapq.heappush(self._heap, (self.priority(ticket), next(self._seq), time.monotonic(), ticket, future))
+            self._depth[severity] = self._depth.get(severity, 0) + 1
+        metrics.inc('scheduler_enqueued_total', severity=severity)
+        return future
+
+    def pop_many(self, n):
+        """Up to n (ticket, future) pairs in priority order; empty when the queue is"""
+        items = []
+        with self._lock:
+            now = time.monotonic()
+            while self._heap and len(items) < n:
+                _, _, queued, ticket, future = heapq.heappop(self._heap)
+                severity = ticket.get('severity', 'medium')
+                self._depth[severity] -= 1
+                waits = self._waits.setdefault(severity, {'count': 0, 'total': 0.0, 'max': 0.0})
+                waits['count'] += 1
+                waits['total'] += now - queued
+                waits['max'] = max(waits['max'], now - queued)
+                items.append((ticket, future))
+                metrics.observe('scheduler_wait_seconds', now - queued, severity=severity)
+        return items
+
+    def __len__(self):
+        return len(self._heap)
+
+    def stats(self):
+        """Queue depth and wait times (seconds from submit to pop) per severity"""
+        with self._lock:
+            return {
+                'depth': {s: n for s, n in self._depth.items() if n},
+                'waits': {s: {'count': w['count'], 'mean': w['total'] / w['count'], 'max': w['max']}
+                          for s, w in self._waits.items()}
+            }
+
+
+class TokenBucket:
+    """rate units per `per` seconds, with bursts up to capacity (default: one period's worth)"""
+
+    def __init__(self, rate, per=60.0, capacity=None):
+        self.fill_rate = rate / per
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount=1):
+        """Take amount now and return how long the caller must wait before using it.
+
+        Reservations may run the bucket negative, so concurrent callers queue
+        up behind each other instead of racing for the refill.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+            self.updated = now
+            self.tokens -= min(amount, self.capacity)
+            return max(0.0, -self.tokens / self.fill_rate)
+
+    def try_take(self, amount=1):
+        """Take amount only if it is available right now; True if taken"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+            self.updated = now
+            if self.tokens < min(amount, self.capacity):
+                return False
+            self.tokens -= min(amount, self.capacity)
+            return True
+
+    def refund(self, amount=1):
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class RateLimiter:
+    """Requests-per-minute and (estimated) tokens-per-minute limits; None disables either"""
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    def acquire(self, tokens=0):
+        """Block until one request of `tokens` tokens is allowed; returns seconds waited"""
+        wait = 0.0
+        if self.requests:
+            wait = self.requests.reserve(1)
+        if self.tokens and tokens:
+            wait = max(wait, self.tokens.reserve(tokens))
+        if wait:
+            metrics.observe('llm_rate_limit_wait_seconds', wait)
+            time.sleep(wait)
+        return wait
+
+    def try_acquire(self, tokens=0):
+        """Take one request of `tokens` tokens only if the limits allow it right now"""
+        if self.requests and not self.requests.try_take(1):
+            return False
+        if self.tokens and tokens and not self.tokens.try_take(tokens):
+            if self.requests:
+                self.requests.refund(1)
+            return False
+        return True
@@ -0,0 +1,152 @@
+"""Inverted index with BM25 ranking over past issue descriptions"""
+import heapq
+import math
+import re
+from collections import defaultdict
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[._/-][a-z0-9]+)*")
+
+STOPWORDS = frozenset("""
+a an and are as at be been but by can did do does doing done for from has have
+having he her his i if in into is it its itself me my no not now of on once only
+or our out over she so some such than that the their them then there these they
+this those to too up used very was we were what when where which while who why
+will with would you your after before again all any because being below between
+both during each few further here how just more most other own same should
+still under until getting showing working
+""".split())
+
+
+def tokenize(text):
+    """Lowercase word tokens with stopwords removed"""
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+class InvertedIndex:
+    """Term -> {doc_id: (tf, doc length)} postings, scored with Okapi BM25.
+
+    Doc ids are plain ints handed out by the caller (the position in Memory's
+    record list). Each distinct text is indexed once: adding a text again
+    moves it to the new doc id, so the newest copy is the one returned.
+
+    Postings are kept in recency order and capped at max_postings per term,
+    so a query touches at most terms x max_postings postings however big the
+    history gets; a frequent term only reaches its most recent documents
+    (rare terms keep all of theirs). Document frequencies still count every
+    document, so idf is unaffected. max_postings=None keeps everything.
+    """
+
+    def __init__(self, k1=1.2, b=0.75, max_df_ratio=0.5, max_postings=500):
+        self.k1 = k1
+        self.b = b
+        # terms in more than this share of documents are treated as stopwords
+        self.max_df_ratio = max_df_ratio
+        self.max_postings = max_postings
+        self.postings = defaultdict(dict)
+        self.df = defaultdict(int)
+        self.total_length = 0
+        # for score upper bounds: highest tf and shortest document per term
+        self.max_tf = defaultdict(int)
+        self.min_length = {}
+        # text -> doc_id of its current copy
+        self._texts = {}
+        # shared (tf, length) tuples; short texts repeat a handful of them
+        self._pairs = {}
+
+    def __len__(self):
+        return len(self._texts)
+
+    def add(self, doc_id, text):
+        tokens = tokenize(text)
+        counts = defaultdict(int)
+        for token in tokens:
+            counts[token] += 1
+        old_id = self._texts.get(text)
+        if old_id is not None:
+            for token in counts:
+                # re-inserted below, at the recent end
+                self.postings[token].pop(old_id, None)
+        else:
+            for token in counts:
+                self.df[token] += 1
+            self.total_length += len(tokens)
+        self._texts[text] = doc_id
+        for token, tf in counts.items():
+            pair = self._pairs.setdefault((tf, len(tokens)), (tf, len(tokens)))
+            postings = self.postings[token]
+            postings[doc_id] = pair
+            if tf > self.max_tf[token]:
+                self.max_tf[token] = tf
+            if len(tokens) < self.min_length.get(token, len(tokens) + 1):
+                self.min_length[token] = len(tokens)
+            if self.max_postings and len(postings) > self.max_postings:
+                # drop the oldest (dicts keep insertion order)
+                del postings[next(iter(postings))]
+
+    def search(self, text, k=3):
+        """Return [(score, doc_id)] for the k best matches, best first.
+
+        Terms are scored rarest first. Once the k-th best score beats what a
+        document could still collect from the remaining terms (their idf times
+        the best possible BM25 term weight), no new documents are admitted and
+        candidates that can no longer reach the top k are dropped, so the
+        common terms only touch the few documents still in the running. The
+        documents matching every term are scored first to get that k-th best
+        score early.
+        """
+        n = len(self._texts)
+        if not n:
+            return []
+        avg_length = self.total_length / n or 1.0
+        terms = [t for t in set(tokenize(text)) if self.postings.get(t)]
+        if len(terms) > 1 and n > 100:
+            common = [t for t in terms if self.df[t] > self.max_df_ratio * n]
+            if len(common) < len(terms):
+                terms = [t for t in terms if t not in common]
+        k1, b = self.k1, self.b
+
+        def weigh(idf, pair):
+            tf, length = pair
+            return idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg_length))
+
+        weighted = sorted(((math.log(1 + (n - self.df[t] + 0.5) / (self.df[t] + 0.5)), t) for t in terms),
+                          reverse=True)
+        bounds = [weigh(idf, (self.max_tf[t], self.min_length[t])) for idf, t in weighted]
+        # a lower bound on the final k-th best score, from documents with every term
+        floor = None
+        if len(weighted) > 1:
+            matches = set(self.postings[weighted[0][1]]).intersection(*(self.postings[t] for _, t in weighted[1:]))
+            if len(matches) >= k:
+                full = [sum(weigh(idf, self.postings[t][d]) for idf, t in weighted) for d in matches]
+                floor = heapq.nlargest(k, full)[-1]
+        # most a document can still gain from the terms not scored yet
+        remaining = sum(bounds)
+        scores = {}
+        for (idf, token), bound in zip(weighted, bounds):
+            postings = self.postings[token]
+            # pair -> term weight, computed once per query
+            weights = {}
+            threshold = floor
+            # partial sums can only beat the floor once enough terms are in
+            if len(scores) >= k and (floor is None or sum(bounds) - remaining > floor):
+                partial = heapq.nlargest(k, scores.values())[-1]
+                threshold = partial if floor is None else max(floor, partial)
+            if threshold is None or threshold <= remaining:
+                for doc_id, pair in postings.items():
+                    weight = weights.get(pair)
+                    if weight is None:
+                        weight = weights[pair] = weigh(idf, pair)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + weight
+            else:
+                # nothing unseen can make the top k any more
+                scores = {d: s for d, s in scores.items() if s + remaining >= threshold}
+                for doc_id in scores:
+                    pair = postings.get(doc_id)
+                    if pair is not None:
+                        weight = weights.get(pair)
+                        if weight is None:
+                            weight = weights[pair] = weigh(idf, pair)
+                        scores[doc_id] += weight
+            remaining -= bound
+        # ties go to the most recent record
+        return heapq.nlargest(k, ((s, d) for d, s in scores.items()))
@@ -0,0 +1,85 @@
+"""Incremental parsing of a JSON object reply while it streams in"""
+import json
+import re
+
+PARTIAL_STRING_RE = re.compile(r'\s*"((?:[^"\\]|\\.)*)"\s*:\s*"((?:[^"\\]|\\.)*)\\?$', re.S)
+
+
+class JSONObjectStream:
+    """Feed reply chunks; each top-level field is parsed as soon as its value ends.
+
+    Text before the opening brace (```json fences, stray prose) is skipped and
+    nested values are returned whole. The string value still being received,
+    if any, is available from partial().
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.fields = {}
+        self.done = False
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        # start of the member (key: value) currently being read
+        self._member_start = None
+
+    def feed(self, text):
+        """Add a chunk; returns the fields completed by it as a dict"""
+        self.buffer += text
+        completed = {}
+        buffer = self.buffer
+        for pos in range(self._pos, len(buffer)):
+            if self.done:
+                break
+            char = buffer[pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                if self._depth > 0:
+                    self._in_string = True
+            elif char in '{[':
+                self._depth += 1
+                if self._depth == 1:
+                    self._member_start = pos + 1
+            elif char in '}]':
+                if self._depth == 1:
+                    self._complete(buffer[self._member_start:pos], completed)
+                    self.done = True
+                self._depth -= 1
+            elif char == ',' and self._depth == 1:
+                self._complete(buffer[self._member_start:pos], completed)
+                self._member_start = pos + 1
+        self._pos = len(buffer)
+        return completed
+
+    def partial(self):
+        """(key, text so far) of a top-level string value that has not ended yet, or None"""
+        if not self._in_string or self._depth != 1 or self._member_start is None:
+            return None
+        match = PARTIAL_STRING_RE.match(self.buffer, self._member_start)
+        if not match:
+            return None
+        raw = match.group(2)
+        if raw.endswith('\\'):
+            raw = raw[:-1]
+        try:
+            return json.loads(f'"{match.group(1)}"'), json.loads(f'"{raw}"')
+        except ValueError:
+            # cut inside a \uXXXX escape; wait for the next chunk
+            return None
+
+    def _complete(self, member, completed):
+        if not member.strip():
+            return
+        try:
+            field = json.loads("{" + member + "}")
+        except ValueError:
+            return
+        self.fields.update(field)
+        completed.update(field)
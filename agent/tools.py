@@ -1,22 +1,146 @@
 """External tools using Gemini API"""
-import google.generativeai as genai
+import json
+import threading
+import time
 
-genai.configure(api_key='enter-api-key-here')
+from .cache import ResponseCache
+from .context import build_context, estimate_tokens
+from .metrics import metrics, SIZE_BUCKETS
+from .resilience import MalformedResponse, ResilientCaller
+from .streaming import JSONObjectStream
+
+API_KEY = 'enter-api-key-here'
+MODEL_NAME = 'gemini-2.5-flash'
+
+# the SDK is imported and configured on first use, and each model client is
+# shared by every analyzer in the process
+_models = {}
+_models_lock = threading.Lock()
+
+def get_model(model_name):
+    """Process-wide GenerativeModel for model_name"""
+    with _models_lock:
+        if model_name not in _models:
+            import google.generativeai as genai
+            if not _models:
+                genai.configure(api_key=API_KEY)
+            _models[model_name] = genai.GenerativeModel(model_name)
+        return _models[model_name]
+
+ROOT_CAUSES = (
+    "merchant_config_error",
+    "platform_bug",
+    "migration_issue",
+    "documentation_gap",
+    "api_misconfiguration",
+)
 
 class TicketAnalyzer:
-    def __init__(self):
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
-    
-    def analyze(self, ticket, context):
-        """Analyze ticket to find root cause"""
-        prompt = f"""You are analyzing a support ticket during a headless e-commerce migration.
+    def __init__(self, model_name=MODEL_NAME, cache=None, use_cache=True, model=None, context_chars=600,
+                 rate_limiter=None, resilience=None):
+        self.model_name = model_name
+        self._model = model
+        # character budget for the past-issues block of each ticket
+        self.context_chars = context_chars
+        # size of the most recent prompt, from any thread: {'chars': ..., 'tokens': ...}
+        self.last_prompt_size = None
+        # optional scheduler.RateLimiter applied to every real Gemini request
+        self.rate_limiter = rate_limiter
+        # deadline, hedging and circuit breaker around every Gemini request
+        self.resilience = resilience if resilience is not None else ResilientCaller()
+        self.cache = cache if cache is not None or not use_cache else ResponseCache()
+        # set to skip cache lookups (responses are still written back)
+        self.bypass_cache = False
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = get_model(self.model_name)
+        return self._model
+
+    @model.setter
+    def model(self, model):
+        self._model = model
+
+    def render_context(self, context):
+        """Past issues (as returned by Memory.get_similar_issues) as compact prompt lines"""
+        if isinstance(context, str):
+            return context[:self.context_chars]
+        return build_context(context, self.context_chars)
+
+    def analyze(self, ticket, context, bypass_cache=False):
+        """Analyze ticket to find root cause.
+
+        Raises MalformedResponse if the reply is not a valid analysis,
+        CircuitOpenError while the breaker is open and TimeoutError past the
+        deadline.
+        """
+        result = self._generate_json(self._analysis_prompt(ticket, context), bypass_cache, check=valid_analysis)
+        result['confidence'] = float(result['confidence'])
+        return result
+
+    def analyze_stream(self, ticket, context, bypass_cache=False):
+        """analyze() that yields the analysis while the reply is still streaming.
+
+        Each item is a dict of the fields received so far (a string still
+        arriving is cut short); the last one is the complete analysis. The
+        prompt asks for root_cause and confidence first, so a decision can be
+        made before the explanation has finished. Raises like analyze().
+        """
+        prompt = self._analysis_prompt(ticket, context)
+        text = self._cached(prompt, bypass_cache)
+        if text is not None:
+            try:
+                yield self._parse(text, valid_analysis)
+                return
+            except MalformedResponse:
+                # bad cache entry; ask the model again
+                pass
+
+        parser = JSONObjectStream()
+        chunks = []
+        start = time.perf_counter()
+        decided = False
+        timeout = self.resilience.timeout
+        self._throttle(prompt)
+        with self.resilience.guarded(), metrics.span('llm_request', model=self.model_name, mode='stream'):
+            for chunk in self.model.generate_content(prompt, stream=True, **self._request_options()):
+                if timeout and time.perf_counter() - start > timeout:
+                    metrics.inc('llm_deadline_exceeded_total')
+                    raise TimeoutError(f"Gemini stream exceeded its {timeout}s deadline")
+                try:
+                    chunk_text = chunk.text
+                except ValueError:
+                    # chunk without text parts (e.g. only a finish reason)
+                    continue
+                chunks.append(chunk_text)
+                completed = parser.feed(chunk_text)
+                analysis = dict(parser.fields)
+                partial = parser.partial()
+                if partial and partial[0] not in analysis:
+                    analysis[partial[0]] = partial[1]
+                if not decided and 'root_cause' in analysis and 'confidence' in analysis:
+                    decided = True
+                    metrics.observe('llm_time_to_decision_seconds', time.perf_counter() - start)
+                if completed or partial:
+                    yield analysis
+            text = "".join(chunks)
+            result = self._parse(text, valid_analysis)
+        metrics.observe('llm_response_chars', len(text), buckets=SIZE_BUCKETS)
+        result['confidence'] = float(result['confidence'])
+        self._remember(prompt, text)
+        yield result
+
+    def _analysis_prompt(self, ticket, context):
+        context = self.render_context(context)
+        return f"""You are analyzing a support ticket during a headless e-commerce migration.
 
 TICKET:
 Merchant: {ticket['merchant_id']}
 Issue: {ticket['description']}
 Severity: {ticket['severity']}
 
-CONTEXT FROM PAST ISSUES:
+CONTEXT FROM PAST ISSUES (description | root cause | outcome):
 {context}
 
 Identify the ROOT CAUSE from these categories:
@@ -29,16 +153,163 @@ Identify the ROOT CAUSE from these categories:
 Respond in JSON:
 {{
   "root_cause": "category",
-  "reasoning": "brief explanation",
-  "confidence": 0.0-1.0
+  "confidence": 0.0-1.0,
+  "reasoning": "brief explanation"
 }}"""
-        
-        response = self.model.generate_content(prompt)
-        import json
-        return json.loads(response.text.strip().replace('```json', '').replace('```', ''))
+
+    def _generate_json(self, prompt, bypass_cache=False, check=None):
+        """Call the model (or the cache) and parse the JSON reply.
+
+        Replies that don't parse, or fail check(), raise MalformedResponse and
+        count as failures for the circuit breaker.
+        """
+        text = self._cached(prompt, bypass_cache)
+        if text is not None:
+            try:
+                return self._parse(text, check)
+            except MalformedResponse:
+                # bad cache entry; ask the model again
+                pass
+        self._throttle(prompt)
+
+        def request():
+            reply = self.model.generate_content(prompt, **self._request_options()).text
+            return reply, self._parse(reply, check)
+
+        with metrics.span('llm_request', model=self.model_name):
+            text, result = self.resilience.call(request, may_hedge=lambda: self._may_hedge(prompt))
+        metrics.observe('llm_response_chars', len(text), buckets=SIZE_BUCKETS)
+        self._remember(prompt, text)
+        return result
+
+    def _request_options(self):
+        # the SDK enforces the deadline on the HTTP request too
+        timeout = self.resilience.timeout
+        return {'request_options': {'timeout': timeout}} if timeout else {}
+
+    @staticmethod
+    def _parse(text, check=None):
+        try:
+            result = parse_json(text)
+        except ValueError as e:
+            metrics.inc('llm_malformed_responses_total')
+            raise MalformedResponse(f"reply is not JSON: {text[:200]!r}") from e
+        if check is not None and not check(result):
+            metrics.inc('llm_malformed_responses_total')
+            raise MalformedResponse(f"reply is not a valid analysis: {text[:200]!r}")
+        return result
+
+    def _cached(self, prompt, bypass_cache=False):
+        """Cached reply text for prompt, or None when the model has to be called"""
+        size = {'chars': len(prompt), 'tokens': estimate_tokens(prompt)}
+        self.last_prompt_size = size
+        use_cache = self.cache is not None and not (bypass_cache or self.bypass_cache)
+        text = self.cache.get(self.model_name, prompt) if use_cache else None
+        if use_cache:
+            metrics.inc('llm_cache_lookups_total', result='miss' if text is None else 'hit')
+        if text is None:
+            metrics.observe('llm_prompt_chars', len(prompt), buckets=SIZE_BUCKETS)
+            metrics.observe('llm_prompt_tokens_estimate', size['tokens'], buckets=SIZE_BUCKETS)
+        return text
+
+    def _throttle(self, prompt):
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(estimate_tokens(prompt))
+
+    def _may_hedge(self, prompt):
+        # a hedge is one more request against the rate limits, but never worth waiting for
+        return self.rate_limiter is None or self.rate_limiter.try_acquire(estimate_tokens(prompt))
+
+    def _remember(self, prompt, text):
+        # only called with replies that parsed
+        if self.cache is not None:
+            self.cache.put(self.model_name, prompt, text)
+
+    def analyze_batch(self, tickets, contexts, bypass_cache=False):
+        """Analyze several tickets in one request; returns analyses in input order.
+
+        The model is asked for a JSON array keyed by ticket id. Entries that are
+        missing or malformed are re-run one at a time through analyze().
+        """
+        if len(tickets) == 1:
+            return [self.analyze(tickets[0], contexts[0], bypass_cache)]
+
+        # ids must be unique within the request to split the reply
+        keys = []
+        for i, ticket in enumerate(tickets):
+            key = str(ticket['id'])
+            keys.append(key if key not in keys else f"{key}#{i}")
+
+        blocks = []
+        for key, ticket, context in zip(keys, tickets, contexts):
+            blocks.append(f"""TICKET {key}:
+Merchant: {ticket['merchant_id']}
+Issue: {ticket['description']}
+Severity: {ticket['severity']}
+Context from past issues (description | root cause | outcome):
+{self.render_context(context)}""")
+        categories = "\n".join(f"- {c}" for c in ROOT_CAUSES)
+        tickets_text = "\n\n".join(blocks)
+        prompt = f"""You are analyzing {len(tickets)} support tickets during a headless e-commerce migration.
+
+{tickets_text}
+
+For EACH ticket, identify the ROOT CAUSE from these categories:
+{categories}
+
+Respond with a JSON array containing one object per ticket:
+[
+  {{
+    "ticket_id": "id as given above",
+    "root_cause": "category",
+    "reasoning": "brief explanation",
+    "confidence": 0.0-1.0
+  }}
+]"""
+
+        try:
+            reply = self._generate_json(prompt, bypass_cache)
+        except ValueError:
+            reply = []
+        by_key = {}
+        if isinstance(reply, list):
+            for entry in reply:
+                if isinstance(entry, dict) and valid_analysis(entry):
+                    by_key[str(entry.get('ticket_id'))] = entry
+
+        analyses = []
+        for key, ticket, context in zip(keys, tickets, contexts):
+            entry = by_key.get(key)
+            if entry is None:
+                analyses.append(self.analyze(ticket, context, bypass_cache))
+            else:
+                entry = dict(entry)
+                entry.pop('ticket_id', None)
+                entry['confidence'] = float(entry['confidence'])
+                analyses.append(entry)
+        return analyses
+
+def valid_analysis(entry):
+    """True if a parsed reply has a known root cause and a 0-1 confidence"""
+    if not isinstance(entry, dict):
+        return False
+    try:
+        confidence = float(entry.get('confidence'))
+    except (TypeError, ValueError):
+        return False
+    return entry.get('root_cause') in ROOT_CAUSES and 0.0 <= confidence <= 1.0
+
+def parse_json(text):
+    """Parse a model reply, tolerating ```json fences"""
+    return json.loads(text.strip().replace('```json', '').replace('```', ''))
 
 class ActionExecutor:
     def execute(self, decision):
         """Execute approved actions (simulation)"""
         print(f"✅ Executing: {decision['action']}")
         return {"status": "completed", "action": decision['action']}
+
+    def execute_group(self, action, merchants):
+        """Execute one action once for a set of merchants (simulation)"""
+        print(f"✅ Executing: {action} for {len(merchants)} merchant(s): {', '.join(merchants)}")
+        return {"status": "completed", "action": action}
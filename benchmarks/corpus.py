@@ -0,0 +1,68 @@
+"""Synthetic ticket and memory corpora for benchmarks"""
+import json
+import random
+
+from agent.tools import ROOT_CAUSES
+
+COMPONENTS = ["Checkout button", "Webhook for order.created", "Product images", "Payment status",
+              "Cart page", "Inventory sync", "Customer login", "Search results", "Shipping rates",
+              "Discount codes", "Order confirmation email", "Storefront API"]
+SYMPTOMS = ["not working", "not firing", "not loading", "returns 404", "returns 403 forbidden",
+            "times out", "shows stale data", "shows wrong currency", "is duplicated", "fails silently"]
+CONTEXTS = ["after migration", "since headless cutover", "on /api/checkout endpoint",
+            "used to work before headless migration", "only on mobile", "for EU merchants",
+            "after API key rotation", "when theme is customized"]
+ACTIONS = {
+    "merchant_config_error": "Send config fix guide to merchant",
+    "platform_bug": "Escalate to engineering + apply hotfix",
+    "migration_issue": "Rollback merchant to hosted mode",
+    "documentation_gap": "Update docs + notify affected merchants",
+    "api_misconfiguration": "Auto-fix API keys + notify merchant",
+}
+SEVERITIES = ["low", "medium", "high", "critical"]
+
+
+def description(rng, unique_share=0.3):
+    """Random description; most repeat a known template, like real migration volume"""
+    text = f"{rng.choice(COMPONENTS)} {rng.choice(SYMPTOMS)} {rng.choice(CONTEXTS)}"
+    if rng.random() < unique_share:
+        text += f" (ref {rng.randrange(10 ** 6)})"
+    return text
+
+
+def tickets(n, seed=0):
+    rng = random.Random(seed)
+    return [{
+        # seeded, so the corpora of different seeds never share ids (run()
+        # would replay them instead of analyzing them)
+        'id': f"B{seed}-{i:07d}",
+        'merchant_id': f"M-{rng.randrange(10000):04d}",
+        'description': description(rng),
+        'severity': rng.choice(SEVERITIES),
+        'timestamp': f"2025-01-{1 + i % 28:02d}T{i % 24:02d}:00:00Z"
+    } for i in range(n)]
+
+
+def memory_records(n, seed=1):
+    rng = random.Random(seed)
+    records = []
+    for i in range(n):
+        root_cause = rng.choice(ROOT_CAUSES)
+        status = "completed" if rng.random() < 0.85 else "rejected_by_human"
+        result = {"status": status}
+        if status == "completed":
+            result["action"] = ACTIONS[root_cause]
+        records.append({
+            'ticket_id': f"H-{i:07d}",
+            'description': description(rng),
+            'root_cause': root_cause,
+            'action': ACTIONS[root_cause],
+            'confidence': round(rng.uniform(0.5, 0.99), 2),
+            'result': result
+        })
+    return records
+
+
+def write_memory_snapshot(path, n, seed=1):
+    with open(path, 'w') as f:
+        json.dump({"resolved_issues": memory_records(n, seed)}, f)
@@ -0,0 +1,50 @@
+"""Local stand-in for genai.GenerativeModel with configurable latency and errors"""
+import json
+import random
+import re
+import threading
+import time
+
+from agent.tools import ROOT_CAUSES
+
+TICKET_RE = re.compile(r"^TICKET (\S+):", re.M)
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    """Answers analysis prompts after latency +/- jitter seconds, failing at error_rate"""
+
+    def __init__(self, latency=0.5, jitter=0.1, error_rate=0.0, seed=0):
+        self.model_name = 'fake-gemini'
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.calls = 0
+        self.errors = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        with self._lock:
+            self.calls += 1
+            delay = max(0.0, self._rng.uniform(self.latency - self.jitter, self.latency + self.jitter))
+            fail = self._rng.random() < self.error_rate
+            root_cause = self._rng.choice(ROOT_CAUSES)
+            confidence = round(self._rng.uniform(0.5, 0.99), 2)
+        time.sleep(delay)
+        if fail:
+            with self._lock:
+                self.errors += 1
+            raise RuntimeError("fake model error")
+        answer = {"root_cause": root_cause, "confidence": confidence, "reasoning": "synthetic"}
+        ids = TICKET_RE.findall(prompt)
+        if ids:
+            return FakeResponse(json.dumps([dict(answer, ticket_id=i) for i in ids]))
+        text = "```json\n" + json.dumps(answer) + "\n```"
+        if stream:
+            return [FakeResponse(text[i:i + 16]) for i in range(0, len(text), 16)]
+        return FakeResponse(text)
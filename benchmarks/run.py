@@ -0,0 +1,227 @@
+"""Benchmark the agent pipeline against a local Gemini stand-in.
+
+Run from the project root:
+
+    python -m benchmarks.run --tickets 200 --sizes 1000,10000,100000 --output bench_results.json
+    python -m benchmarks.run --compare old.json new.json
+
+Everything runs in a temporary working directory, so data/ is never touched.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from agent.agent import SupportAgent
+from agent.memory import Memory
+from benchmarks import corpus
+from benchmarks.fake_model import FakeGenerativeModel
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def summarize(samples):
+    """Latency percentiles in milliseconds"""
+    if not samples:
+        return {'n': 0}
+    ordered = sorted(samples)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000
+
+    return {
+        'n': len(ordered),
+        'mean_ms': sum(ordered) / len(ordered) * 1000,
+        'p50_ms': pct(50),
+        'p95_ms': pct(95),
+        'p99_ms': pct(99),
+        'max_ms': ordered[-1] * 1000
+    }
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def make_agent(args):
+    agent = SupportAgent(
+        dedup_threshold=None if args.no_dedup else 0.9,
+        local_threshold=None if args.no_local else 0.9,
+        concurrency=args.concurrency,
+        batch_size=args.batch_size
+    )
+    agent.analyzer.model = FakeGenerativeModel(args.latency, args.jitter, args.error_rate)
+    agent.analyzer.cache = None
+    return agent
+
+
+def bench_pipeline(args):
+    """Per-stage latency for sequential processing, then batch throughput"""
+    corpus.write_memory_snapshot('data/memory.json', args.memory_size)
+    agent = make_agent(args)
+    stages = {'reason': [], 'decide': [], 'act': []}
+    errors = 0
+    start = time.perf_counter()
+    for ticket in corpus.tickets(args.tickets, seed=2):
+        t0 = time.perf_counter()
+        try:
+            analysis = agent.reason(ticket)
+        except Exception:
+            errors += 1
+            continue
+        t1 = time.perf_counter()
+        decision = agent.decide(ticket, analysis)
+        t2 = time.perf_counter()
+        agent.act(ticket, decision)
+        t3 = time.perf_counter()
+        stages['reason'].append(t1 - t0)
+        stages['decide'].append(t2 - t1)
+        stages['act'].append(t3 - t2)
+    sequential = time.perf_counter() - start
+
+    batch_tickets = corpus.tickets(args.tickets, seed=3)
+    start = time.perf_counter()
+    agent.run(batch_tickets)
+    batch = time.perf_counter() - start
+    agent.memory.close()
+
+    return {
+        'stages': {name: summarize(samples) for name, samples in stages.items()},
+        'sequential': {'tickets': args.tickets, 'seconds': sequential,
+                       'tickets_per_s': args.tickets / sequential, 'errors': errors},
+        'batch_run': {'tickets': args.tickets, 'seconds': batch,
+                      'tickets_per_s': args.tickets / batch},
+        'llm_calls': agent.analyzer.model.calls,
+        'llm_errors': agent.analyzer.model.errors,
+        'local_classifier': agent.classifier.stats() if agent.classifier else None
+    }
+
+
+def bench_memory(size, queries, stores):
+    """load / get_similar_issues / store timings at one history size"""
+    path = f"memory_{size}.json"
+    corpus.write_memory_snapshot(path, size)
+    start = time.perf_counter()
+    memory = Memory(path, compact_threshold=0)
+    load = time.perf_counter() - start
+
+    lookups = []
+    for ticket in corpus.tickets(queries, seed=4):
+        t0 = time.perf_counter()
+        memory.get_similar_issues(ticket['description'])
+        lookups.append(time.perf_counter() - t0)
+
+    writes = []
+    decision = {'action': 'Rollback merchant to hosted mode', 'root_cause': 'migration_issue', 'confidence': 0.9}
+    for ticket in corpus.tickets(stores, seed=5):
+        t0 = time.perf_counter()
+        memory.store(ticket, decision, {'status': 'completed'})
+        writes.append(time.perf_counter() - t0)
+    memory.close()
+    return {'records': size, 'load_s': load,
+            'get_similar_issues': summarize(lookups), 'store': summarize(writes)}
+
+
+def flatten(result, prefix=''):
+    for key, value in result.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from flatten(value, name + '.')
+        elif isinstance(value, list):
+            for i, item in enumerate(value):
+                if isinstance(item, dict):
+                    yield from flatten(item, f"{name}[{item.get('records', i)}].")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield name, value
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = dict(flatten(json.load(f)['results']))
+    with open(new_path) as f:
+        new = dict(flatten(json.load(f)['results']))
+    for name in sorted(old.keys() & new.keys()):
+        before, after = old[name], new[name]
+        change = f"{(after - before) / before:+.1%}" if before else "n/a"
+        print(f"{name:60s} {before:12.3f} {after:12.3f} {change:>8s}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tickets', type=int, default=200)
+    parser.add_argument('--memory-size', type=int, default=1000, help="history size for the pipeline run")
+    parser.add_argument('--sizes', default='1000,10000,100000', help="history sizes for the Memory curves")
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--stores', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.5, help="fake model latency (s)")
+    parser.add_argument('--jitter', type=float, default=0.1)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--no-dedup', action='store_true')
+    parser.add_argument('--no-local', action='store_true')
+    parser.add_argument('--skip-pipeline', action='store_true')
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    output = os.path.abspath(args.output)
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        os.makedirs('data')
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                if not args.skip_pipeline:
+                    results['pipeline'] = bench_pipeline(args)
+                results['memory'] = [
+                    bench_memory(int(size), args.queries, args.stores)
+                    for size in args.sizes.split(',') if size
+                ]
+        finally:
+            os.chdir(cwd)
+    results['peak_rss_mb'] = peak_rss_mb()
+
+    report = {
+        'revision': git_revision(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'args': vars(args),
+        'results': results
+    }
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    for name, value in flatten(results):
+        print(f"{name:60s} {value:12.3f}")
+    print(f"\nwrote {output}")
+
+
+if __name__ == '__main__':
+    main()
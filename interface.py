@@ -1,7 +1,12 @@
+import os
+import tempfile
 import streamlit as st
-import json
 from datetime import datetime
 from agent.agent import SupportAgent
+from agent.export import FORMATS, write_export
+from agent.ids import submission_id
+from agent.metrics import metrics
+from agent.tools import ROOT_CAUSES
 
 # Page config
 st.set_page_config(
@@ -10,9 +15,27 @@ st.set_page_config(
     layout="wide"
 )
 
+def discard_export():
+    """Delete the prepared export file once it is downloaded or replaced"""
+    export = st.session_state.pop('export', None)
+    if export:
+        try:
+            os.remove(export['path'])
+        except FileNotFoundError:
+            pass
+
+@st.cache_resource
+def get_agent():
+    """One agent (Gemini client, memory store, caches) shared by every browser session.
+
+    Its shared state is locked (inbox, memory, caches, breaker) or kept per
+    thread (last_incidents), since each session runs the script in its own thread.
+    """
+    return SupportAgent()
+
 # Initialize session state
 if 'agent' not in st.session_state:
-    st.session_state.agent = SupportAgent()
+    st.session_state.agent = get_agent()
 
 if 'ticket_history' not in st.session_state:
     st.session_state.ticket_history = []
@@ -20,6 +43,79 @@ if 'ticket_history' not in st.session_state:
 if 'processing_log' not in st.session_state:
     st.session_state.processing_log = []
 
+# ticket id -> {'ticket', 'analysis', 'decision', 'result'}; survives reruns so
+# button clicks never repeat an LLM call or an action
+if 'pipeline' not in st.session_state:
+    st.session_state.pipeline = {}
+
+def analyze_ticket(ticket, analysis=None, on_update=None):
+    """Reason + decide once per ticket id; later calls return the memoized state.
+
+    With on_update, the analysis is streamed and on_update(analysis, decision)
+    is called as fields arrive (decision is None until it can be made).
+    """
+    state = st.session_state.pipeline.get(ticket['id'])
+    if state is None:
+        agent = st.session_state.agent
+        # a resubmitted or replayed ticket gets its stored result back
+        previous = agent.lookup(ticket)
+        if previous:
+            state = dict(previous, ticket=ticket)
+            if state['result']['status'] == 'pending_approval':
+                state['result'] = None
+            st.session_state.pipeline[ticket['id']] = state
+            return state
+        decision = None
+        if analysis is None and on_update is not None:
+            for analysis, decision in agent.reason_stream(ticket):
+                on_update(analysis, decision)
+        elif analysis is None:
+            analysis = agent.reason(ticket)
+        state = {
+            'ticket': ticket,
+            'analysis': analysis,
+            'decision': decision or agent.decide(ticket, analysis),
+            'result': None
+        }
+        if state['decision']['needs_human_approval']:
+            # into the shared approval queue, so it can also be handled from the
+            # Approval Queue tab, another session or the CLI
+            agent.act(ticket, state['decision'], analysis=analysis)
+        st.session_state.pipeline[ticket['id']] = state
+    return state
+
+def record_outcome(state, result):
+    """Store the result on the ticket state and in the session history"""
+    if result is None:
+        # another approver got there first; show what they decided
+        previous = st.session_state.agent.lookup(state['ticket'])
+        result = previous['result'] if previous else None
+    if result is None or result['status'] == 'pending_approval':
+        return
+    state['result'] = result
+    st.session_state.ticket_history.append({
+        'ticket': state['ticket'],
+        'analysis': state['analysis'],
+        'decision': state['decision'],
+        'result': result,
+        'approved': result['status'] != 'rejected_by_human'
+    })
+
+def execute_ticket(state, approved=False):
+    """Run act() for a ticket exactly once (approved releases it from the approval queue)"""
+    if state['result'] is None:
+        agent = st.session_state.agent
+        if approved:
+            result = agent.approve(state['ticket']['id'])
+        else:
+            result = agent.act(state['ticket'], state['decision'], analysis=state['analysis'])
+        record_outcome(state, result)
+    return state['result']
+
+def reject_ticket(state):
+    if state['result'] is None:
+        record_outcome(state, st.session_state.agent.reject(state['ticket']['id']))
+
 # Custom CSS
 st.markdown("""
 <style>
@@ -99,16 +195,17 @@ st.markdown("*Intelligent ticket processing for E-commerce website*")
 st.markdown("---")
 
 # Create tabs
-tab1, tab2, tab3 = st.tabs([
+tab1, tab2, tab3, tab4 = st.tabs([
     "📝 Submit Ticket",
     "📂 Process Pending Tickets", 
+    f"⚠️ Approval Queue ({len(st.session_state.agent.approvals)})",
     "📊 History & Analytics"
 ])
 
 # ============================================================================
 # TAB 1: SUBMIT NEW TICKET
 # ============================================================================
-with tab1:
+with tab1, metrics.span('ui_render', tab='submit'):
     st.header("📝 Submit New Ticket")
     
     col1, col2 = st.columns([2, 1])
@@ -144,139 +241,119 @@ with tab1:
                 st.error("❌ Please fill in all required fields (Merchant ID and Description)")
             else:
                 # Create ticket
+                timestamp = datetime.now().isoformat()
                 ticket = {
-                    'id': f"T-{hash(description) % 10000:04d}",
+                    'id': submission_id(merchant_id, description, timestamp),
                     'merchant_id': merchant_id,
                     'description': description,
                     'severity': severity,
-                    'timestamp': datetime.now().isoformat()
+                    'timestamp': timestamp
                 }
                 
                 st.success(f"✅ Ticket created: {ticket['id']}")
                 
-                # Process ticket
-                with st.spinner("🔍 Analyzing ticket..."):
-                    # Display ticket info
-                    severity_class = f"severity-{severity}"
-                    st.markdown(f"""
-                    <div class="ticket-card {severity_class}">
-                        <h4>📋 Ticket #{ticket['id']}</h4>
-                        <p><strong>Merchant:</strong> {ticket['merchant_id']}</p>
-                        <p><strong>Severity:</strong> {severity.upper()}</p>
-                        <p><strong>Issue:</strong> {ticket['description']}</p>
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    # OBSERVE → REASON
-                    analysis = st.session_state.agent.reason(ticket)
-                    
-                    st.markdown("### 🧠 REASONING ANALYSIS")
-                    confidence_class = "confidence-high" if analysis['confidence'] >= 0.8 else "confidence-medium" if analysis['confidence'] >= 0.6 else "confidence-low"
-                    
-                    st.markdown(f"""
-                    <div class="analysis-box">
-                        <p><strong>Root Cause:</strong> {analysis['root_cause']}</p>
-                        <p><strong>Confidence:</strong> <span class="{confidence_class}">{analysis['confidence']:.0%}</span></p>
-                        <p><strong>Explanation:</strong> {analysis['reasoning']}</p>
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    # DECIDE
-                    decision = st.session_state.agent.decide(ticket, analysis)
-                    
-                    st.markdown("### 💡 PROPOSED ACTION")
-                    st.markdown(f"""
-                    <div class="decision-box">
-                        <p><strong>Action:</strong> {decision['action']}</p>
-                        <p><strong>Risk Level:</strong> {decision['risk_level'].upper()}</p>
-                        <p><strong>Requires Approval:</strong> {'Yes ⚠️' if decision['needs_human_approval'] else 'No ✅'}</p>
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    # Human approval if needed
-                    if decision['needs_human_approval']:
-                        st.markdown("### ⚠️ HIGH RISK - HUMAN APPROVAL REQUIRED")
-                        
-                        # Determine reason for approval
-                        approval_reason = []
-                        if ticket['severity'] == 'critical':
-                            approval_reason.append("Critical severity ticket")
-                        if decision['confidence'] < 0.7:
-                            approval_reason.append(f"Low confidence ({decision['confidence']:.0%})")
-                        if decision['root_cause'] == 'platform_bug':
-                            approval_reason.append("Potential platform bug")
-                        
-                        st.markdown(f"""
-                        <div class="approval-needed">
-                            <h4>🚨 Approval Required</h4>
-                            <p><strong>Reason(s):</strong></p>
-                            <ul>
-                                {''.join([f'<li>{r}</li>' for r in approval_reason])}
-                            </ul>
-                        </div>
-                        """, unsafe_allow_html=True)
-                        
-                        col_approve, col_reject = st.columns(2)
-                        
-                        with col_approve:
-                            if st.button("✅ Approve Action", key="approve", use_container_width=True):
-                                # ACT
-                                result = st.session_state.agent.act(ticket, decision)
-                                
-                                st.markdown("### ⚡ ACTION EXECUTED")
-                                st.markdown(f"""
-                                <div class="result-box">
-                                    <p><strong>Status:</strong> {result['status']}</p>
-                                    <p><strong>Action Taken:</strong> {result['action']}</p>
-                                </div>
-                                """, unsafe_allow_html=True)
-                                
-                                # Add to history
-                                st.session_state.ticket_history.append({
-                                    'ticket': ticket,
-                                    'analysis': analysis,
-                                    'decision': decision,
-                                    'result': result,
-                                    'approved': True
-                                })
-                                
-                                st.balloons()
-                        
-                        with col_reject:
-                            if st.button("❌ Reject Action", key="reject", use_container_width=True):
-                                st.warning("❌ Action REJECTED by human")
-                                st.session_state.agent.memory.store(ticket, decision, {"status": "rejected_by_human"})
-                                
-                                # Add to history
-                                st.session_state.ticket_history.append({
-                                    'ticket': ticket,
-                                    'analysis': analysis,
-                                    'decision': decision,
-                                    'result': {"status": "rejected_by_human"},
-                                    'approved': False
-                                })
-                    else:
-                        # ACT (auto-approved)
-                        result = st.session_state.agent.act(ticket, decision)
-                        
-                        st.markdown("### ⚡ ACTION EXECUTED")
-                        st.markdown(f"""
-                        <div class="result-box">
-                            <p><strong>Status:</strong> {result['status']}</p>
-                            <p><strong>Action Taken:</strong> {result['action']}</p>
-                        </div>
-                        """, unsafe_allow_html=True)
-                        
-                        # Add to history
-                        st.session_state.ticket_history.append({
-                            'ticket': ticket,
-                            'analysis': analysis,
-                            'decision': decision,
-                            'result': result,
-                            'approved': True
-                        })
-                        
-                        st.success("✅ Ticket processed successfully!")
+                # OBSERVE → REASON → DECIDE (memoized, so reruns never re-query Gemini);
+                # the analysis is shown as it streams and replaced by the full view below
+                live = st.empty()
+                live.info("🔍 Analyzing ticket...")
+                
+                def show_progress(analysis, decision):
+                    lines = ["🔍 **Analyzing ticket...**"]
+                    if 'root_cause' in analysis:
+                        lines.append(f"**Root Cause:** {analysis['root_cause']}")
+                    if decision:
+                        lines.append(f"**Confidence:** {decision['confidence']:.0%}")
+                        lines.append(f"**Proposed Action:** {decision['action']} ({decision['risk_level'].upper()} risk)")
+                    if analysis.get('reasoning'):
+                        lines.append(f"**Explanation:** {analysis['reasoning']}")
+                    live.info("\n\n".join(lines))
+                
+                analyze_ticket(ticket, on_update=show_progress)
+                live.empty()
+                st.session_state.current_ticket_id = ticket['id']
+        
+        state = st.session_state.pipeline.get(st.session_state.get('current_ticket_id'))
+        if state:
+            ticket = state['ticket']
+            analysis = state['analysis']
+            decision = state['decision']
+            severity = ticket['severity']
+            
+            # Display ticket info
+            severity_class = f"severity-{severity}"
+            st.markdown(f"""
+            <div class="ticket-card {severity_class}">
+                <h4>📋 Ticket #{ticket['id']}</h4>
+                <p><strong>Merchant:</strong> {ticket['merchant_id']}</p>
+                <p><strong>Severity:</strong> {severity.upper()}</p>
+                <p><strong>Issue:</strong> {ticket['description']}</p>
+            </div>
+            """, unsafe_allow_html=True)
+            
+            st.markdown("### 🧠 REASONING ANALYSIS" + (" (from memory)" if analysis.get('source') == 'memory' else ""))
+            confidence_class = "confidence-high" if analysis['confidence'] >= 0.8 else "confidence-medium" if analysis['confidence'] >= 0.6 else "confidence-low"
+            
+            st.markdown(f"""
+            <div class="analysis-box">
+                <p><strong>Root Cause:</strong> {analysis['root_cause']}</p>
+                <p><strong>Confidence:</strong> <span class="{confidence_class}">{analysis['confidence']:.0%}</span></p>
+                <p><strong>Explanation:</strong> {analysis['reasoning']}</p>
+            </div>
+            """, unsafe_allow_html=True)
+            
+            st.markdown("### 💡 PROPOSED ACTION")
+            st.markdown(f"""
+            <div class="decision-box">
+                <p><strong>Action:</strong> {decision['action']}</p>
+                <p><strong>Risk Level:</strong> {decision['risk_level'].upper()}</p>
+                <p><strong>Requires Approval:</strong> {'Yes ⚠️' if decision['needs_human_approval'] else 'No ✅'}</p>
+            </div>
+            """, unsafe_allow_html=True)
+            
+            # Human approval if needed
+            if decision['needs_human_approval'] and state['result'] is None:
+                st.markdown("### ⚠️ HIGH RISK - HUMAN APPROVAL REQUIRED")
+                
+                # Determine reason for approval
+                approval_reason = st.session_state.agent.policies.approval_reasons(decision, ticket['severity'])
+                
+                st.markdown(f"""
+                <div class="approval-needed">
+                    <h4>🚨 Approval Required</h4>
+                    <p><strong>Reason(s):</strong></p>
+                    <ul>
+                        {''.join([f'<li>{r}</li>' for r in approval_reason])}
+                    </ul>
+                </div>
+                """, unsafe_allow_html=True)
+                
+                col_approve, col_reject = st.columns(2)
+                
+                with col_approve:
+                    if st.button("✅ Approve Action", key=f"approve_{ticket['id']}", use_container_width=True):
+                        # ACT only; the analysis above is reused
+                        execute_ticket(state, approved=True)
+                        st.balloons()
+                
+                with col_reject:
+                    if st.button("❌ Reject Action", key=f"reject_{ticket['id']}", use_container_width=True):
+                        reject_ticket(state)
+            elif not decision['needs_human_approval']:
+                # ACT (auto-approved), once per ticket
+                execute_ticket(state)
+            
+            result = state['result']
+            if result is not None and result['status'] == 'rejected_by_human':
+                st.warning("❌ Action REJECTED by human")
+            elif result is not None:
+                st.markdown("### ⚡ ACTION EXECUTED")
+                st.markdown(f"""
+                <div class="result-box">
+                    <p><strong>Status:</strong> {result['status']}</p>
+                    <p><strong>Action Taken:</strong> {result['action']}</p>
+                </div>
+                """, unsafe_allow_html=True)
+                st.success("✅ Ticket processed successfully!")
     
     with col2:
         st.subheader("📋 Quick Guide")
@@ -308,139 +385,278 @@ with tab1:
 # ============================================================================
 # TAB 2: PROCESS PENDING TICKETS
 # ============================================================================
-with tab2:
+with tab2, metrics.span('ui_render', tab='pending'):
     st.header("📂 Process Pending Tickets from File")
     
-    st.info("This will load tickets from the file system using the agent's observe() method.")
+    st.info("This will load new tickets from the inbox (data/tickets.ndjson) using the agent's observe() method. Tickets already loaded are not returned again.")
     
     if st.button("🔄 Load & Process Pending Tickets", use_container_width=True):
         with st.spinner("Loading pending tickets..."):
             tickets = st.session_state.agent.observe()
+            try:
+                if not tickets:
+                    st.success("✅ No pending tickets in file.")
+                else:
+                    st.success(f"Found {len(tickets)} pending ticket(s)")
+                    # analyze the whole batch once; later reruns render from the state store
+                    # near-identical tickets are analyzed once per incident
+                    analyses, incidents = st.session_state.agent.reason_incidents([
+                        t for t in tickets
+                        if t['id'] not in st.session_state.pipeline and not st.session_state.agent.lookup(t)
+                    ])
+                    st.session_state.pending_incidents = incidents
+                    new_tickets = iter(analyses)
+                    for ticket in tickets:
+                        if ticket['id'] not in st.session_state.pipeline:
+                            replayed = st.session_state.agent.lookup(ticket) is not None
+                            analyze_ticket(ticket, None if replayed else next(new_tickets))
+                    # auto-approved tickets execute together, one run per distinct action
+                    ready = [st.session_state.pipeline[t['id']] for t in tickets]
+                    ready = [s for s in ready if s['result'] is None and not s['decision']['needs_human_approval']]
+                    results = st.session_state.agent.act_many([(s['ticket'], s['decision'], s['analysis']) for s in ready])
+                    for state, result in zip(ready, results):
+                        record_outcome(state, result)
+                    # every ticket is executed or queued for approval; move the inbox checkpoint
+                    st.session_state.agent.acknowledge()
+                    # most severe (then oldest) first
+                    st.session_state.pending_batch = [t['id'] for t in st.session_state.agent.scheduler.order(tickets)]
+            except Exception:
+                # the next load hands these tickets out again
+                st.session_state.agent.release()
+                raise
+    
+    for incident in st.session_state.get('pending_incidents', []):
+        st.warning(f"🚨 **Incident {incident['incident_id']}**: {incident['tickets']} tickets from "
+                   f"{len(incident['merchants'])} merchant(s), analyzed once → **{incident['root_cause']}**\n\n"
+                   f"{incident['description']}")
+    
+    batch = st.session_state.get('pending_batch', [])
+    for idx, ticket_id in enumerate(batch, 1):
+        state = st.session_state.pipeline[ticket_id]
+        ticket = state['ticket']
+        analysis = state['analysis']
+        decision = state['decision']
+        
+        st.markdown(f"### Ticket {idx} of {len(batch)}")
+        
+        severity_class = f"severity-{ticket.get('severity', 'medium')}"
+        st.markdown(f"""
+        <div class="ticket-card {severity_class}">
+            <h4>📋 Ticket #{ticket['id']}</h4>
+            <p><strong>Merchant:</strong> {ticket['merchant_id']}</p>
+            <p><strong>Issue:</strong> {ticket['description']}</p>
+        </div>
+        """, unsafe_allow_html=True)
+        
+        # Process each ticket
+        with st.expander(f"🔍 View Processing for {ticket['id']}", expanded=True):
+            st.markdown("**🧠 REASONING:**" + (" *(from memory)*" if analysis.get('source') == 'memory' else ""))
+            confidence_class = "confidence-high" if analysis['confidence'] >= 0.8 else "confidence-medium" if analysis['confidence'] >= 0.6 else "confidence-low"
             
-            if not tickets:
-                st.success("✅ No pending tickets in file.")
-            else:
-                st.success(f"Found {len(tickets)} pending ticket(s)")
+            st.markdown(f"""
+            <div class="analysis-box">
+                <p><strong>Root Cause:</strong> {analysis['root_cause']}</p>
+                <p><strong>Confidence:</strong> <span class="{confidence_class}">{analysis['confidence']:.0%}</span></p>
+                <p><strong>Explanation:</strong> {analysis['reasoning']}</p>
+            </div>
+            """, unsafe_allow_html=True)
+            
+            st.markdown("**💡 PROPOSED ACTION:**")
+            st.markdown(f"""
+            <div class="decision-box">
+                <p><strong>Action:</strong> {decision['action']}</p>
+                <p><strong>Risk Level:</strong> {decision['risk_level'].upper()}</p>
+            </div>
+            """, unsafe_allow_html=True)
+            
+            # Handle approval
+            if decision['needs_human_approval'] and state['result'] is None:
+                st.warning("⚠️ HIGH RISK - Requires Approval")
                 
-                for idx, ticket in enumerate(tickets, 1):
-                    st.markdown(f"### Ticket {idx} of {len(tickets)}")
-                    
-                    severity_class = f"severity-{ticket.get('severity', 'medium')}"
+                col1, col2 = st.columns(2)
+                with col1:
+                    approve_key = f"approve_{ticket['id']}_{idx}"
+                    if st.button(f"✅ Approve", key=approve_key, use_container_width=True):
+                        execute_ticket(state, approved=True)
+                        st.rerun()
+                
+                with col2:
+                    reject_key = f"reject_{ticket['id']}_{idx}"
+                    if st.button(f"❌ Reject", key=reject_key, use_container_width=True):
+                        reject_ticket(state)
+                        st.rerun()
+            else:
+                if state['result'] is None:
+                    execute_ticket(state)
+                result = state['result']
+                if result['status'] == 'rejected_by_human':
+                    st.warning("❌ Action rejected")
+                else:
                     st.markdown(f"""
-                    <div class="ticket-card {severity_class}">
-                        <h4>📋 Ticket #{ticket['id']}</h4>
-                        <p><strong>Merchant:</strong> {ticket['merchant_id']}</p>
-                        <p><strong>Issue:</strong> {ticket['description']}</p>
+                    <div class="result-box">
+                        <p><strong>Status:</strong> {result['status']}</p>
+                        <p><strong>Action:</strong> {result['action']}</p>
                     </div>
                     """, unsafe_allow_html=True)
-                    
-                    # Process each ticket
-                    with st.expander(f"🔍 View Processing for {ticket['id']}", expanded=True):
-                        # REASON
-                        analysis = st.session_state.agent.reason(ticket)
-                        
-                        st.markdown("**🧠 REASONING:**")
-                        confidence_class = "confidence-high" if analysis['confidence'] >= 0.8 else "confidence-medium" if analysis['confidence'] >= 0.6 else "confidence-low"
-                        
-                        st.markdown(f"""
-                        <div class="analysis-box">
-                            <p><strong>Root Cause:</strong> {analysis['root_cause']}</p>
-                            <p><strong>Confidence:</strong> <span class="{confidence_class}">{analysis['confidence']:.0%}</span></p>
-                            <p><strong>Explanation:</strong> {analysis['reasoning']}</p>
-                        </div>
-                        """, unsafe_allow_html=True)
-                        
-                        # DECIDE
-                        decision = st.session_state.agent.decide(ticket, analysis)
-                        
-                        st.markdown("**💡 PROPOSED ACTION:**")
-                        st.markdown(f"""
-                        <div class="decision-box">
-                            <p><strong>Action:</strong> {decision['action']}</p>
-                            <p><strong>Risk Level:</strong> {decision['risk_level'].upper()}</p>
-                        </div>
-                        """, unsafe_allow_html=True)
-                        
-                        # Handle approval
-                        if decision['needs_human_approval']:
-                            st.warning("⚠️ HIGH RISK - Requires Approval")
-                            
-                            col1, col2 = st.columns(2)
-                            with col1:
-                                approve_key = f"approve_{ticket['id']}_{idx}"
-                                if st.button(f"✅ Approve", key=approve_key, use_container_width=True):
-                                    result = st.session_state.agent.act(ticket, decision)
-                                    st.success(f"✅ {result['status']} - {result['action']}")
-                            
-                            with col2:
-                                reject_key = f"reject_{ticket['id']}_{idx}"
-                                if st.button(f"❌ Reject", key=reject_key, use_container_width=True):
-                                    st.warning("❌ Action rejected")
-                                    st.session_state.agent.memory.store(ticket, decision, {"status": "rejected_by_human"})
-                        else:
-                            result = st.session_state.agent.act(ticket, decision)
-                            st.markdown(f"""
-                            <div class="result-box">
-                                <p><strong>Status:</strong> {result['status']}</p>
-                                <p><strong>Action:</strong> {result['action']}</p>
-                            </div>
-                            """, unsafe_allow_html=True)
-                    
-                    st.markdown("---")
+        
+        st.markdown("---")
 
 # ============================================================================
-# TAB 3: HISTORY & ANALYTICS
+# TAB 3: APPROVAL QUEUE
 # ============================================================================
-with tab3:
+with tab3, metrics.span('ui_render', tab='approvals'):
+    st.header("⚠️ Tickets Awaiting Approval")
+    
+    st.info("High-risk decisions wait here instead of holding up the rest of the batch. The queue is shared with the CLI and other sessions; approved tickets are executed without being analyzed again.")
+    
+    pending = st.session_state.agent.approvals.pending()
+    if not pending:
+        st.success("✅ No tickets awaiting approval.")
+    
+    for entry in pending:
+        ticket = entry['ticket']
+        decision = entry['decision']
+        state = st.session_state.pipeline.setdefault(ticket['id'], {
+            'ticket': ticket,
+            'analysis': entry['analysis'] or {'root_cause': decision['root_cause'], 'confidence': decision['confidence'], 'reasoning': ''},
+            'decision': decision,
+            'result': None
+        })
+        
+        severity_class = f"severity-{ticket.get('severity', 'medium')}"
+        st.markdown(f"""
+        <div class="ticket-card {severity_class}">
+            <h4>📋 Ticket #{ticket['id']}</h4>
+            <p><strong>Merchant:</strong> {ticket['merchant_id']}</p>
+            <p><strong>Severity:</strong> {ticket.get('severity', 'medium').upper()}</p>
+            <p><strong>Issue:</strong> {ticket['description']}</p>
+            <p><strong>Root Cause:</strong> {decision['root_cause']} ({decision['confidence']:.0%})</p>
+            <p><strong>Action:</strong> {decision['action']} ({decision['risk_level'].upper()} risk)</p>
+            <p><small>Queued {entry['queued_at']}</small></p>
+        </div>
+        """, unsafe_allow_html=True)
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("✅ Approve", key=f"queue_approve_{ticket['id']}", use_container_width=True):
+                execute_ticket(state, approved=True)
+                st.rerun()
+        with col2:
+            if st.button("❌ Reject", key=f"queue_reject_{ticket['id']}", use_container_width=True):
+                reject_ticket(state)
+                st.rerun()
+        
+        st.markdown("---")
+
+# ============================================================================
+# TAB 4: HISTORY & ANALYTICS
+# ============================================================================
+with tab4, metrics.span('ui_render', tab='history'):
     st.header("📊 Ticket History & Analytics")
     
-    if not st.session_state.ticket_history:
+    # aggregates over the whole stored history, maintained by Memory as records
+    # arrive, so a rerun never rescans it
+    analytics = st.session_state.agent.memory.analytics()
+    summary = analytics['summary']
+    
+    if not summary['total'] and not st.session_state.ticket_history:
         st.info("No tickets processed yet. Submit a ticket in the 'Submit Ticket' tab to get started.")
     else:
         # Summary metrics
         col1, col2, col3, col4 = st.columns(4)
         
-        total = len(st.session_state.ticket_history)
-        approved = sum(1 for t in st.session_state.ticket_history if t.get('approved', False))
-        rejected = total - approved
-        
-        # Calculate average confidence
-        avg_confidence = sum(t['analysis']['confidence'] for t in st.session_state.ticket_history) / total if total > 0 else 0
+        total = summary['total']
+        approved = summary['completed']
+        rejected = summary['rejected']
+        avg_confidence = summary['avg_confidence']
         
         with col1:
             st.metric("Total Tickets", total)
         
         with col2:
-            st.metric("Approved", approved, delta=f"{(approved/total*100):.0f}%" if total > 0 else "0%")
+            st.metric("Approved", approved, delta=f"{summary['approval_rate']:.0%}")
         
         with col3:
-            st.metric("Rejected", rejected)
+            st.metric("Rejected", rejected, delta=f"{summary['rejection_rate']:.0%}", delta_color="inverse")
         
         with col4:
             st.metric("Avg Confidence", f"{avg_confidence:.0%}")
         
+        col_left, col_right = st.columns(2)
+        with col_left:
+            st.markdown("**By Root Cause**")
+            st.bar_chart({'tickets': dict(analytics['by_root_cause'])})
+            st.markdown("**Top Actions**")
+            st.table([{'action': action, 'tickets': n} for action, n in analytics['by_action']])
+        with col_right:
+            st.markdown("**By Outcome**")
+            st.bar_chart({'tickets': dict(analytics['by_outcome'])})
+            st.markdown(f"**Top Merchants** ({summary['merchants']} total)")
+            st.table([{'merchant': merchant, 'tickets': n} for merchant, n in analytics['by_merchant']])
+        
+        if analytics['daily']:
+            st.markdown("**Tickets per Day**")
+            st.line_chart({'tickets': dict(analytics['daily'])})
+        
         st.markdown("---")
         
         # Ticket history
         st.subheader("📜 Ticket History")
         
-        for idx, record in enumerate(reversed(st.session_state.ticket_history), 1):
-            ticket = record['ticket']
-            analysis = record['analysis']
-            decision = record['decision']
-            result = record['result']
-            approved = record.get('approved', False)
+        # filters and paging run against the stored history; only the current
+        # page is rendered
+        col_rc, col_outcome, col_merchant, col_search = st.columns(4)
+        with col_rc:
+            root_cause_filter = st.selectbox("Root Cause", ['All', *ROOT_CAUSES], key="history_root_cause")
+        with col_outcome:
+            outcome_filter = st.selectbox("Outcome", ['All', 'completed', 'rejected_by_human'], key="history_outcome")
+        with col_merchant:
+            merchant_filter = st.text_input("Merchant ID", key="history_merchant").strip()
+        with col_search:
+            text_filter = st.text_input("Description contains", key="history_text").strip()
+        
+        filters = {
+            'root_cause': None if root_cause_filter == 'All' else root_cause_filter,
+            'outcome': None if outcome_filter == 'All' else outcome_filter,
+            'merchant_id': merchant_filter or None,
+            'text': text_filter or None
+        }
+        
+        memory = st.session_state.agent.memory
+        page_size = 20
+        page = st.session_state.get('history_page', 1)
+        records, matching = memory.history(offset=(page - 1) * page_size, limit=page_size, **filters)
+        pages = max(1, -(-matching // page_size))
+        if page > pages:
+            # the filters changed under us; start over
+            page = st.session_state.history_page = 1
+            records, matching = memory.history(limit=page_size, **filters)
+        
+        col_page, col_count = st.columns([1, 3])
+        with col_page:
+            st.number_input("Page", min_value=1, max_value=pages, step=1, key="history_page")
+        with col_count:
+            st.caption(f"{matching} matching record(s) · page {page} of {pages}, newest first")
+        
+        for record in records:
+            result = record.get('result', {})
+            approved = result.get('status') != 'rejected_by_human'
+            count = record.get('count', 1)
+            title = f"{record['ticket_id']} - {record.get('merchant_id') or 'unknown merchant'}"
             
-            with st.expander(f"Ticket {len(st.session_state.ticket_history) - idx + 1}: {ticket['id']} - {ticket['merchant_id']}"):
+            with st.expander(title + (f" (seen {count}×)" if count > 1 else "")):
                 col_left, col_right = st.columns([2, 1])
                 
                 with col_left:
-                    st.markdown(f"**Description:** {ticket['description']}")
-                    st.markdown(f"**Severity:** {ticket['severity'].upper()}")
-                    st.markdown(f"**Root Cause:** {analysis['root_cause']}")
-                    st.markdown(f"**Confidence:** {analysis['confidence']:.0%}")
-                    st.markdown(f"**Action Taken:** {decision['action']}")
-                    st.markdown(f"**Result:** {result['status']}")
+                    st.markdown(f"**Description:** {record['description']}")
+                    st.markdown(f"**Root Cause:** {record.get('root_cause')}")
+                    if record.get('confidence') is not None:
+                        st.markdown(f"**Confidence:** {record['confidence']:.0%}")
+                    st.markdown(f"**Action Taken:** {record['action']}")
+                    st.markdown(f"**Result:** {result.get('status', 'unknown')}")
+                    last_seen = record.get('last_seen', record.get('stored_at'))
+                    if last_seen:
+                        st.markdown(f"**Last Seen:** {last_seen}")
                 
                 with col_right:
                     status_emoji = "✅" if approved else "❌"
@@ -458,25 +674,40 @@ with tab3:
         
         # Download report
         st.subheader("📥 Export Data")
+        st.caption("Exports the records matching the filters above. The file is only generated when you prepare it.")
         
-        report_data = {
-            'summary': {
-                'total_tickets': total,
-                'approved': approved,
-                'rejected': rejected,
-                'average_confidence': avg_confidence
-            },
-            'tickets': st.session_state.ticket_history
-        }
+        col_format, col_prepare = st.columns([1, 2])
+        with col_format:
+            export_format = st.radio("Format", list(FORMATS), horizontal=True, key="export_format")
+        with col_prepare:
+            if st.button("⚙️ Prepare Export", use_container_width=True):
+                _, mime, extension = FORMATS[export_format]
+                discard_export()
+                # streamed to a temp file; the session only keeps its path
+                fd, path = tempfile.mkstemp(prefix='ticket_history_', suffix='.' + extension)
+                os.close(fd)
+                with st.spinner("Generating export..."):
+                    write_export(memory.iter_history(**filters), path, export_format)
+                st.session_state.export = {
+                    'key': (export_format, tuple(filters.items())),
+                    'path': path,
+                    'mime': mime,
+                    'file_name': f"ticket_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+                }
         
-        st.download_button(
-            label="📄 Download Full Report (JSON)",
-            data=json.dumps(report_data, indent=2, default=str),
-            file_name=f"ticket_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
-            mime="application/json",
-            use_container_width=True
-        )
+        export = st.session_state.get('export')
+        if export and export['key'] == (export_format, tuple(filters.items())) and os.path.exists(export['path']):
+            with open(export['path'], 'rb') as f:
+                st.download_button(
+                    label=f"📄 Download {export['file_name']}",
+                    data=f,
+                    file_name=export['file_name'],
+                    mime=export['mime'],
+                    on_click=discard_export,
+                    use_container_width=True
+                )
 
 # Footer
 st.markdown("---")
-st.caption("🤖 Self-Healing Support Agent | Built with Streamlit")
\ No newline at end of file
+st.caption("🤖 Self-Healing Support Agent | Built with Streamlit")
+metrics.write_prometheus()
\ No newline at end of file
@@ -1,5 +1,7 @@
-import json
+from datetime import datetime
 from agent.agent import SupportAgent
+from agent.ids import submission_id
+from agent.metrics import metrics
 
 def get_ticket_from_user():
     print("\n" + "="*60)
@@ -13,13 +15,91 @@ def get_ticket_from_user():
     if severity not in ['critical', 'high', 'medium', 'low']:
         severity = 'medium'
     
+    timestamp = datetime.now().isoformat()
     return {
-        'id': f"T-{hash(description) % 10000:04d}",
+        'id': submission_id(merchant_id, description, timestamp),
         'merchant_id': merchant_id,
         'description': description,
-        'severity': severity
+        'severity': severity,
+        'timestamp': timestamp
     }
 
+def print_decision(decision):
+    print(f"\n💡 PROPOSED ACTION:")
+    print(f"   Action: {decision['action']}")
+    print(f"   Risk Level: {decision['risk_level']}")
+
+def stream_reasoning(agent, ticket):
+    """Print the analysis while it streams in; returns the final (analysis, decision)"""
+    print(f"\n🧠 REASONING:")
+    shown_decision = None
+    explained = 0
+    for analysis, decision in agent.reason_stream(ticket):
+        if analysis.get('degraded') and shown_decision:
+            # Gemini failed mid-answer; show the fallback from scratch
+            print("\n   ⚠️  Gemini failed, falling back to a local best guess")
+            shown_decision = None
+            explained = 0
+        if decision and not shown_decision:
+            # root cause and confidence arrive first, so the decision is known
+            # before the explanation has finished streaming
+            shown_decision = decision
+            print(f"   Root Cause: {analysis['root_cause']}" + (" (from memory)" if analysis.get('source') == 'memory' else ""))
+            print(f"   Confidence: {analysis['confidence']:.2f}")
+            print(f"   Proposed: {decision['action']} ({decision['risk_level']} risk)")
+        reasoning = analysis.get('reasoning') or ""
+        if shown_decision and len(reasoning) > explained:
+            if not explained:
+                print("   Explanation: ", end="")
+            print(reasoning[explained:], end="", flush=True)
+            explained = len(reasoning)
+    if explained:
+        print()
+    if decision != shown_decision:
+        # the finished reply changed the early decision
+        print_decision(decision)
+    return analysis, decision
+
+def approval_reason(agent, ticket, decision):
+    # straight from the loaded policy rules, so edits to data/policies.json show up here
+    return "; ".join(agent.policies.approval_reasons(decision, ticket['severity']))
+
+def review_approvals(agent):
+    """Work through the approval queue, most severe first"""
+    pending = agent.approvals.pending()
+    if not pending:
+        print("\n✅ No tickets awaiting approval.")
+        return
+    for idx, entry in enumerate(pending, 1):
+        ticket, decision = entry['ticket'], entry['decision']
+        print("\n" + "="*60)
+        print(f"⚠️  APPROVAL {idx} of {len(pending)} - Ticket #{ticket['id']} (queued {entry['queued_at']})")
+        print(f"   Merchant: {ticket['merchant_id']}")
+        print(f"   Issue: {ticket['description']}")
+        print(f"   Root Cause: {decision['root_cause']} ({decision['confidence']:.2f})")
+        print(f"   Action: {decision['action']}")
+        print(f"   Risk Level: {decision['risk_level']}")
+        print(f"   Reason: {approval_reason(agent, ticket, decision)}")
+        
+        approval = input("\n   Approve this action? (yes/no/skip): ").lower()
+        
+        if approval == 'skip':
+            continue
+        if approval != 'yes':
+            # None means another approver got to it first
+            if agent.reject(ticket['id']) is not None:
+                print("   ❌ Action REJECTED by human")
+            continue
+        
+        print("   ✅ Action APPROVED by human")
+        print(f"\n⚡ EXECUTING ACTION...")
+        result = agent.approve(ticket['id'])
+        if result is None:
+            print("   ↪️  Already handled by another approver")
+            continue
+        print(f"   ✅ Status: {result['status']}")
+        print(f"   ✅ Action taken: {result['action']}")
+
 def main():
     print("🤖 Self-Healing Support Agent Started")
     print("=" * 60)
@@ -31,14 +111,20 @@ def main():
         print("OPTIONS:")
         print("1. Submit new ticket (manual input)")
         print("2. Process pending tickets from file")
-        print("3. Exit")
+        print(f"3. Review approval queue ({len(agent.approvals)} pending)")
+        print("4. Exit")
         print("="*60)
         
-        choice = input("\nChoose option (1/2/3): ").strip()
+        choice = input("\nChoose option (1/2/3/4): ").strip()
         
-        if choice == '3':
+        if choice == '4':
             break
         
+        if choice == '3':
+            review_approvals(agent)
+            metrics.write_prometheus()
+            continue
+        
         tickets = []
         
         if choice == '1':
@@ -55,51 +141,81 @@ def main():
             print("❌ Invalid option")
             continue
         
-        # Process tickets
+        # Replayed tickets are attached to their existing result
+        fresh = []
         for ticket in tickets:
+            previous = agent.lookup(ticket)
+            if previous:
+                print(f"\n♻️  Ticket #{ticket['id']} already processed")
+                print(f"   Action: {previous['decision']['action']}")
+                print(f"   Status: {previous['result']['status']}")
+            else:
+                fresh.append(ticket)
+        # most severe (then oldest) first
+        tickets = agent.scheduler.order(fresh)
+        
+        # OBSERVE → REASON (a batch is analyzed in parallel up front; a single
+        # ticket is streamed below so its decision shows up as early as possible)
+        if len(tickets) > 1:
+            print(f"\n🔍 Analyzing {len(tickets)} ticket(s)...")
+            # near-identical tickets are analyzed once per incident
+            analyses, incidents = agent.reason_incidents(tickets)
+            for incident in incidents:
+                print(f"\n🚨 INCIDENT {incident['incident_id']}: {incident['tickets']} tickets from "
+                      f"{len(incident['merchants'])} merchant(s)")
+                print(f"   Issue: {incident['description']}")
+                print(f"   Root Cause: {incident['root_cause']}")
+        else:
+            analyses = [None] * len(tickets)
+        
+        # Process tickets
+        to_act = []
+        for ticket, analysis in zip(tickets, analyses):
             print(f"\n🔍 Analyzing Ticket #{ticket['id']}...")
             print(f"   Merchant: {ticket['merchant_id']}")
             print(f"   Issue: {ticket['description']}")
             
-            # OBSERVE → REASON
-            analysis = agent.reason(ticket)
-            print(f"\n🧠 REASONING:")
-            print(f"   Root Cause: {analysis['root_cause']}")
-            print(f"   Confidence: {analysis['confidence']:.2f}")
-            print(f"   Explanation: {analysis['reasoning']}")
-            
-            # DECIDE
-            decision = agent.decide(ticket, analysis)
-            print(f"\n💡 PROPOSED ACTION:")
-            print(f"   Action: {decision['action']}")
-            print(f"   Risk Level: {decision['risk_level']}")
+            if analysis is None:
+                # REASON + DECIDE while the reply streams
+                analysis, decision = stream_reasoning(agent, ticket)
+            else:
+                print(f"\n🧠 REASONING:" + (" (from memory)" if analysis.get('source') == 'memory' else ""))
+                print(f"   Root Cause: {analysis['root_cause']}")
+                print(f"   Confidence: {analysis['confidence']:.2f}")
+                print(f"   Explanation: {analysis['reasoning']}")
+                
+                # DECIDE
+                decision = agent.decide(ticket, analysis)
+                print_decision(decision)
             
-            # Human in the loop for high-risk
+            # Human in the loop for high-risk: queued for review (option 3) so
+            # the rest of the batch keeps flowing
             if decision['needs_human_approval']:
                 print(f"\n⚠️  HIGH RISK - HUMAN APPROVAL REQUIRED")
-                print(f"   Reason: ", end="")
-                if ticket['severity'] == 'critical':
-                    print("Critical severity ticket")
-                elif decision['confidence'] < 0.7:
-                    print(f"Low confidence ({decision['confidence']:.2f})")
-                elif decision['root_cause'] == 'platform_bug':
-                    print("Potential platform bug")
-                
-                approval = input("\n   Approve this action? (yes/no): ").lower()
-                
-                if approval != 'yes':
-                    print("   ❌ Action REJECTED by human")
-                    agent.memory.store(ticket, decision, {"status": "rejected_by_human"})
-                    continue
-                else:
-                    print("   ✅ Action APPROVED by human")
+                print(f"   Reason: {approval_reason(agent, ticket, decision)}")
+                agent.act(ticket, decision, analysis=analysis)
+                continue
             
-            # ACT
-            print(f"\n⚡ EXECUTING ACTION...")
-            result = agent.act(ticket, decision)
-            print(f"   ✅ Status: {result['status']}")
-            print(f"   ✅ Action taken: {result['action']}")
+            # ACT, after the loop: tickets sharing an action run as one execution
+            to_act.append((ticket, decision, analysis))
+        
+        if to_act:
+            print(f"\n⚡ EXECUTING {len(to_act)} ACTION(S)...")
+            for (ticket, _, _), result in zip(to_act, agent.act_many(to_act)):
+                batch = f" (batch {result['batch_id']})" if result.get('batch_id') else ""
+                print(f"   ✅ Ticket #{ticket['id']}: {result['status']} - {result['action']}{batch}")
+        
+        if choice == '2':
+            # every ticket is executed or queued for approval; move the inbox checkpoint
+            agent.acknowledge()
+        
+        if len(agent.approvals):
+            print(f"\n📋 {len(agent.approvals)} ticket(s) awaiting approval - choose option 3 to review")
+        
+        metrics.write_prometheus()
     
+    agent.memory.close()
+    metrics.write_prometheus()
     print("\n🛑 Agent stopped.")
 
 if __name__ == "__main__":
@@ -0,0 +1,82 @@
+"""SupportAgent behavior end to end: degraded guesses, replayed tickets"""
+import json
+import os
+import tempfile
+import unittest
+
+from agent.agent import SupportAgent
+from benchmarks.fake_model import FakeGenerativeModel
+
+
+class DegradedDecisionTest(unittest.TestCase):
+
+    def setUp(self):
+        # the agent keeps its state under data/ in the working directory
+        self._dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._dir.cleanup)
+        cwd = os.getcwd()
+        os.chdir(self._dir.name)
+        self.addCleanup(os.chdir, cwd)
+        os.makedirs('data')
+        with open('data/policies.json', 'w') as f:
+            # a threshold below degrade()'s confidence cap
+            json.dump({
+                "root_causes": {"merchant_config_error": {"action": "Send guide", "risk_level": "low"}},
+                "approval": {"severities": ["critical"], "min_confidence": 0.4}
+            }, f)
+        self.agent = SupportAgent(local_threshold=None)
+        self.addCleanup(self.agent.memory.close)
+        self.ticket = {'id': 'T1', 'merchant_id': 'M1', 'description': 'config page broken', 'severity': 'low'}
+
+    def test_degraded_guess_needs_approval(self):
+        analysis = self.agent.degrade(self.ticket, TimeoutError("deadline"))
+        analysis['root_cause'], analysis['confidence'] = 'merchant_config_error', 0.5
+        decision = self.agent.decide(self.ticket, analysis)
+        self.assertTrue(decision['needs_human_approval'])
+        self.assertTrue(self.agent.decide_many([self.ticket], [analysis])[0]['needs_human_approval'])
+        self.assertIn("Best guess made while Gemini was unavailable",
+                      self.agent.policies.approval_reasons(decision, 'low'))
+
+    def test_same_guess_from_gemini_is_auto_approved(self):
+        analysis = {'root_cause': 'merchant_config_error', 'confidence': 0.5, 'source': 'llm'}
+        self.assertFalse(self.agent.decide(self.ticket, analysis)['needs_human_approval'])
+        self.assertFalse(self.agent.decide_many([self.ticket], [analysis])[0]['needs_human_approval'])
+
+
+class ReplayTest(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._dir.cleanup)
+        cwd = os.getcwd()
+        os.chdir(self._dir.name)
+        self.addCleanup(os.chdir, cwd)
+        self.model = FakeGenerativeModel(latency=0.0, jitter=0.0)
+        self.agent = self.open()
+
+    def open(self):
+        agent = SupportAgent(local_threshold=None, dedup_threshold=None, cluster_threshold=None,
+                             hedge_percentile=None)
+        agent.analyzer.model = self.model
+        agent.analyzer.cache = None
+        self.addCleanup(agent.memory.close)
+        return agent
+
+    def test_resubmitted_tickets_are_not_processed_again(self):
+        tickets = [{'id': f'T{i}', 'merchant_id': f'M{i}', 'description': f'issue number {i}', 'severity': 'low'}
+                   for i in range(3)]
+        first = self.agent.run(tickets)
+        calls = self.model.calls
+        self.assertTrue(calls)
+        self.assertFalse(any(row['replayed'] for row in first))
+
+        # the same tickets again, also after a restart
+        for agent in (self.agent, self.open()):
+            again = agent.run([dict(t) for t in tickets])
+            self.assertTrue(all(row['replayed'] for row in again))
+            self.assertEqual([row['status'] for row in again], [row['status'] for row in first])
+        self.assertEqual(self.model.calls, calls)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+"""Merging repeated resolutions at compaction, and retention limits"""
+import os
+import tempfile
+import unittest
+from datetime import datetime, timezone
+
+from agent.memory import Memory, aggregate
+
+
+def record(ticket_id, description='checkout fails', stored_at='2024-05-01T10:00:00+00:00', status='completed',
+           confidence=0.8, merchant='M1'):
+    return {'ticket_id': ticket_id, 'merchant_id': merchant, 'description': description,
+            'root_cause': 'platform_bug', 'action': 'Escalate', 'confidence': confidence,
+            'result': {'status': status}, 'stored_at': stored_at}
+
+
+class AggregateTest(unittest.TestCase):
+
+    def test_repeats_merge_into_one_record(self):
+        merged = aggregate([
+            record('T1', stored_at='2024-05-01T10:00:00+00:00', confidence=0.6),
+            record('T2', description='other issue'),
+            record('T3', stored_at='2024-05-03T10:00:00+00:00', status='rejected_by_human', merchant='M2'),
+        ])
+        self.assertEqual([r['description'] for r in merged], ['other issue', 'checkout fails'])
+        checkout = merged[1]
+        self.assertEqual(checkout['count'], 2)
+        self.assertEqual(checkout['ticket_ids'], ['T1', 'T3'])
+        # the latest occurrence wins, tallies keep the rest
+        self.assertEqual(checkout['ticket_id'], 'T3')
+        self.assertEqual(checkout['outcomes'], {'completed': 1, 'rejected_by_human': 1})
+        self.assertEqual(checkout['merchants'], {'M1': 1, 'M2': 1})
+        self.assertEqual(checkout['days'], {'2024-05-01': 1, '2024-05-03': 1})
+        self.assertEqual((checkout['first_seen'], checkout['last_seen']),
+                         ('2024-05-01T10:00:00+00:00', '2024-05-03T10:00:00+00:00'))
+        self.assertAlmostEqual(checkout['confidence_sum'] / checkout['confidence_n'], 0.7)
+
+    def test_merging_again_is_stable(self):
+        records = [record(f'T{i}', description=f'issue {i % 3}') for i in range(30)]
+        once = aggregate(records)
+        twice = aggregate(once + [record('T99', description='issue 0')])
+        by_description = {r['description']: r for r in twice}
+        self.assertEqual(by_description['issue 0']['count'], 11)
+        self.assertEqual(by_description['issue 0']['ticket_ids'][-1], 'T99')
+        self.assertEqual(sum(r['count'] for r in twice), 31)
+
+    def test_ticket_ids_keep_the_newest(self):
+        merged = aggregate([record(f'T{i}') for i in range(10)] + [record('T2')], max_ticket_ids=4)
+        # a resubmitted id counts as recent
+        self.assertEqual(merged[0]['ticket_ids'], ['T7', 'T8', 'T9', 'T2'])
+        self.assertEqual(merged[0]['count'], 11)
+
+
+class RetentionTest(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._dir.cleanup)
+        self.path = os.path.join(self._dir.name, 'memory.json')
+
+    def test_age_and_count_limits(self):
+        memory = Memory(self.path, compact_threshold=None, max_age_days=30, max_records=2)
+        self.addCleanup(memory.close)
+        records = [
+            {'description': 'ancient', 'last_seen': '2024-01-01T00:00:00+00:00'},
+            {'description': 'old', 'last_seen': '2024-05-05T00:00:00+00:00'},
+            {'description': 'recent', 'last_seen': '2024-05-20T00:00:00+00:00'},
+            {'description': 'newest', 'last_seen': '2024-05-30T00:00:00+00:00'},
+            # stored before timestamps existed: no age, kept by the age limit
+            {'description': 'undated'},
+        ]
+        kept = memory.retain(records, now=datetime(2024, 6, 1, tzinfo=timezone.utc))
+        self.assertEqual([r['description'] for r in kept], ['recent', 'newest'])
+        memory.max_records = None
+        kept = memory.retain(records, now=datetime(2024, 6, 1, tzinfo=timezone.utc))
+        self.assertEqual([r['description'] for r in kept], ['old', 'recent', 'newest', 'undated'])
+
+
+if __name__ == '__main__':
+    unittest.main()
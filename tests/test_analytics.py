@@ -0,0 +1,60 @@
+"""Analytics over the memory history, before and after compaction"""
+import os
+import tempfile
+import unittest
+
+from agent.memory import Memory
+
+
+class AnalyticsTest(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._dir.cleanup)
+        self.memory = Memory(os.path.join(self._dir.name, 'memory.json'), compact_threshold=None)
+        self.addCleanup(self.memory.close)
+
+    def store(self, i, description, root_cause, status, confidence, merchant):
+        ticket = {'id': f'T{i}', 'merchant_id': merchant, 'description': description}
+        decision = {'root_cause': root_cause, 'action': f'fix {root_cause}', 'confidence': confidence}
+        self.memory.store(ticket, decision, {'status': status})
+
+    def fill(self):
+        rows = [
+            ('checkout fails', 'platform_bug', 'completed', 0.9, 'M1'),
+            ('checkout fails', 'platform_bug', 'completed', 0.5, 'M2'),
+            ('checkout fails', 'platform_bug', 'rejected_by_human', 0.4, 'M1'),
+            ('api key rejected', 'api_misconfiguration', 'completed', 0.8, 'M3'),
+            ('docs missing', 'documentation_gap', 'pending_approval', None, 'M3'),
+        ]
+        for i, row in enumerate(rows):
+            self.store(i, *row)
+
+    def test_counts_and_rates(self):
+        self.fill()
+        view = self.memory.analytics()
+        summary = view['summary']
+        self.assertEqual(summary['total'], 5)
+        self.assertEqual((summary['completed'], summary['rejected']), (3, 1))
+        self.assertAlmostEqual(summary['approval_rate'], 0.75)
+        self.assertAlmostEqual(summary['avg_confidence'], (0.9 + 0.5 + 0.4 + 0.8) / 4)
+        self.assertEqual(summary['merchants'], 3)
+        self.assertEqual(view['by_root_cause'][0], ('platform_bug', 3))
+        self.assertEqual(dict(view['by_merchant']), {'M1': 2, 'M2': 1, 'M3': 2})
+        self.assertEqual(sum(n for _, n in view['daily']), 5)
+
+    def test_compaction_leaves_the_numbers_unchanged(self):
+        self.fill()
+        before = self.memory.analytics()
+        self.memory.compact()
+        self.assertLess(len(self.memory.data['resolved_issues']), 5)
+        after = self.memory.analytics()
+        self.assertAlmostEqual(after['summary'].pop('avg_confidence'), before['summary'].pop('avg_confidence'))
+        self.assertEqual(after, before)
+        # and it keeps counting from there
+        self.store(9, 'checkout fails', 'platform_bug', 'completed', 1.0, 'M4')
+        self.assertEqual(self.memory.analytics()['summary']['total'], 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+"""ApprovalQueue persistence, ordering and sharing between instances"""
+import os
+import tempfile
+import unittest
+
+from agent.approvals import ApprovalQueue
+
+
+def ticket(ticket_id, severity='medium'):
+    return {'id': ticket_id, 'merchant_id': 'M1', 'description': 'x', 'severity': severity}
+
+
+DECISION = {'action': 'Escalate', 'risk_level': 'high', 'needs_human_approval': True}
+
+
+class ApprovalQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._dir.cleanup)
+        self.path = os.path.join(self._dir.name, 'approvals.jsonl')
+
+    def test_pending_most_severe_then_oldest(self):
+        queue = ApprovalQueue(self.path)
+        for ticket_id, severity in (('T1', 'low'), ('T2', 'critical'), ('T3', 'low'), ('T4', 'high')):
+            queue.add(ticket(ticket_id, severity), DECISION, {'root_cause': 'platform_bug'})
+        self.assertEqual([e['ticket']['id'] for e in queue.pending()], ['T2', 'T4', 'T1', 'T3'])
+        self.assertEqual(queue.get('T4')['analysis'], {'root_cause': 'platform_bug'})
+
+    def test_pop_once_across_instances(self):
+        first, second = ApprovalQueue(self.path), ApprovalQueue(self.path)
+        first.add(ticket('T1'), DECISION)
+        self.assertIn('T1', second)
+        self.assertEqual(second.pop('T1')['ticket']['id'], 'T1')
+        # another approver got there first
+        self.assertIsNone(first.pop('T1'))
+        self.assertEqual(len(first), 0)
+
+    def test_restore_requeues_an_entry(self):
+        queue = ApprovalQueue(self.path)
+        entry = queue.add(ticket('T1'), DECISION)
+        queue.pop('T1')
+        queue.restore(entry)
+        self.assertEqual(ApprovalQueue(self.path).get('T1'), entry)
+
+    def test_survives_a_torn_write(self):
+        queue = ApprovalQueue(self.path)
+        queue.add(ticket('T1'), DECISION)
+        with open(self.path, 'ab') as f:
+            f.write(b'{"add": {"ticket": {"id": "T2"')
+        queue.add(ticket('T3'), DECISION)
+        self.assertEqual(sorted(e['ticket']['id'] for e in ApprovalQueue(self.path).pending()), ['T1', 'T3'])
+
+    def test_compaction_keeps_pending_entries(self):
+        queue = ApprovalQueue(self.path, compact_ratio=2)
+        other = ApprovalQueue(self.path)
+        queue.add(ticket('KEEP'), DECISION)
+        self.assertEqual(len(other), 1)
+        for i in range(100):
+            queue.add(ticket(f'T{i}'), DECISION)
+            queue.pop(f'T{i}')
+        with open(self.path) as f:
+            lines = sum(1 for _ in f)
+        self.assertLess(lines, 100)
+        # an instance that read the log before it was rewritten starts over
+        self.assertEqual([e['ticket']['id'] for e in other.pending()], ['KEEP'])
+        self.assertEqual([e['ticket']['id'] for e in ApprovalQueue(self.path).pending()], ['KEEP'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+"""ResponseCache expiry, LRU eviction and key normalization"""
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from agent.cache import ResponseCache
+
+
+class Clock:
+    """Stands in for time.time()"""
+
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+class ResponseCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._dir.cleanup)
+        self.path = os.path.join(self._dir.name, 'llm_cache.sqlite')
+        self.clock = Clock()
+        patcher = mock.patch('agent.cache.time.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def open(self, **kwargs):
+        cache = ResponseCache(self.path, **kwargs)
+        self.addCleanup(cache._db.close)
+        return cache
+
+    def tick(self, seconds=1.0):
+        self.clock.now += seconds
+
+    def test_hit_ignores_whitespace_and_survives_reopen(self):
+        cache = self.open()
+        cache.put('gemini', 'Ticket:\n  checkout  broken', 'reply')
+        self.assertEqual(cache.get('gemini', 'Ticket: checkout broken'), 'reply')
+        self.assertIsNone(cache.get('other-model', 'Ticket: checkout broken'))
+        self.assertEqual(self.open().get('gemini', 'Ticket: checkout broken'), 'reply')
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_entries_expire_after_ttl(self):
+        cache = self.open(ttl=60)
+        cache.put('gemini', 'p', 'reply')
+        self.tick(59)
+        # reading does not extend the lifetime
+        self.assertEqual(cache.get('gemini', 'p'), 'reply')
+        self.tick(2)
+        self.assertIsNone(cache.get('gemini', 'p'))
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def test_least_recently_used_is_evicted(self):
+        cache = self.open(max_entries=2)
+        cache.put('gemini', 'a', 'A')
+        self.tick()
+        cache.put('gemini', 'b', 'B')
+        self.tick()
+        # reading a makes b the least recently used
+        self.assertEqual(cache.get('gemini', 'a'), 'A')
+        self.tick()
+        cache.put('gemini', 'c', 'C')
+        self.assertIsNone(cache.get('gemini', 'b'))
+        self.assertEqual(cache.get('gemini', 'a'), 'A')
+        self.assertEqual(cache.get('gemini', 'c'), 'C')
+        self.assertEqual(cache.stats()['entries'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
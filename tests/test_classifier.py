@@ -0,0 +1,60 @@
+"""Local classifier: when it answers, and what it learns from"""
+import unittest
+
+from agent.classifier import TicketClassifier
+
+LABELS = ['merchant_config_error', 'api_misconfiguration']
+CONFIG = "Shipping rates show zero in the store settings page for merchant"
+API = "API key rejected with 401 unauthorized on the orders endpoint"
+
+
+class FakeMemory:
+    def __init__(self, records):
+        self.data = {'resolved_issues': records}
+
+
+def record(description, root_cause, status='completed', **extra):
+    return dict({'description': description, 'root_cause': root_cause, 'result': {'status': status}}, **extra)
+
+
+class TicketClassifierTest(unittest.TestCase):
+
+    def trained(self, n=15, **kwargs):
+        model = TicketClassifier(**kwargs)
+        for i in range(n):
+            model.learn(f"{CONFIG} {i}", 'merchant_config_error')
+            model.learn(f"{API} {i}", 'api_misconfiguration')
+        return model
+
+    def test_answers_familiar_tickets(self):
+        model = self.trained()
+        self.assertEqual(model.classify(CONFIG)[0], 'merchant_config_error')
+        self.assertEqual(model.classify(API)[0], 'api_misconfiguration')
+        self.assertEqual(model.stats()['answered_locally'], 2)
+
+    def test_escalates_without_enough_history_or_evidence(self):
+        self.assertIsNone(self.trained(n=5, min_samples=20).classify(CONFIG))
+        model = self.trained()
+        # nothing like it in training
+        self.assertIsNone(model.classify("Customers report duplicated loyalty points after a promotion"))
+        self.assertIsNone(self.trained(threshold=1.1).classify(CONFIG))
+        self.assertEqual(model.stats()['escalated'], 1)
+
+    def test_from_memory_learns_only_gemini_answers_that_were_executed(self):
+        records = [record(f"{CONFIG} {i}", 'merchant_config_error', source='llm') for i in range(3)]
+        records += [
+            record(CONFIG, 'api_misconfiguration', source='local_model'),
+            record(CONFIG, 'api_misconfiguration', source='incident'),
+            record(API, 'api_misconfiguration', status='rejected_by_human', source='llm'),
+            record(API, 'not_a_label', source='llm'),
+            # merged record: only its Gemini-sourced occurrences count
+            record(API, 'api_misconfiguration', outcomes={'completed': 5}, sources={'llm': 2, 'memory': 3}),
+            # stored before sources were kept
+            record(API, 'api_misconfiguration'),
+        ]
+        model = TicketClassifier.from_memory(FakeMemory(records), LABELS)
+        self.assertEqual(dict(model.class_counts), {'merchant_config_error': 3, 'api_misconfiguration': 3})
+
+
+if __name__ == '__main__':
+    unittest.main()
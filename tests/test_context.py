@@ -0,0 +1,34 @@
+"""Size-bounded prompt context"""
+import unittest
+
+from agent.context import build_context, estimate_tokens, outcome
+
+
+def issue(description, status='completed', **extra):
+    return dict({'description': description, 'root_cause': 'platform_bug', 'result': {'status': status}}, **extra)
+
+
+class BuildContextTest(unittest.TestCase):
+
+    def test_one_line_per_issue_in_rank_order(self):
+        context = build_context([issue("Checkout\n  fails"), issue("Webhook late", 'rejected_by_human')])
+        self.assertEqual(context.splitlines(), ["- Checkout fails | platform_bug | completed",
+                                                "- Webhook late | platform_bug | rejected_by_human"])
+
+    def test_never_exceeds_the_budget(self):
+        issues = [issue(f"Issue number {i} " + "x" * 300) for i in range(20)]
+        for budget in (50, 200, 600, 2000):
+            context = build_context(issues, max_chars=budget)
+            self.assertLessEqual(len(context), budget)
+        # long descriptions are shortened so several issues fit
+        self.assertEqual(len(build_context(issues, max_chars=600).splitlines()), 3)
+
+    def test_aggregated_outcomes_and_empty_context(self):
+        merged = issue("Checkout fails", outcomes={'completed': 12, 'rejected_by_human': 1})
+        self.assertEqual(outcome(merged), "completed x12, rejected_by_human x1")
+        self.assertEqual(build_context([]), "(no similar past issues)")
+        self.assertEqual(estimate_tokens("x" * 400), 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
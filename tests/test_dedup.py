@@ -0,0 +1,55 @@
+"""Near-duplicate lookup of already-solved tickets"""
+import os
+import tempfile
+import unittest
+
+from agent.lsh import MinHashLSH
+from agent.memory import Memory
+
+SOLVED = "Checkout page returns 502 bad gateway after enabling the headless storefront for the store"
+
+
+class FindDuplicateTest(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._dir.cleanup)
+        self.memory = Memory(os.path.join(self._dir.name, 'memory.json'), compact_threshold=None)
+        self.addCleanup(self.memory.close)
+
+    def store(self, ticket_id, description, status):
+        self.memory.store({'id': ticket_id, 'merchant_id': 'M1', 'description': description},
+                          {'root_cause': 'platform_bug', 'action': 'Escalate', 'confidence': 0.9},
+                          {'status': status})
+
+    def test_matches_a_solved_near_duplicate(self):
+        self.store('T1', SOLVED, 'completed')
+        issue, similarity = self.memory.find_duplicate(SOLVED.replace('the store', 'our store'), threshold=0.7)
+        self.assertEqual(issue['ticket_id'], 'T1')
+        self.assertGreaterEqual(similarity, 0.7)
+        self.assertIsNone(self.memory.find_duplicate("Refund webhook never arrives for partial refunds"))
+
+    def test_rejected_resolutions_are_not_reused(self):
+        self.store('T1', SOLVED, 'rejected_by_human')
+        self.assertIsNone(self.memory.find_duplicate(SOLVED))
+        self.store('T2', SOLVED, 'completed')
+        self.assertEqual(self.memory.find_duplicate(SOLVED)[0]['ticket_id'], 'T2')
+        # a later rejection of the same issue withdraws it
+        self.store('T3', SOLVED, 'rejected_by_human')
+        self.assertIsNone(self.memory.find_duplicate(SOLVED))
+
+
+class MinHashLSHTest(unittest.TestCase):
+
+    def test_query_and_remove(self):
+        lsh = MinHashLSH()
+        lsh.add('a', SOLVED)
+        lsh.add('b', "Refund webhook never arrives for partial refunds in the new API")
+        self.assertEqual(lsh.query(SOLVED, 0.9), [(1.0, 'a')])
+        lsh.remove('a')
+        self.assertNotIn('a', lsh)
+        self.assertEqual(lsh.query(SOLVED, 0.9), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
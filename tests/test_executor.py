@@ -0,0 +1,94 @@
+"""ExecutionLedger persistence and idempotent, coalesced execution in BatchExecutor"""
+import os
+import tempfile
+import unittest
+
+from agent.executor import BatchExecutor, ExecutionLedger
+
+
+class CountingExecutor:
+    """Records every group it is asked to run"""
+
+    def __init__(self):
+        self.groups = []
+
+    def execute_group(self, action, merchants):
+        self.groups.append((action, merchants))
+        return {'status': 'completed', 'action': action}
+
+
+def ticket(i, merchant='M1'):
+    return {'id': f'T{i}', 'merchant_id': merchant}
+
+
+class ExecutionLedgerTest(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._dir.cleanup)
+        self.path = os.path.join(self._dir.name, 'executions.jsonl')
+
+    def test_entries_survive_a_restart(self):
+        ExecutionLedger(self.path).record({'T1|A': {'status': 'completed'}})
+        self.assertEqual(ExecutionLedger(self.path).get('T1|A'), {'status': 'completed'})
+        self.assertIsNone(ExecutionLedger(self.path).get('T1|B'))
+
+    def test_record_after_a_torn_write(self):
+        ledger = ExecutionLedger(self.path)
+        ledger.record({'T1|A': {'status': 'completed'}})
+        # crash halfway through recording another group
+        with open(self.path, 'ab') as f:
+            f.write(b'{"key": "T2|A", "res')
+        ledger.record({'T3|A': {'status': 'completed'}})
+        self.assertEqual(ledger.get('T3|A'), {'status': 'completed'})
+
+        restarted = ExecutionLedger(self.path)
+        self.assertEqual(restarted.get('T1|A'), {'status': 'completed'})
+        self.assertEqual(restarted.get('T3|A'), {'status': 'completed'})
+        self.assertIsNone(restarted.get('T2|A'))
+
+    def test_sees_entries_of_another_instance(self):
+        first, second = ExecutionLedger(self.path), ExecutionLedger(self.path)
+        first.record({'T1|A': {'status': 'completed'}})
+        self.assertEqual(second.get('T1|A'), {'status': 'completed'})
+        second.record({'T2|A': {'status': 'completed'}})
+        self.assertEqual(first.get('T2|A'), {'status': 'completed'})
+
+
+class BatchExecutorTest(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._dir.cleanup)
+        self.path = os.path.join(self._dir.name, 'executions.jsonl')
+        self.executor = CountingExecutor()
+
+    def batch(self):
+        return BatchExecutor(self.executor, ExecutionLedger(self.path), window=60.0)
+
+    def test_one_run_per_action(self):
+        batch = self.batch()
+        futures = [batch.submit(ticket(i, f'M{i % 2}'), {'action': 'restart_service'}) for i in range(4)]
+        futures.append(batch.submit(ticket(9), {'action': 'clear_cache'}))
+        batch.flush()
+        self.assertEqual(sorted(self.executor.groups),
+                         [('clear_cache', ['M1']), ('restart_service', ['M0', 'M1'])])
+        results = [f.result() for f in futures]
+        self.assertEqual(results[0]['batch_id'], results[3]['batch_id'])
+        self.assertEqual(results[0]['batch_size'], 4)
+
+    def test_replayed_tickets_are_not_executed_again(self):
+        first = self.batch().execute(ticket(1), {'action': 'restart_service'})
+        # same ticket and action after a restart, and twice within one flush
+        batch = self.batch()
+        futures = [batch.submit(ticket(1), {'action': 'restart_service'}) for _ in range(2)]
+        futures.append(batch.submit(ticket(2), {'action': 'restart_service'}))
+        batch.flush()
+        self.assertEqual(len(self.executor.groups), 2)
+        self.assertEqual(futures[0].result(), first)
+        self.assertEqual(futures[1].result(), first)
+        self.assertEqual(futures[2].result()['batch_size'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+"""History pages, filters and chunked exports"""
+import csv
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from agent.export import iter_csv, iter_ndjson, write_export
+from agent.memory import Memory
+
+
+class HistoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._dir.cleanup)
+        self.memory = Memory(os.path.join(self._dir.name, 'memory.json'), compact_threshold=None)
+        self.addCleanup(self.memory.close)
+        for i in range(25):
+            ticket = {'id': f'T{i}', 'merchant_id': f'M{i % 2}', 'description': f'Checkout issue {i}'}
+            decision = {'root_cause': 'platform_bug' if i % 5 == 0 else 'migration_issue', 'action': 'fix',
+                        'confidence': 0.8}
+            self.memory.store(ticket, decision, {'status': 'completed' if i % 3 else 'rejected_by_human'})
+
+    def test_pages_newest_first(self):
+        page, total = self.memory.history(offset=0, limit=10)
+        self.assertEqual(total, 25)
+        self.assertEqual([r['ticket_id'] for r in page], [f'T{i}' for i in range(24, 14, -1)])
+        page, _ = self.memory.history(offset=20, limit=10)
+        self.assertEqual([r['ticket_id'] for r in page], ['T4', 'T3', 'T2', 'T1', 'T0'])
+        self.assertEqual(self.memory.history(offset=30), ([], 25))
+
+    def test_filters_combine(self):
+        page, total = self.memory.history(root_cause='platform_bug', merchant_id='M0', limit=100)
+        self.assertEqual([r['ticket_id'] for r in page], ['T20', 'T10', 'T0'])
+        self.assertEqual(total, 3)
+        _, total = self.memory.history(outcome='rejected_by_human', text='ISSUE 1')
+        # T12, T15 and T18 among T1, T10-T19
+        self.assertEqual(total, 3)
+
+    def test_iter_history_is_oldest_first_in_chunks(self):
+        ids = [r['ticket_id'] for r in self.memory.iter_history(chunk_size=4, merchant_id='M1')]
+        self.assertEqual(ids, [f'T{i}' for i in range(1, 25, 2)])
+
+
+class ExportTest(unittest.TestCase):
+
+    records = [{'ticket_id': f'T{i}', 'description': f'issue, "quoted" {i}', 'result': {'status': 'completed'}}
+               for i in range(7)]
+
+    def test_ndjson_chunks(self):
+        chunks = list(iter_ndjson(self.records, chunk_size=3))
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual([json.loads(line) for line in "".join(chunks).splitlines()], self.records)
+
+    def test_csv_chunks_have_one_header(self):
+        chunks = list(iter_csv(self.records, chunk_size=3))
+        self.assertEqual(len(chunks), 3)
+        rows = list(csv.DictReader(io.StringIO("".join(chunks))))
+        self.assertEqual([r['ticket_id'] for r in rows], [f'T{i}' for i in range(7)])
+        self.assertEqual(rows[0]['description'], 'issue, "quoted" 0')
+        self.assertEqual(rows[0]['status'], 'completed')
+
+    def test_write_export(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'export.csv')
+            write_export(iter(self.records), path, 'csv', chunk_size=2)
+            with open(path, newline='', encoding='utf-8') as f:
+                self.assertEqual(len(list(csv.DictReader(f))), 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
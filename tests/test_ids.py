@@ -0,0 +1,28 @@
+"""Content-addressed ticket ids"""
+import unittest
+
+from agent.ids import ensure_id, submission_id, ticket_id
+
+
+class TicketIdTest(unittest.TestCase):
+
+    def test_same_content_same_id(self):
+        first = ticket_id('M1', 'Checkout   fails\non mobile', '2024-05-01T10:00:00')
+        self.assertEqual(first, ticket_id(' M1 ', 'checkout fails on mobile', '2024-05-01T10:00:00'))
+        self.assertRegex(first, r'^T-[0-9a-f]{12}$')
+        self.assertNotEqual(first, ticket_id('M2', 'checkout fails on mobile', '2024-05-01T10:00:00'))
+        self.assertNotEqual(first, ticket_id('M1', 'checkout fails on mobile', '2024-05-02T10:00:00'))
+
+    def test_submission_id_is_stable_within_a_day(self):
+        morning = submission_id('M1', 'checkout fails', '2024-05-01T08:00:00')
+        self.assertEqual(morning, submission_id('M1', 'checkout fails', '2024-05-01T17:30:12.5'))
+        self.assertNotEqual(morning, submission_id('M1', 'checkout fails', '2024-05-02T08:00:00'))
+
+    def test_ensure_id_keeps_an_existing_id(self):
+        self.assertEqual(ensure_id({'id': 'T-7', 'description': 'x'})['id'], 'T-7')
+        ticket = ensure_id({'merchant_id': 'M1', 'description': 'x', 'timestamp': '2024-05-01'})
+        self.assertEqual(ticket['id'], ticket_id('M1', 'x', '2024-05-01'))
+
+
+if __name__ == '__main__':
+    unittest.main()
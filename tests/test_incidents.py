@@ -0,0 +1,50 @@
+"""Clustering near-identical tickets of a batch into incidents"""
+import unittest
+
+from agent.incidents import cluster_tickets
+
+OUTAGE = "Checkout page returns 502 bad gateway error after the headless storefront migration"
+
+
+def ticket(ticket_id, description, timestamp, merchant='M1', severity='medium'):
+    return {'id': ticket_id, 'merchant_id': merchant, 'description': description, 'timestamp': timestamp,
+            'severity': severity}
+
+
+class ClusterTicketsTest(unittest.TestCase):
+
+    def test_near_identical_tickets_share_an_incident(self):
+        tickets = [
+            ticket('T1', OUTAGE, '2024-05-01T10:00:00', 'M1'),
+            ticket('T2', "Refund webhook never arrives for partial refunds in the new API", '2024-05-01T10:01:00'),
+            ticket('T3', OUTAGE + '!', '2024-05-01T10:02:00', 'M2', severity='critical'),
+            ticket('T4', OUTAGE, '2024-05-01T10:03:00', 'M3'),
+        ]
+        incidents = cluster_tickets(tickets)
+        self.assertEqual([[t['id'] for t in i.tickets] for i in incidents], [['T1', 'T3', 'T4'], ['T2']])
+        outage = incidents[0]
+        # the most severe member is the one analyzed
+        self.assertEqual(outage.representative['id'], 'T3')
+        self.assertEqual(outage.merchants, ['M1', 'M2', 'M3'])
+        summary = outage.summary({'root_cause': 'platform_bug'})
+        self.assertEqual((summary['tickets'], summary['root_cause']), (3, 'platform_bug'))
+
+    def test_incident_id_does_not_depend_on_order(self):
+        tickets = [ticket(f'T{i}', OUTAGE, f'2024-05-01T10:0{i}:00', f'M{i}') for i in range(3)]
+        forward = cluster_tickets(tickets)[0].incident_id
+        self.assertEqual(forward, cluster_tickets(list(reversed(tickets)))[0].incident_id)
+
+    def test_window_splits_reports_far_apart(self):
+        tickets = [
+            ticket('T1', OUTAGE, '2024-05-01T10:00:00'),
+            ticket('T2', OUTAGE, '2024-05-01T10:50:00'),
+            # within the window of the previous report, so the incident keeps growing
+            ticket('T3', OUTAGE, '2024-05-01T11:40:00'),
+            ticket('T4', OUTAGE, '2024-05-01T14:00:00'),
+        ]
+        incidents = cluster_tickets(tickets, window_seconds=3600)
+        self.assertEqual([[t['id'] for t in i.tickets] for i in incidents], [['T1', 'T2', 'T3'], ['T4']])
+
+
+if __name__ == '__main__':
+    unittest.main()
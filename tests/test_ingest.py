@@ -0,0 +1,92 @@
+"""TicketStream batches, checkpoints and at-least-once delivery"""
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from agent.ingest import TicketStream
+
+
+class TicketStreamTest(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._dir.cleanup)
+        self.path = os.path.join(self._dir.name, 'tickets.ndjson')
+
+    def append(self, *ids, raw=b''):
+        with open(self.path, 'ab') as f:
+            for ticket_id in ids:
+                f.write((json.dumps({'id': ticket_id, 'merchant_id': 'M1', 'description': 'x'}) + '\n').encode())
+            f.write(raw)
+
+    def ids(self, tickets):
+        return [t['id'] for t in tickets]
+
+    def test_resumes_after_commit(self):
+        self.append('N0', 'N1')
+        stream = TicketStream(self.path)
+        cursor, tickets = stream.read()
+        self.assertEqual(self.ids(tickets), ['N0', 'N1'])
+        stream.commit(cursor)
+        self.append('N2')
+        self.assertEqual(self.ids(TicketStream(self.path).read()[1]), ['N2'])
+
+    def test_skips_partial_lines_non_objects_and_duplicates(self):
+        self.append('N0', raw=b'[1, 2]\nnot json\n"text"\n')
+        self.append('N0', raw=b'{"id": "N1", "merch')
+        stream = TicketStream(self.path)
+        self.assertEqual(self.ids(stream.read()[1]), ['N0'])
+        with open(self.path, 'ab') as f:
+            f.write(b'ant_id": "M1", "description": "x"}\n')
+        self.assertEqual(self.ids(stream.read()[1]), ['N1'])
+        self.assertEqual(stream.read(), (None, []))
+
+    def test_released_batch_is_handed_out_again(self):
+        self.append('N0', 'N1')
+        stream = TicketStream(self.path)
+        cursor, _ = stream.read()
+        stream.release(cursor)
+        self.append('N2')
+        cursor, tickets = stream.read()
+        self.assertEqual(self.ids(tickets), ['N0', 'N1', 'N2'])
+        stream.commit(cursor)
+        self.assertEqual(TicketStream(self.path).read(), (None, []))
+
+    def test_checkpoint_stays_behind_unacknowledged_batches(self):
+        self.append('N0', 'N1', 'N2')
+        stream = TicketStream(self.path)
+        stream.read()
+        # a later batch is handled while the first one is still out (or failed unnoticed)
+        self.append('N9')
+        cursor, tickets = stream.read()
+        self.assertEqual(self.ids(tickets), ['N9'])
+        stream.commit(cursor)
+
+        # after a restart only the unhandled tickets come back
+        self.assertEqual(self.ids(TicketStream(self.path).read()[1]), ['N0', 'N1', 'N2'])
+
+    def test_concurrent_readers_get_each_ticket_once(self):
+        self.append(*(f'N{i}' for i in range(2000)))
+        stream = TicketStream(self.path)
+        handed_out = []
+
+        def consume():
+            for _ in range(20):
+                cursor, tickets = stream.read()
+                handed_out.extend(self.ids(tickets))
+                stream.commit(cursor)
+
+        threads = [threading.Thread(target=consume) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(sorted(handed_out), sorted(f'N{i}' for i in range(2000)))
+        self.assertEqual(TicketStream(self.path).read(), (None, []))
+        self.assertEqual([name for name in os.listdir(self._dir.name) if name.endswith('.tmp')], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
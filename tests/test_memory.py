@@ -0,0 +1,124 @@
+"""Memory journal recovery and compaction under concurrent writes"""
+import os
+import tempfile
+import threading
+import unittest
+
+from agent.memory import Memory
+
+
+def ticket(i, description=None):
+    return {'id': f'T{i}', 'merchant_id': f'M{i % 3}', 'description': description or f'checkout fails {i}'}
+
+
+DECISION = {'root_cause': 'platform_bug', 'action': 'restart_service', 'confidence': 0.8}
+RESULT = {'status': 'success'}
+
+
+class MemoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._dir.name, 'memory.json')
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def open(self, **kwargs):
+        kwargs.setdefault('compact_threshold', None)
+        return Memory(self.path, fsync_every=1, **kwargs)
+
+    def test_replay_skips_torn_write(self):
+        memory = self.open()
+        memory.store(ticket(1), DECISION, RESULT)
+        memory.store(ticket(2), DECISION, RESULT)
+        memory.close()
+        # crash halfway through appending a third record
+        with open(memory.journal_path, 'ab') as f:
+            f.write(b'{"ticket_id": "T3", "description": "checko')
+
+        memory = self.open()
+        self.assertEqual([r['ticket_id'] for r in memory.data['resolved_issues']], ['T1', 'T2'])
+        self.assertIsNone(memory.lookup('T3'))
+        # the next append starts on a fresh line instead of extending the torn one
+        memory.store(ticket(4), DECISION, RESULT)
+        memory.close()
+
+        memory = self.open()
+        self.assertEqual([r['ticket_id'] for r in memory.data['resolved_issues']], ['T1', 'T2', 'T4'])
+        memory.close()
+
+    def test_store_after_another_process_tore_a_line(self):
+        memory = self.open()
+        memory.store(ticket(1), DECISION, RESULT)
+        # another process crashes mid-append while this one keeps the journal open
+        with open(memory.journal_path, 'ab') as f:
+            f.write(b'{"ticket_id": "T2", "descri')
+        memory.store(ticket(3), DECISION, RESULT)
+        memory.close()
+
+        memory = self.open()
+        self.assertEqual([r['ticket_id'] for r in memory.data['resolved_issues']], ['T1', 'T3'])
+        memory.close()
+
+    def test_replay_after_interrupted_compaction(self):
+        memory = self.open()
+        for i in range(3):
+            memory.store(ticket(i), DECISION, RESULT)
+        memory.close()
+        # compaction rotated the journal, then crashed before writing the snapshot
+        os.replace(memory.journal_path, memory.journal_path + '.0.compacting')
+
+        memory = self.open()
+        memory.store(ticket(3), DECISION, RESULT)
+        self.assertEqual(len(memory.data['resolved_issues']), 4)
+        memory.compact()
+        memory.close()
+
+        memory = self.open()
+        self.assertEqual(sorted(r['ticket_id'] for r in memory.data['resolved_issues']), ['T0', 'T1', 'T2', 'T3'])
+        memory.close()
+
+    def test_compaction_during_concurrent_store(self):
+        memory = self.open(background_compaction=False)
+        writers, per_writer = 4, 150
+        done = threading.Event()
+
+        def write(w):
+            for i in range(per_writer):
+                n = w * per_writer + i
+                # a few repeated descriptions so compaction has records to merge
+                memory.store(ticket(n, f'checkout fails {n % 20}'), DECISION, RESULT)
+
+        def compact():
+            while not done.is_set():
+                memory.compact()
+
+        compactor = threading.Thread(target=compact)
+        compactor.start()
+        threads = [threading.Thread(target=write, args=(w,)) for w in range(writers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        done.set()
+        compactor.join()
+
+        total = writers * per_writer
+        self.assertGreater(memory.generation, 1, 'no compaction overlapped the writers')
+        for n in range(total):
+            self.assertIsNotNone(memory.lookup(f'T{n}'), f'T{n}')
+        self.assertEqual(sum(r.get('count', 1) for r in memory.data['resolved_issues']), total)
+        memory.close()
+
+        # nothing lost or counted twice on disk either
+        memory = self.open()
+        self.assertEqual(sum(r.get('count', 1) for r in memory.data['resolved_issues']), total)
+        memory.compact()
+        self.assertEqual(sum(r['count'] for r in memory.data['resolved_issues']), total)
+        self.assertEqual(len(memory.data['resolved_issues']), 20)
+        memory.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+"""Counters, histograms, spans and their Prometheus / log export"""
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from agent.metrics import Metrics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class MetricsTest(unittest.TestCase):
+
+    def test_disabled_records_nothing(self):
+        metrics = Metrics()
+        metrics.inc('tickets_total')
+        metrics.observe('latency_seconds', 0.2)
+        with metrics.span('analyze'):
+            pass
+        self.assertEqual(metrics.counters, {})
+        self.assertEqual(metrics.histograms, {})
+
+    def test_counters_by_label(self):
+        metrics = Metrics(enabled=True)
+        metrics.inc('tickets_total', source='csv')
+        metrics.inc('tickets_total', 2, source='csv')
+        metrics.inc('tickets_total', source='stream')
+        self.assertEqual(metrics.counter('tickets_total', source='csv'), 3)
+        self.assertEqual(metrics.counter('tickets_total', source='stream'), 1)
+        self.assertEqual(metrics.counter('tickets_total', source='api'), 0)
+
+    def test_span_times_and_counts_errors(self):
+        metrics = Metrics(enabled=True)
+        with metrics.span('analyze', stage='model'):
+            pass
+        with self.assertRaises(ValueError):
+            with metrics.span('analyze', stage='model'):
+                raise ValueError('bad reply')
+        hist = metrics.histograms[('analyze_seconds', (('stage', 'model'),))]
+        self.assertEqual(hist['count'], 2)
+        self.assertEqual(metrics.counter('analyze_errors_total', stage='model'), 1)
+
+    def test_prometheus_histogram_is_cumulative(self):
+        metrics = Metrics(enabled=True)
+        for value in (0.003, 0.04, 0.04, 100):
+            metrics.observe('latency_seconds', value)
+        text = metrics.render_prometheus()
+        self.assertIn('# TYPE latency_seconds histogram', text)
+        self.assertIn('latency_seconds_bucket{le="0.005"} 1', text)
+        self.assertIn('latency_seconds_bucket{le="0.05"} 3', text)
+        self.assertIn('latency_seconds_bucket{le="30.0"} 3', text)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 4', text)
+        self.assertIn('latency_seconds_count 4', text)
+
+    def test_write_prometheus(self):
+        metrics = Metrics(enabled=True)
+        metrics.inc('tickets_total')
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'metrics.prom')
+            metrics.write_prometheus(path)
+            with open(path) as f:
+                self.assertIn('tickets_total 1', f.read())
+            self.assertEqual(os.listdir(tmp), ['metrics.prom'])
+
+    def test_log_env_prints_span_lines(self):
+        code = "from agent.metrics import metrics\nwith metrics.span('analyze'):\n    pass\n"
+        env = dict(os.environ, AGENT_METRICS='1', AGENT_METRICS_LOG='1')
+        env.pop('AGENT_METRICS_PORT', None)
+        result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env,
+                                capture_output=True, text=True, timeout=60)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn('"span": "analyze"', result.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+"""PolicyEngine rules, hot reload and batch evaluation"""
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from agent.policies import NUMPY_MIN_ROWS, PolicyEngine
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+RULES = {
+    "root_causes": {
+        "merchant_config_error": {"action": "Send guide", "risk_level": "low"},
+        "platform_bug": {"action": "Escalate", "risk_level": "high", "needs_approval": True},
+    },
+    "default": {"action": "Ask a human", "risk_level": "unknown"},
+    "approval": {"severities": ["critical"], "min_confidence": 0.7}
+}
+
+
+class PolicyEngineTest(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._dir.cleanup)
+        self.path = os.path.join(self._dir.name, 'policies.json')
+        self._writes = 0
+        self.write(RULES)
+        self.engine = PolicyEngine(self.path, reload_interval=0)
+
+    def write(self, rules):
+        with open(self.path, 'w') as f:
+            json.dump(rules, f)
+        # a distinct mtime even on coarse-grained filesystems
+        self._writes += 1
+        stamp = time.time() + self._writes
+        os.utime(self.path, (stamp, stamp))
+
+    def rows(self, n, seed=3):
+        rng = random.Random(seed)
+        root_causes = [rng.choice(['merchant_config_error', 'platform_bug', 'unknown_cause', None]) for _ in range(n)]
+        severities = [rng.choice(['low', 'medium', 'high', 'critical']) for _ in range(n)]
+        confidences = [rng.choice([0.0, 0.69, 0.7, 0.71, 1.0, 1, float('nan'), rng.random()]) for _ in range(n)]
+        return root_causes, severities, confidences
+
+    def test_get_action(self):
+        decision = self.engine.get_action('merchant_config_error', 'low', 0.9)
+        self.assertEqual(decision, {"action": "Send guide", "risk_level": "low", "needs_human_approval": False,
+                                    "confidence": 0.9, "root_cause": 'merchant_config_error'})
+        self.assertTrue(self.engine.get_action('merchant_config_error', 'critical', 0.9)['needs_human_approval'])
+        self.assertTrue(self.engine.get_action('merchant_config_error', 'low', 0.69)['needs_human_approval'])
+        self.assertTrue(self.engine.get_action('platform_bug', 'low', 0.99)['needs_human_approval'])
+        self.assertEqual(self.engine.get_action('unknown_cause', 'low', 0.9)['action'], "Ask a human")
+
+    def test_rules_reload_when_the_file_changes(self):
+        rules = json.loads(json.dumps(RULES))
+        rules['approval']['min_confidence'] = 0.4
+        self.write(rules)
+        self.assertFalse(self.engine.get_action('merchant_config_error', 'low', 0.5)['needs_human_approval'])
+        reasons = self.engine.approval_reasons({'root_cause': 'platform_bug', 'confidence': 0.3}, 'critical')
+        self.assertEqual(reasons, ["Critical severity ticket", "Low confidence (30%, below 40%)",
+                                   "platform_bug actions always need approval"])
+
+    def test_broken_file_keeps_the_current_rules(self):
+        with open(self.path, 'w') as f:
+            f.write('{"root_causes": ')
+        stamp = time.time() + 60
+        os.utime(self.path, (stamp, stamp))
+        with self.assertLogs('agent.policies', 'WARNING'):
+            self.assertFalse(self.engine.reload())
+        self.assertEqual(self.engine.get_action('platform_bug', 'low', 0.9)['action'], "Escalate")
+
+    def assert_batch_matches_rows(self, n):
+        root_causes, severities, confidences = self.rows(n)
+        batch = self.engine.get_actions_batch(root_causes, severities, confidences)
+        rows = [self.engine.get_action(*row) for row in zip(root_causes, severities, confidences)]
+        self.assertEqual(len(batch), n)
+        for got, want in zip(batch, rows):
+            # NaN != NaN, so compare the confidences by identity of their text
+            self.assertEqual(repr(got.pop('confidence')), repr(want.pop('confidence')))
+            self.assertEqual(got, want)
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def test_numpy_batch_matches_get_action(self):
+        self.assert_batch_matches_rows(NUMPY_MIN_ROWS * 20)
+
+    def test_batch_without_numpy_matches_get_action(self):
+        with mock.patch.dict(sys.modules, {'numpy': None}):
+            self.assert_batch_matches_rows(NUMPY_MIN_ROWS * 20)
+        self.assert_batch_matches_rows(NUMPY_MIN_ROWS - 1)
+
+    def test_missing_confidence_raises_on_every_path(self):
+        root_causes, severities, confidences = self.rows(NUMPY_MIN_ROWS * 2)
+        confidences[5] = None
+        with self.assertRaises(TypeError):
+            self.engine.get_action(root_causes[5], severities[5], None)
+        with self.assertRaises(TypeError):
+            self.engine.get_actions_batch(root_causes, severities, confidences)
+        with mock.patch.dict(sys.modules, {'numpy': None}):
+            with self.assertRaises(TypeError):
+                self.engine.get_actions_batch(root_causes, severities, confidences)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+"""CircuitBreaker state machine and breaker accounting in ResilientCaller"""
+import unittest
+from unittest import mock
+
+from agent.resilience import CircuitBreaker, CircuitOpenError, ResilientCaller
+
+
+class Clock:
+    """Stands in for time.monotonic()"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        patcher = mock.patch('agent.resilience.time.monotonic', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(window=4, min_calls=4, failure_rate=0.5, slow_call_seconds=5.0, cooldown=30.0)
+
+    def trip(self):
+        for ok in (True, True, False, False):
+            self.breaker.record(ok, 0.1)
+        self.assertEqual(self.breaker.state, 'open')
+
+    def test_stays_closed_below_min_calls_and_failure_rate(self):
+        for _ in range(3):
+            self.breaker.record(False, 0.1)
+        self.assertEqual(self.breaker.state, 'closed')
+        self.assertEqual(self.breaker.allow(), 'call')
+        breaker = CircuitBreaker(window=4, min_calls=4, failure_rate=0.5)
+        for ok in (True, True, True, False):
+            breaker.record(ok, 0.1)
+        self.assertEqual(breaker.state, 'closed')
+
+    def test_slow_successes_trip(self):
+        for _ in range(4):
+            self.breaker.record(True, 6.0)
+        self.assertEqual(self.breaker.state, 'open')
+
+    def test_open_rejects_until_cooldown_then_allows_one_probe(self):
+        self.trip()
+        self.assertIsNone(self.breaker.allow())
+        self.clock.now += 29.0
+        self.assertIsNone(self.breaker.allow())
+        self.clock.now += 1.0
+        self.assertEqual(self.breaker.allow(), 'probe')
+        self.assertEqual(self.breaker.state, 'half_open')
+        # only one trial call at a time
+        self.assertIsNone(self.breaker.allow())
+
+    def test_successful_probe_closes(self):
+        self.trip()
+        self.clock.now += 30.0
+        self.assertEqual(self.breaker.allow(), 'probe')
+        self.breaker.record(True, 0.1, probe=True)
+        self.assertEqual(self.breaker.state, 'closed')
+        self.assertEqual(self.breaker.allow(), 'call')
+        # the window starts over: old failures do not re-trip it
+        self.breaker.record(False, 0.1)
+        self.assertEqual(self.breaker.state, 'closed')
+
+    def test_failed_or_slow_probe_reopens(self):
+        self.trip()
+        for ok, seconds in ((False, 0.1), (True, 6.0)):
+            self.clock.now += 30.0
+            self.assertEqual(self.breaker.allow(), 'probe')
+            self.breaker.record(ok, seconds, probe=True)
+            self.assertEqual(self.breaker.state, 'open')
+            self.assertIsNone(self.breaker.allow())
+
+    def test_stale_results_are_ignored_while_not_closed(self):
+        self.trip()
+        self.clock.now += 30.0
+        self.assertEqual(self.breaker.allow(), 'probe')
+        # a call started before the breaker opened finishes now
+        self.breaker.record(True, 0.1)
+        self.assertEqual(self.breaker.state, 'half_open')
+        self.breaker.record(False, 0.1)
+        self.assertEqual(self.breaker.state, 'half_open')
+
+    def test_released_probe_lets_the_next_call_probe(self):
+        self.trip()
+        self.clock.now += 30.0
+        self.assertEqual(self.breaker.allow(), 'probe')
+        self.breaker.release_probe()
+        self.assertEqual(self.breaker.state, 'half_open')
+        self.assertEqual(self.breaker.allow(), 'probe')
+
+
+class ResilientCallerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        patcher = mock.patch('agent.resilience.time.monotonic', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(window=2, min_calls=2, failure_rate=0.5, cooldown=30.0)
+        self.caller = ResilientCaller(timeout=None, hedge_percentile=None, breaker=self.breaker)
+
+    def trip(self):
+        def fail():
+            raise ConnectionError("down")
+        for _ in range(2):
+            with self.assertRaises(ConnectionError):
+                self.caller.call(fail)
+        self.assertEqual(self.breaker.state, 'open')
+
+    def test_open_breaker_rejects_calls(self):
+        self.trip()
+        with self.assertRaises(CircuitOpenError):
+            self.caller.call(lambda: 'reply')
+
+    def test_probe_through_call_closes(self):
+        self.trip()
+        self.clock.now += 30.0
+        self.assertEqual(self.caller.call(lambda: 'reply'), 'reply')
+        self.assertEqual(self.breaker.state, 'closed')
+
+    def test_abandoned_stream_releases_the_probe(self):
+        self.trip()
+        self.clock.now += 30.0
+
+        def stream():
+            with self.caller.guarded():
+                yield 'chunk'
+                yield 'chunk'
+
+        chunks = stream()
+        next(chunks)
+        # the consumer stops reading halfway through the probe
+        chunks.close()
+        self.assertEqual(self.breaker.state, 'half_open')
+        self.assertEqual(self.caller.call(lambda: 'reply'), 'reply')
+        self.assertEqual(self.breaker.state, 'closed')
+
+
+if __name__ == '__main__':
+    unittest.main()
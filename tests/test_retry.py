@@ -0,0 +1,53 @@
+"""retry() runs attempts one at a time within its budget"""
+import threading
+import time
+import unittest
+
+from agent.retry import retry
+
+
+class RetryTest(unittest.TestCase):
+
+    def test_retries_until_success(self):
+        attempts = []
+
+        def flaky():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise ConnectionError("try again")
+            return 'ok'
+
+        self.assertEqual(retry(flaky, retries=2, base_delay=0.001), 'ok')
+        self.assertEqual(len(attempts), 3)
+
+    def test_slow_attempts_never_overlap(self):
+        running, overlaps, attempts = [0], [], []
+        lock = threading.Lock()
+
+        def slow():
+            with lock:
+                running[0] += 1
+                overlaps.append(running[0] > 1)
+                attempts.append(1)
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+            raise TimeoutError("too slow")
+
+        with self.assertRaises(TimeoutError):
+            retry(slow, retries=2, timeout=0.01, base_delay=0.001)
+        time.sleep(0.1)
+        # the budget was spent by the first attempt, so nothing else ran
+        self.assertEqual(len(attempts), 1)
+        self.assertFalse(any(overlaps))
+
+    def test_last_error_is_raised(self):
+        def broken():
+            raise ValueError("bad reply")
+
+        with self.assertRaises(ValueError):
+            retry(broken, retries=1, base_delay=0.001)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+"""Severity scheduling with aging, and token-bucket rate limits"""
+import unittest
+from unittest import mock
+
+from agent.scheduler import RateLimiter, TicketScheduler, TokenBucket
+
+
+class Clock:
+    """Stands in for time.monotonic()"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def ticket(ticket_id, severity, timestamp):
+    return {'id': ticket_id, 'severity': severity, 'timestamp': timestamp}
+
+
+class TicketSchedulerTest(unittest.TestCase):
+
+    def test_most_severe_first_then_oldest(self):
+        scheduler = TicketScheduler(aging_seconds=600)
+        tickets = [
+            ticket('low-old', 'low', '2024-05-01T10:00:00'),
+            ticket('critical', 'critical', '2024-05-01T10:10:00'),
+            ticket('medium', 'medium', '2024-05-01T10:05:00'),
+            ticket('critical-older', 'critical', '2024-05-01T10:09:00'),
+        ]
+        self.assertEqual([t['id'] for t in scheduler.order(tickets)],
+                         ['critical-older', 'critical', 'medium', 'low-old'])
+
+    def test_aging_keeps_low_tickets_from_starving(self):
+        scheduler = TicketScheduler(aging_seconds=600)
+        # three severity steps apart, filed more than 3 * aging_seconds earlier
+        old_low = ticket('low', 'low', '2024-05-01T09:00:00')
+        new_critical = ticket('critical', 'critical', '2024-05-01T09:31:00')
+        self.assertEqual([t['id'] for t in scheduler.order([new_critical, old_low])], ['low', 'critical'])
+
+    def test_pop_many_serves_in_priority_order(self):
+        scheduler = TicketScheduler()
+        for t in (ticket('L', 'low', '2024-05-01T10:00:00'), ticket('H', 'high', '2024-05-01T10:00:00'),
+                  ticket('C', 'critical', '2024-05-01T10:00:00')):
+            scheduler.submit(t)
+        self.assertEqual([t['id'] for t, _ in scheduler.pop_many(2)], ['C', 'H'])
+        self.assertEqual(scheduler.stats()['depth'], {'low': 1})
+        self.assertEqual([t['id'] for t, _ in scheduler.pop_many(5)], ['L'])
+        self.assertEqual(scheduler.pop_many(5), [])
+
+
+class TokenBucketTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        patcher = mock.patch('agent.scheduler.time.monotonic', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_burst_then_wait_for_refill(self):
+        bucket = TokenBucket(60, per=60.0)
+        for _ in range(60):
+            self.assertEqual(bucket.reserve(), 0.0)
+        # concurrent callers queue up one refill interval apart
+        self.assertAlmostEqual(bucket.reserve(), 1.0)
+        self.assertAlmostEqual(bucket.reserve(), 2.0)
+        self.clock.now += 2.0
+        self.assertAlmostEqual(bucket.reserve(), 1.0)
+
+    def test_try_take_does_not_go_negative(self):
+        bucket = TokenBucket(2, per=60.0)
+        self.assertTrue(bucket.try_take())
+        self.assertTrue(bucket.try_take())
+        self.assertFalse(bucket.try_take())
+        bucket.refund()
+        self.assertTrue(bucket.try_take())
+
+    def test_try_acquire_refunds_the_request_when_tokens_run_out(self):
+        limiter = RateLimiter(requests_per_minute=10, tokens_per_minute=100)
+        self.assertTrue(limiter.try_acquire(tokens=80))
+        self.assertFalse(limiter.try_acquire(tokens=80))
+        # the refused call did not use up a request slot
+        self.assertAlmostEqual(limiter.requests.tokens, 9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+"""MaxScore pruning in InvertedIndex.search must not change the ranking"""
+import heapq
+import math
+import random
+import unittest
+from collections import defaultdict
+
+from agent.search import InvertedIndex, tokenize
+
+WORDS = ('checkout webhook payment api timeout refund stripe invoice login session cart shipping tax '
+         'coupon inventory sync error 502 504 slow failing duplicate missing crash mobile dashboard').split()
+
+
+def exhaustive(index, text, k):
+    """Score every posting of every query term, no pruning (same term filtering as search)"""
+    n = len(index)
+    avg = index.total_length / n
+    terms = [t for t in set(tokenize(text)) if index.postings.get(t)]
+    if len(terms) > 1 and n > 100:
+        rare = [t for t in terms if index.df[t] <= index.max_df_ratio * n]
+        if rare:
+            terms = rare
+    scores = defaultdict(float)
+    for t in terms:
+        idf = math.log(1 + (n - index.df[t] + 0.5) / (index.df[t] + 0.5))
+        for doc_id, (tf, length) in index.postings[t].items():
+            scores[doc_id] += idf * tf * (index.k1 + 1) / (tf + index.k1 * (1 - index.b + index.b * length / avg))
+    return heapq.nlargest(k, ((s, d) for d, s in scores.items()))
+
+
+class InvertedIndexTest(unittest.TestCase):
+
+    def build(self, size, **kwargs):
+        rng = random.Random(7)
+        index = InvertedIndex(**kwargs)
+        for i in range(size):
+            index.add(i, ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 12))))
+        return index, rng
+
+    def test_pruned_scores_match_exhaustive(self):
+        for cap in (None, 50):
+            index, rng = self.build(3000, max_postings=cap)
+            for _ in range(200):
+                query = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 6)))
+                # terms are summed in another order, so scores only agree to rounding
+                scores = dict((d, s) for s, d in exhaustive(index, query, len(index)))
+                for k in (1, 3, 10):
+                    got = index.search(query, k)
+                    want = exhaustive(index, query, k)
+                    self.assertEqual(len(got), len(want), (cap, query, k))
+                    self.assertEqual(len({d for _, d in got}), len(got), (cap, query, k))
+                    for (score, doc_id), (best, _) in zip(got, want):
+                        self.assertTrue(math.isclose(score, best, rel_tol=1e-9), (cap, query, k))
+                        # the returned doc really has that score (ties may pick another doc)
+                        self.assertTrue(math.isclose(score, scores[doc_id], rel_tol=1e-9), (cap, query, doc_id))
+
+    def test_postings_are_capped_but_df_is_not(self):
+        index, _ = self.build(3000, max_postings=50)
+        self.assertTrue(all(len(p) <= 50 for p in index.postings.values()))
+        self.assertGreater(max(index.df.values()), 50)
+
+    def test_readded_text_moves_to_its_new_id(self):
+        index = InvertedIndex()
+        index.add(0, 'checkout timeout on mobile')
+        index.add(1, 'refund webhook failing')
+        index.add(2, 'checkout timeout on mobile')
+        self.assertEqual(len(index), 2)
+        self.assertEqual([d for _, d in index.search('checkout timeout', 3)], [2])
+
+
+if __name__ == '__main__':
+    unittest.main()
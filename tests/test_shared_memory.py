@@ -0,0 +1,75 @@
+"""Several Memory instances (as in several processes) sharing one history"""
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from agent.memory import Memory
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WRITER = """
+import sys
+from agent.memory import Memory
+memory = Memory(sys.argv[1], compact_threshold=50, background_compaction=False)
+for i in range(int(sys.argv[3])):
+    memory.store({'id': f'{sys.argv[2]}-{i}', 'merchant_id': 'M1', 'description': f'issue {i % 7}'},
+                 {'root_cause': 'platform_bug', 'action': 'Escalate', 'confidence': 0.9}, {'status': 'completed'})
+memory.close()
+"""
+
+
+def ticket(ticket_id, description='checkout fails'):
+    return {'id': ticket_id, 'merchant_id': 'M1', 'description': description}
+
+
+DECISION = {'root_cause': 'platform_bug', 'action': 'Escalate', 'confidence': 0.9}
+
+
+class SharedMemoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._dir.cleanup)
+        self.path = os.path.join(self._dir.name, 'memory.json')
+
+    def open(self):
+        memory = Memory(self.path, compact_threshold=None)
+        self.addCleanup(memory.close)
+        return memory
+
+    def test_reads_see_other_instances_writes(self):
+        first, second = self.open(), self.open()
+        first.store(ticket('T1'), DECISION, {'status': 'completed'})
+        self.assertEqual(second.lookup('T1')['ticket_id'], 'T1')
+        self.assertEqual(second.get_similar_issues('checkout fails')[0]['root_cause'], 'platform_bug')
+        second.store(ticket('T2', 'webhook late'), DECISION, {'status': 'completed'})
+        self.assertEqual([r['ticket_id'] for r in first.data['resolved_issues']], ['T1'])
+        self.assertIsNotNone(first.lookup('T2'))
+
+    def test_compaction_by_another_instance(self):
+        first, second = self.open(), self.open()
+        for i in range(10):
+            first.store(ticket(f'T{i}'), DECISION, {'status': 'completed'})
+        self.assertEqual(len(second.history(limit=100)[0]), 10)
+        first.compact()
+        second.store(ticket('T10'), DECISION, {'status': 'completed'})
+        for memory in (first, second):
+            memory.refresh()
+            self.assertEqual(sum(r.get('count', 1) for r in memory.data['resolved_issues']), 11)
+            self.assertIsNotNone(memory.lookup('T10'))
+
+    def test_concurrent_processes(self):
+        writers = [subprocess.Popen([sys.executable, '-c', WRITER, self.path, f'P{p}', '120'], cwd=ROOT)
+                   for p in range(3)]
+        for writer in writers:
+            self.assertEqual(writer.wait(timeout=120), 0)
+        memory = self.open()
+        self.assertEqual(sum(r.get('count', 1) for r in memory.data['resolved_issues']), 360)
+        for p in range(3):
+            self.assertIsNotNone(memory.lookup(f'P{p}-119'))
+
+
+if __name__ == '__main__':
+    unittest.main()
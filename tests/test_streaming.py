@@ -0,0 +1,76 @@
+"""JSONObjectStream must give the same fields however the reply is chunked"""
+import json
+import unittest
+
+from agent.streaming import JSONObjectStream
+
+REPLY = '```json\n' + json.dumps({
+    'root_cause': 'platform_bug',
+    'confidence': 0.85,
+    'reasoning': 'Checkout "timeouts" started after\\the deploy — see logs, {braces} and [brackets]',
+    'evidence': {'errors': [502, 504], 'note': 'a, b'},
+    'tags': ['checkout', 'api'],
+    'escalate': False,
+}, ensure_ascii=False) + '\n```'
+
+
+def feed_in_chunks(text, size):
+    parser = JSONObjectStream()
+    completed = []
+    for i in range(0, len(text), size):
+        completed.append(parser.feed(text[i:i + size]))
+    return parser, completed
+
+
+class JSONObjectStreamTest(unittest.TestCase):
+
+    def test_any_chunking_gives_the_whole_object(self):
+        expected = json.loads(REPLY.strip('`').removeprefix('json'))
+        for size in (1, 2, 3, 7, 16, 64, len(REPLY)):
+            parser, completed = feed_in_chunks(REPLY, size)
+            self.assertTrue(parser.done, size)
+            self.assertEqual(parser.fields, expected, size)
+            # each field is reported exactly once, by the chunk that finished it
+            keys = [k for fields in completed for k in fields]
+            self.assertEqual(sorted(keys), sorted(expected), size)
+
+    def test_fields_complete_as_soon_as_their_value_ends(self):
+        parser = JSONObjectStream()
+        self.assertEqual(parser.feed('{"root_cause": "config'), {})
+        self.assertEqual(parser.feed('_error", "confid'), {'root_cause': 'config_error'})
+        self.assertEqual(parser.feed('ence": 0.9'), {})
+        self.assertEqual(parser.feed('}'), {'confidence': 0.9})
+        self.assertTrue(parser.done)
+        # anything after the closing brace is ignored
+        self.assertEqual(parser.feed(', "extra": 1}'), {})
+
+    def test_nested_values_are_returned_whole(self):
+        parser = JSONObjectStream()
+        self.assertEqual(parser.feed('{"evidence": {"codes": [1, 2], "n'), {})
+        self.assertEqual(parser.feed('ote": "x, y"}, "a": 1}'), {'evidence': {'codes': [1, 2], 'note': 'x, y'}, 'a': 1})
+
+    def test_partial_string_value(self):
+        parser = JSONObjectStream()
+        parser.feed('{"root_cause": "api_error", "reasoning": "The webhook')
+        self.assertEqual(parser.partial(), ('reasoning', 'The webhook'))
+        # cut right after a backslash, then inside a \\u escape
+        parser.feed(' said \\')
+        self.assertEqual(parser.partial(), ('reasoning', 'The webhook said '))
+        parser.feed('"ok\\" \\u20')
+        self.assertIsNone(parser.partial())
+        parser.feed('ac')
+        self.assertEqual(parser.partial(), ('reasoning', 'The webhook said "ok" €'))
+        parser.feed('"}')
+        self.assertIsNone(parser.partial())
+        self.assertEqual(parser.fields['reasoning'], 'The webhook said "ok" €')
+
+    def test_no_partial_outside_a_string_value(self):
+        parser = JSONObjectStream()
+        parser.feed('{"confidence": 0.')
+        self.assertIsNone(parser.partial())
+        parser.feed('5, "evidence": {"note": "ab')
+        self.assertIsNone(parser.partial())
+
+
+if __name__ == '__main__':
+    unittest.main()